@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .config import lazy_singleton, options_from, settings_section
+from .metrics import gauge
+from .models import Survey
+
+logger = logging.getLogger(__name__)
+
+# Latest activity snapshot. The newest survey's summary is kept in a Django cache, written
+# whenever a survey is saved (post_save, and publish_surveys for bulk inserts that skip the
+# signal) and dropped when the survey it shows is deleted, so reading it costs no query.
+# Only a cold cache falls back to the database. A per-process cache (LocMemCache, the
+# default) only sees this process's writes, so there the snapshot expires after
+# POLL_INTERVAL and surveys saved by other workers show up within that; a cache shared
+# between processes keeps it until the next write.
+# Readers can wait for the next survey: waiters in this process are woken at once, and
+# the shared cache is re-read every POLL_INTERVAL seconds to catch surveys saved by other
+# processes. Under ASGI the waits are awaited on the event loop and cost no thread; under
+# a sync (WSGI) server each one holds a server thread, so at most MAX_SYNC_WAITERS of them
+# wait at a time. Serve long-polls and streams from an async server (uvicorn) at scale.
+
+DEFAULT_ACTIVITY = {
+    'CACHE': 'default',  # alias in settings.CACHES; share it between processes to share the snapshot
+    'TTL': None,  # seconds the snapshot is cached; None: POLL_INTERVAL in a per-process cache, else no expiry
+    'MAX_WAIT': 30,  # longest long-poll, in seconds
+    'MAX_WAITERS': 100,  # long-polls and streams per process; more are answered without waiting
+    'MAX_SYNC_WAITERS': 4,  # of which may hold a WSGI thread; keep it well below the threads per worker
+    'POLL_INTERVAL': 1,  # seconds between reads of the shared cache while waiting
+    'STREAM_SECONDS': 300,  # an event stream ends after this long and the client reconnects
+    'HEARTBEAT': 15,  # seconds between keep-alive comments on an idle stream
+}
+
+SNAPSHOT_KEY = "activity:latest"
+# Cached when there are no surveys yet, so an empty database isn't queried on every read
+NO_ACTIVITY = {}
+# How long an EventSource waits before reconnecting to an ended stream
+STREAM_RETRY_MS = 3000
+
+
+activity_config = settings_section('ACTIVITY', DEFAULT_ACTIVITY)
+
+
+def survey_snapshot(survey):
+    return {
+        "survey_id": survey.id,
+        "industry": survey.industry,
+        "target_audience": survey.target_audience,
+        "technology": survey.technology,
+        "created_at": survey.created_at.isoformat(),
+    }
+
+
+def snapshot_etag(snapshot):
+    return f'"activity-{snapshot.get("survey_id") or 0}"'
+
+
+class ActivityFeed:
+    """The latest activity snapshot and the readers waiting for it to change."""
+
+    def __init__(self, cache='default', ttl=None, max_wait=30, max_waiters=100, max_sync_waiters=4,
+                 poll_interval=1, stream_seconds=300, heartbeat=15):
+        self.cache_alias = cache
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.max_waiters = max_waiters
+        self.max_sync_waiters = max_sync_waiters
+        self.poll_interval = poll_interval
+        self.stream_seconds = stream_seconds
+        self.heartbeat = heartbeat
+        self.waiters = 0
+        self.sync_waiters = 0
+        self.publishes = 0
+        self.database_reads = 0
+        self._changed = threading.Condition()
+        self._async_waiters = set()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def snapshot_ttl(self):
+        """Seconds the snapshot is cached, None for no expiry."""
+        if self.ttl is not None:
+            return self.ttl
+        # Other processes' writes never reach a per-process cache
+        if isinstance(self.cache, (LocMemCache, DummyCache)):
+            return self.poll_interval
+        return None
+
+    def latest(self):
+        """The current snapshot, {} when there are no surveys."""
+        snapshot = self.cache.get(SNAPSHOT_KEY)
+        if snapshot is None:
+            survey = Survey.objects.order_by('-created_at', '-id').first()
+            snapshot = survey_snapshot(survey) if survey else NO_ACTIVITY
+            with self._changed:
+                self.database_reads += 1
+            self.cache.add(SNAPSHOT_KEY, snapshot, self.snapshot_ttl)
+        return snapshot
+
+    async def alatest(self):
+        # The cache read (and on a cold cache the query) is blocking I/O; keep it off the loop
+        return await sync_to_async(self.latest, thread_sensitive=False)()
+
+    def publish(self, survey):
+        snapshot = survey_snapshot(survey)
+        current = self.cache.get(SNAPSHOT_KEY)
+        # A slower writer must not put an older survey back
+        if current and current["survey_id"] > survey.id:
+            return
+        self.cache.set(SNAPSHOT_KEY, snapshot, self.snapshot_ttl)
+        with self._changed:
+            self.publishes += 1
+            self._notify()
+
+    def forget(self, survey_id):
+        """Drop the snapshot if it shows survey_id, e.g. once that survey is deleted."""
+        current = self.cache.get(SNAPSHOT_KEY)
+        if current and current["survey_id"] == survey_id:
+            self.cache.delete(SNAPSHOT_KEY)
+            with self._changed:
+                self._notify()
+
+    def _notify(self):
+        # Called with the lock held
+        self._changed.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop was closed under the waiter
+                pass
+
+    def has_capacity(self, sync=True):
+        with self._changed:
+            return self._has_capacity(sync)
+
+    def _has_capacity(self, sync):
+        # Called with the lock held
+        if sync and self.sync_waiters >= self.max_sync_waiters:
+            return False
+        return self.waiters < self.max_waiters
+
+    def _reserve(self, sync):
+        with self._changed:
+            if not self._has_capacity(sync):
+                return False
+            self.waiters += 1
+            self.sync_waiters += sync
+            return True
+
+    def _release(self, sync):
+        with self._changed:
+            self.waiters -= 1
+            self.sync_waiters -= sync
+
+    def _wait(self, etag, deadline):
+        while True:
+            snapshot = self.latest()
+            remaining = deadline - time.monotonic()
+            if snapshot_etag(snapshot) != etag or remaining <= 0:
+                return snapshot
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    async def _await(self, etag, deadline):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Registered before the read, so a publish in between is not missed
+            waiter = (loop, asyncio.Event())
+            with self._changed:
+                self._async_waiters.add(waiter)
+            try:
+                snapshot = await self.alatest()
+                remaining = deadline - time.monotonic()
+                if snapshot_etag(snapshot) != etag or remaining <= 0:
+                    return snapshot
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                with self._changed:
+                    self._async_waiters.discard(waiter)
+
+    def wait_for_change(self, etag, timeout):
+        """Block until the snapshot's ETag differs from etag or timeout seconds have passed,
+        then return the snapshot. Returns at once when too many readers are waiting."""
+        if not self._reserve(sync=True):
+            return self.latest()
+        try:
+            return self._wait(etag, time.monotonic() + min(timeout, self.max_wait))
+        finally:
+            self._release(sync=True)
+
+    async def await_change(self, etag, timeout):
+        """Async counterpart of wait_for_change, which waits on the event loop."""
+        if not self._reserve(sync=False):
+            return await self.alatest()
+        try:
+            return await self._await(etag, time.monotonic() + min(timeout, self.max_wait))
+        finally:
+            self._release(sync=False)
+
+    def stream(self, etag=None):
+        """Yield the snapshot whenever it changes (first the current one unless it matches
+        etag), and None as a keep-alive every heartbeat seconds, for stream_seconds.
+        Ends at once when too many readers are waiting."""
+        if not self._reserve(sync=True):
+            return
+        try:
+            ends = time.monotonic() + self.stream_seconds
+            while time.monotonic() < ends:
+                snapshot = self._wait(etag, min(time.monotonic() + self.heartbeat, ends))
+                if snapshot_etag(snapshot) != etag:
+                    etag = snapshot_etag(snapshot)
+                    yield snapshot
+                else:
+                    yield None
+        finally:
+            self._release(sync=True)
+
+    async def astream(self, etag=None):
+        """Async counterpart of stream, which waits on the event loop."""
+        if not self._reserve(sync=False):
+            return
+        try:
+            ends = time.monotonic() + self.stream_seconds
+            while time.monotonic() < ends:
+                snapshot = await self._await(etag, min(time.monotonic() + self.heartbeat, ends))
+                if snapshot_etag(snapshot) != etag:
+                    etag = snapshot_etag(snapshot)
+                    yield snapshot
+                else:
+                    yield None
+        finally:
+            self._release(sync=False)
+
+    def stats(self):
+        with self._changed:
+            return {
+                "waiters": self.waiters,
+                "sync_waiters": self.sync_waiters,
+                "publishes": self.publishes,
+                "database_reads": self.database_reads,
+            }
+
+
+@lazy_singleton
+def get_activity_feed():
+    """Return the process-wide ActivityFeed built from settings.ACTIVITY."""
+    return ActivityFeed(**options_from(activity_config()))
+
+
+def _publish(survey):
+    try:
+        get_activity_feed().publish(survey)
+    except Exception as e:
+        # The snapshot is a convenience; never fail the survey's save over it
+        logger.error("Failed to publish activity for survey %s: %s", survey.id, e)
+
+
+def _forget(survey_id):
+    try:
+        get_activity_feed().forget(survey_id)
+    except Exception as e:
+        logger.error("Failed to drop activity for deleted survey %s: %s", survey_id, e)
+
+
+def publish_surveys(surveys):
+    """Publish the newest of surveys once committed; for bulk_create, which sends no post_save."""
+    if surveys:
+        newest = max(surveys, key=lambda survey: survey.id)
+        transaction.on_commit(lambda: _publish(newest))
+
+
+@receiver(post_save, sender=Survey, dispatch_uid="api.activity.publish_survey")
+def publish_survey(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _publish(instance))
+
+
+@receiver(post_delete, sender=Survey, dispatch_uid="api.activity.forget_survey")
+def forget_survey(sender, instance, **kwargs):
+    survey_id = instance.id
+    transaction.on_commit(lambda: _forget(survey_id))
+
+
+def _waiters():
+    return {(): get_activity_feed().stats()["waiters"]}
+
+
+ACTIVITY_WAITERS = gauge("activity_waiters", "Long-polls and event streams waiting for new activity.",
+                         collect=_waiters)
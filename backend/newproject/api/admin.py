@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Survey
+from .models import GeneratedDocument, GenerationJob, Survey
 
 admin.site.register(Survey)
+admin.site.register(GenerationJob)
+admin.site.register(GeneratedDocument)
 
 # Register your models here.
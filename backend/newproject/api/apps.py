@@ -1,6 +1,36 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def serves_requests():
+    """Whether this process serves the API: a WSGI/ASGI server, or runserver (its reloaded
+    child). Other management commands (migrate, test, run_jobs, ...) don't."""
+    if not sys.argv[0].endswith(("manage.py", "django-admin", os.path.join("django", "__main__.py"))):
+        return True
+    if sys.argv[1:2] != ["runserver"]:
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Keeps the latest activity snapshot current (post_save receiver)
+        from . import activity  # noqa: F401
+        # Keeps the full-text search index current (post_save / post_delete receivers)
+        from . import search  # noqa: F401
+        # Drops deleted surveys from the similarity index (post_delete receiver)
+        from . import similarity  # noqa: F401
+        # Reports a missing API key from `manage.py check` and runserver
+        from . import checks  # noqa: F401
+        if serves_requests():
+            # Picks up queued jobs after a restart without waiting for a submission
+            from .jobs import start_in_process_workers
+            start_in_process_workers()
+            # Indexes the stored surveys off the request path, ahead of the first lookup
+            from .similarity import start_loading_similarity_index
+            start_loading_similarity_index()
@@ -0,0 +1,117 @@
+import json
+import logging
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .cache import get_document_cache, make_cache_key
+from .doctree import document_fields, output_format
+from .documents import save_document_safely
+from .generation import (
+    SurveyValidationError, avalidate_response, build_prompt, generation_mode, parse_survey_payload,
+)
+from .metrics import instrumented, stage
+from .routing import route_survey
+from .scheduler import SchedulerBusy
+from .sectioned import agenerate_sectioned_document
+from .writer import acreate_survey
+
+logger = logging.getLogger(__name__)
+
+# Native async views. DRF's @api_view is sync only, so these are plain Django views that
+# keep the same request and response shapes as their counterparts in views.py. Served
+# under ASGI (uvicorn newproject.asgi:application) they hold no thread while waiting on
+# the model, so one process can keep many generations in flight.
+
+
+@csrf_exempt
+@require_POST
+@instrumented("process_survey_async")
+async def process_survey_async(request):
+    try:
+        try:
+            user_input = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Request body must be valid JSON"}, status=400)
+
+        try:
+            with stage("validation"):
+                survey_data = parse_survey_payload(user_input)
+                mode = generation_mode(user_input)
+                fmt = output_format(user_input)
+        except SurveyValidationError as validation_error:
+            logger.error("Invalid survey payload: %s", validation_error)
+            return JsonResponse({"error": str(validation_error)}, status=400)
+
+        try:
+            with stage("db_write"):
+                survey = await acreate_survey(survey_data)
+            logger.info("Survey created successfully with ID: %s", survey.id,
+                        extra={"event": "survey.created", "survey_id": survey.id})
+        except Exception as db_error:
+            logger.error("Database error: %s", str(db_error), exc_info=True)
+            return JsonResponse({"error": f"Database error: {str(db_error)}"}, status=500)
+
+        # Cache backends may do blocking I/O (SQLite file, Django cache servers)
+        document_cache = get_document_cache()
+        plan = route_survey(survey_data)
+        mode = plan.generation_mode(mode)
+        stored = {"model_name": plan.model_name, "generation_config": plan.generation_config}
+        cache_key = make_cache_key(survey_data, plan.model_name, plan.generation_config)
+        with stage("cache_lookup"):
+            cached_content = await sync_to_async(document_cache.get, thread_sensitive=False)(cache_key)
+        prompt = build_prompt(survey_data)
+        if cached_content is not None:
+            logger.info("Document cache hit for survey %s (key %s)", survey.id, cache_key[:12],
+                        extra={"event": "document.cache_hit", "survey_id": survey.id})
+            await sync_to_async(save_document_safely)(survey, cached_content, prompt=prompt, from_cache=True, **stored)
+            with stage("format"):
+                fields = document_fields(cached_content, fmt)
+            return JsonResponse({
+                **fields,
+                "survey_id": survey.id,
+                "timestamp": datetime.now().isoformat(),
+                "cached": True
+            })
+
+        try:
+            tier = plan.document_tier
+            model = tier.model()
+            if mode == "sectioned":
+                with stage("generate"):
+                    validated_content = await agenerate_sectioned_document(model, survey_data, plan)
+            else:
+                with stage("generate"):
+                    response = await model.generate_content_async(
+                        prompt,
+                        generation_config=tier.generation_config
+                    )
+                if not (response and hasattr(response, 'text')):
+                    raise ValueError("Invalid response format from Gemini API")
+                validated_content = await avalidate_response(model, response.text, survey_data, response, plan)
+        except SchedulerBusy as busy:
+            logger.warning("Content generation deferred: %s", busy)
+            response = JsonResponse({"error": str(busy), "retry_after": busy.retry_after}, status=503)
+            response["Retry-After"] = str(busy.retry_after)
+            return response
+        except Exception as generate_error:
+            logger.error("Content generation failed: %s", generate_error)
+            return JsonResponse({"error": f"Content generation failed: {str(generate_error)}"}, status=500)
+
+        with stage("store"):
+            await sync_to_async(document_cache.set, thread_sensitive=False)(cache_key, validated_content)
+            await sync_to_async(save_document_safely)(survey, validated_content, prompt=prompt, **stored)
+        with stage("format"):
+            fields = document_fields(validated_content, fmt)
+        return JsonResponse({
+            **fields,
+            "survey_id": survey.id,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error("Unexpected error in process_survey_async: %s", e, exc_info=True)
+        return JsonResponse({"error": f"Server error: {str(e)}"}, status=500)
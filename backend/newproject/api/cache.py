@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .config import lazy_singleton, options_from, settings_section
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOCUMENT_CACHE = {
+    'BACKEND': 'memory',  # a name in BACKENDS
+    'TTL': 6 * 60 * 60,  # seconds, 0 disables expiry
+    'MAX_ENTRIES': 256,
+}
+
+document_cache_config = settings_section('DOCUMENT_CACHE', DEFAULT_DOCUMENT_CACHE)
+
+# Survey fields that feed the generation prompt, i.e. the ones that decide the output
+CACHE_KEY_FIELDS = ["industry", "technology", "web_frontend", "web_backend", "web_database"]
+
+
+def _normalize_value(value):
+    if isinstance(value, (list, tuple)):
+        # Order and duplicates don't change the generated document
+        return sorted({_normalize_value(item) for item in value if item not in (None, "")})
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).casefold()
+
+
+def make_cache_key(survey_data, model_name="", generation_config=None):
+    """Return a content-addressed key for the document generated from survey_data."""
+    payload = {field: _normalize_value(survey_data.get(field)) for field in CACHE_KEY_FIELDS}
+    payload["model"] = model_name
+    payload["generation_config"] = generation_config or {}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LRUCacheBackend:
+    """In-process LRU store with per-entry expiry."""
+
+    def __init__(self, ttl, max_entries, max_bytes=None, **options):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # UTF-8 bytes, not characters, so non-ASCII documents count what they take
+            size = len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+            self._entries[key] = (value, expires_at, size)
+            self._size += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self._size > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+
+class DjangoCacheBackend:
+    """Delegates to one of the caches configured in settings.CACHES."""
+
+    def __init__(self, ttl, max_entries, alias="default", **options):
+        from django.core.cache import caches
+
+        self.ttl = ttl
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, timeout=self.ttl or None)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def clear(self):
+        self.cache.clear()
+
+    def __len__(self):
+        # The Django cache API has no portable way to count entries
+        return 0
+
+    def _key(self, key):
+        return f"document:{key}"
+
+
+class SQLiteCacheBackend:
+    """File-backed store that survives restarts and is shared between worker processes."""
+
+    def __init__(self, ttl, max_entries, path=None, **options):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = str(path or settings.BASE_DIR / "document_cache.sqlite3")
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS document_cache_accessed ON document_cache (accessed_at)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM document_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM document_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE document_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            conn.execute("DELETE FROM document_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM document_cache WHERE key IN ("
+                "SELECT key FROM document_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM document_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM document_cache")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM document_cache").fetchone()[0]
+
+
+BACKENDS = {
+    "memory": LRUCacheBackend,
+    "django": DjangoCacheBackend,
+    "sqlite": SQLiteCacheBackend,
+}
+
+
+class DocumentCache:
+    """Cache of generated documents keyed by make_cache_key, with hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never fail the request, treat it as a miss
+            logger.error("Document cache read failed: %s", e)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.error("Document cache write failed: %s", e)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@lazy_singleton
+def get_document_cache():
+    """Return the process-wide DocumentCache built from settings.DOCUMENT_CACHE."""
+    options = options_from(document_cache_config())
+    backend_name = options.pop("backend")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown document cache backend: {backend_name}")
+    return DocumentCache(BACKENDS[backend_name](**options))
@@ -0,0 +1,19 @@
+from django.core.checks import Warning, register
+
+from .llm import configuration_errors
+
+# Configuration problems are reported by `manage.py check` (and runserver on start) and
+# by api/health/, rather than by raising at import, so migrations, tests and the
+# endpoints that never call the model work without an API key.
+
+
+@register("llm")
+def check_llm_configuration(app_configs, **kwargs):
+    return [
+        Warning(
+            message,
+            hint="Set GEMINI_API_KEY (e.g. in .env) or GEMINI_PROVIDER=fake for local work.",
+            id="api.W001",
+        )
+        for message in configuration_errors()
+    ]
@@ -0,0 +1,41 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+from rest_framework.renderers import BaseRenderer
+
+# Compact response encodings. MessagePackRenderer is picked by DRF's content negotiation
+# for "Accept: application/msgpack" (or ?format=msgpack) and carries the same data as the
+# JSON response in a binary form. columnar() is the compact layout of history pages: the
+# field names once, then one list of values per survey.
+
+
+def _default(value):
+    # The types DRF's JSONEncoder knows beyond the msgpack basics
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as msgpack")
+
+
+def packb(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return packb(data)
+
+
+def columnar(rows, fields):
+    """{"columns": fields, "rows": [[value, ...], ...]} for a list of dicts with those keys."""
+    return {"columns": fields, "rows": [[row[field] for field in fields] for row in rows]}
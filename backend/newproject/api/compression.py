@@ -0,0 +1,118 @@
+import gzip
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .config import settings_section
+from .metrics import counter
+
+try:
+    import brotli
+except ImportError:  # Without the brotli package responses are only gzipped
+    brotli = None
+
+# Response compression. Text bodies of at least MIN_SIZE bytes are compressed with the
+# encoding the client accepts that comes first in ENCODINGS. Streaming responses (event
+# streams and file downloads) are passed through untouched: compressing an event stream
+# would hold events back, and the exported pdf/docx files are compressed already.
+
+DEFAULT_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,  # bytes; smaller bodies gain little and cost a round of CPU
+    'ENCODINGS': ['br', 'gzip'],  # server preference between encodings the client accepts equally
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,  # 0-11; above 5 the CPU cost grows much faster than the savings
+    'CONTENT_TYPES': ['application/json', 'application/msgpack', 'text/'],
+}
+
+RESPONSE_BYTES = counter("http_response_bytes_total", "Response body bytes before and after compression.",
+                         ["encoding", "stage"])
+
+
+compression_config = settings_section('COMPRESSION', DEFAULT_COMPRESSION)
+
+
+def available_encodings(encodings):
+    return [encoding for encoding in encodings if encoding == "gzip" or (encoding == "br" and brotli is not None)]
+
+
+def accepted_encodings(header):
+    """{encoding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or "").split(","):
+        encoding, _, params = part.strip().partition(";")
+        if not encoding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[encoding.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(header, encodings):
+    """The encoding to use for a request's Accept-Encoding, or None to send the body as is.
+
+    The highest q-value wins; ties go to the earlier entry of encodings.
+    """
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress response bodies according to settings.COMPRESSION."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        config = compression_config()
+        self.enabled = config['ENABLED']
+        self.min_size = config['MIN_SIZE']
+        self.encodings = available_encodings(config['ENCODINGS'])
+        self.gzip_level = config['GZIP_LEVEL']
+        self.brotli_quality = config['BROTLI_QUALITY']
+        self.content_types = tuple(config['CONTENT_TYPES'])
+
+    def process_response(self, request, response):
+        if not self.enabled or response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(self.content_types):
+            return response
+        if len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"), self.encodings)
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding, self.gzip_level, self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+        RESPONSE_BYTES.inc(len(response.content), encoding=encoding, stage="raw")
+        RESPONSE_BYTES.inc(len(compressed), encoding=encoding, stage="compressed")
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The compressed body is a different representation: a strong ETag must not match it
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,55 @@
+import functools
+import threading
+
+from django.conf import settings
+
+# The pattern the api modules share for their settings and process-wide components. Each
+# module declares DEFAULT_<NAME> and reads settings.<NAME> over it with settings_section,
+# and builds its component once per process, on first use, with lazy_singleton:
+#
+#     DEFAULT_SEARCH = {'ENABLED': True, ...}
+#     search_config = settings_section('SEARCH', DEFAULT_SEARCH)
+#
+#     @lazy_singleton
+#     def get_search_index():
+#         return SearchIndex(**options_from(search_config()))
+
+
+def settings_section(name, defaults):
+    """Return a function giving settings.<name> merged over defaults, read on every call
+    so overridden settings (e.g. in tests) take effect."""
+    def config():
+        return {**defaults, **getattr(settings, name, {})}
+    return config
+
+
+def options_from(config):
+    """The keyword arguments a settings section gives its component: lower-cased keys."""
+    return {key.lower(): value for key, value in config.items()}
+
+
+class lazy_singleton:
+    """Decorator turning a factory into a getter of the process-wide instance it builds.
+
+    The factory runs on the first call only, under a lock, and later calls return the
+    same instance. instance is None until then; set() replaces it, e.g. in tests.
+    """
+
+    def __init__(self, factory):
+        functools.update_wrapper(self, factory)
+        self.factory = factory
+        self.instance = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self.instance is None:
+            with self._lock:
+                if self.instance is None:
+                    self.instance = self.factory()
+        return self.instance
+
+    def set(self, instance):
+        """Replace the instance (None rebuilds it on the next call); returns the old one."""
+        with self._lock:
+            previous, self.instance = self.instance, instance
+        return previous
@@ -0,0 +1,154 @@
+import json
+import re
+
+from .cache import LRUCacheBackend
+from .documents import content_hash
+from .generation import SurveyValidationError
+
+# Structured form of a generated document, so clients render JSON instead of re-parsing
+# the markdown with regexes on every render. The tree looks like:
+#
+#   {"sections": [{"title": "1. Project Overview", "blocks": [
+#       {"type": "heading", "level": 3, "content": [...]},
+#       {"type": "paragraph", "content": [...]},
+#       {"type": "list", "ordered": false, "items": [[...], [...]]},
+#   ]}]}
+#
+# content is a list of inline spans: a plain string, {"strong": text} or {"em": text}.
+# Text before the first "## " heading lands in a section whose title is "".
+
+OUTPUT_FORMATS = ["both", "html", "tree", "markdown"]
+
+SECTION_HEADING = re.compile(r"^##\s+(.+?)\s*#*$")
+SUB_HEADING = re.compile(r"^(#{3,6})\s+(.+?)\s*#*$")
+NUMBERED_HEADING = re.compile(r"^\d+\.\s[A-Z]")
+# A label on a line of its own: "**Key Features:**", "**Key Features**:" or "Key Features:".
+# "Note: text" is a sentence, not a heading
+LABEL_HEADING = re.compile(r"^(?:\*\*[A-Z][\w\s/&()-]{0,60}(?::\*\*|\*\*:)|[A-Z][\w\s/&()-]{0,40}:)$")
+BULLET_ITEM = re.compile(r"^[-*+]\s+")
+NUMBERED_ITEM = re.compile(r"^\d+[.)]\s+")
+
+# Parsed trees by content hash; documents are immutable so entries never go stale
+TREE_CACHE_ENTRIES = 256
+_trees = LRUCacheBackend(ttl=None, max_entries=TREE_CACHE_ENTRIES)
+
+
+def parse_inline(text):
+    """Split text into spans at **strong** and *em* markers in one left-to-right scan."""
+    spans = []
+    plain = ""
+    # Once a marker has no closer further on, no later opener can be closed either,
+    # so unmatched markers are never searched for twice and the scan stays linear
+    closable = {"**": True, "*": True}
+    position = 0
+    while True:
+        star = text.find("*", position)
+        if star < 0:
+            plain += text[position:]
+            break
+        marker = "**" if text.startswith("**", star) else "*"
+        start = star + len(marker)
+        end = text.find(marker, start) if closable[marker] else -1
+        if end < 0:
+            closable[marker] = False
+        if end <= start:
+            plain += text[position:start]
+            position = start
+            continue
+        plain += text[position:star]
+        if plain:
+            spans.append(plain)
+            plain = ""
+        spans.append({"strong" if marker == "**" else "em": text[start:end]})
+        position = end + len(marker)
+    if plain:
+        spans.append(plain)
+    return spans
+
+
+def parse_document(content):
+    """Parse generated markdown into the section/block tree in a single pass over its lines."""
+    sections = []
+    section = None
+    current_list = None
+
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line:
+            current_list = None
+            continue
+
+        match = SECTION_HEADING.match(line)
+        if match:
+            section = {"title": match.group(1), "blocks": []}
+            sections.append(section)
+            current_list = None
+            continue
+        if section is None:
+            section = {"title": "", "blocks": []}
+            sections.append(section)
+        blocks = section["blocks"]
+
+        match = SUB_HEADING.match(line)
+        if match:
+            level = min(len(match.group(1)), 4)
+            blocks.append({"type": "heading", "level": level, "content": parse_inline(match.group(2))})
+            current_list = None
+        elif NUMBERED_HEADING.match(line):
+            blocks.append({"type": "heading", "level": 3, "content": parse_inline(line)})
+            current_list = None
+        elif BULLET_ITEM.match(line):
+            current_list = _list_item(blocks, current_list, False, line[BULLET_ITEM.match(line).end():])
+        elif NUMBERED_ITEM.match(line):
+            current_list = _list_item(blocks, current_list, True, line[NUMBERED_ITEM.match(line).end():])
+        elif LABEL_HEADING.match(line):
+            blocks.append({"type": "heading", "level": 4, "content": parse_inline(line)})
+            current_list = None
+        else:
+            blocks.append({"type": "paragraph", "content": parse_inline(line)})
+            current_list = None
+
+    return {"sections": sections}
+
+
+def _list_item(blocks, current_list, ordered, text):
+    if current_list is None or current_list["ordered"] != ordered:
+        current_list = {"type": "list", "ordered": ordered, "items": []}
+        blocks.append(current_list)
+    current_list["items"].append(parse_inline(text))
+    return current_list
+
+
+def document_tree(content, key=None):
+    """Return parse_document(content), parsing each distinct document only once per process.
+
+    key is the content's sha256 when the caller already has it (GeneratedDocument.content_hash).
+    """
+    key = key or content_hash(content)
+    encoded = _trees.get(key)
+    if encoded is None:
+        encoded = json.dumps(parse_document(content), separators=(",", ":"))
+        _trees.set(key, encoded)
+    # Callers get their own copy, so the cached tree can't be modified through a response
+    return json.loads(encoded)
+
+
+def output_format(user_input):
+    """Return the requested response format: the <br> text ("html"), the tree, both of
+    them, or the raw markdown ("markdown", the smallest)."""
+    value = (user_input or {}).get("output") or "both"
+    if value not in OUTPUT_FORMATS:
+        raise SurveyValidationError(f"Invalid output: must be one of {', '.join(OUTPUT_FORMATS)}")
+    return value
+
+
+def document_fields(content, fmt="both", key=None):
+    """Response fields carrying content in the requested output format."""
+    fields = {}
+    if fmt in ("both", "html"):
+        fields["response"] = content.replace('\n', '<br>')
+    if fmt in ("both", "tree"):
+        fields["document"] = document_tree(content, key)
+    if fmt == "markdown":
+        fields["markdown"] = content
+    return fields
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import re
+import zlib
+
+from django.db import transaction
+
+from .generation import GEMINI_MODEL, GENERATION_CONFIG
+from .metrics import LLM_TOKENS
+from .models import DocumentSection, GeneratedDocument
+from .search import index_document
+
+logger = logging.getLogger(__name__)
+
+SECTION_START = re.compile(r"^##\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+# Rough size of a Gemini token in characters, used when the response has no usage data
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def split_sections(content):
+    """Split markdown into [(heading, text)] at "## " headings.
+
+    Text before the first heading becomes a section with an empty heading. Joining the
+    texts gives back the original content exactly.
+    """
+    starts = [match.start() for match in SECTION_START.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = []
+    for start, end in zip(starts, starts[1:] + [len(content)]):
+        text = content[start:end]
+        if not text:
+            continue
+        match = SECTION_START.match(text)
+        sections.append((match.group(1)[:255] if match else "", text))
+    return sections
+
+
+def save_document(survey, content, prompt="", model_name=GEMINI_MODEL, generation_config=None,
+                  prompt_tokens=None, output_tokens=None, from_cache=False):
+    """Store content as survey's GeneratedDocument, one compressed row per section."""
+    prompt_tokens = prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt)
+    output_tokens = output_tokens if output_tokens is not None else estimate_tokens(content)
+    with transaction.atomic():
+        document = GeneratedDocument.objects.create(
+            survey=survey,
+            model_name=model_name,
+            generation_config=generation_config if generation_config is not None else GENERATION_CONFIG,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            content_hash=content_hash(content),
+            from_cache=from_cache,
+        )
+        DocumentSection.objects.bulk_create([
+            DocumentSection(
+                document=document,
+                position=position,
+                heading=heading,
+                body=zlib.compress(text.encode("utf-8")),
+            )
+            for position, (heading, text) in enumerate(split_sections(content))
+        ])
+        index_document(survey, content)
+    if not from_cache:
+        # Cached documents cost no model tokens
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(output_tokens, kind="output")
+    return document
+
+
+def save_document_safely(survey, content, **kwargs):
+    # Persisting is best effort: the caller already has the content to return
+    try:
+        return save_document(survey, content, **kwargs)
+    except Exception as e:
+        logger.error("Failed to store document for survey %s: %s", survey.id, e, exc_info=True)
+        return None
+
+
+def section_text(section):
+    return zlib.decompress(bytes(section.body)).decode("utf-8")
+
+
+def document_content(document):
+    return "".join(section_text(section) for section in document.sections.all())
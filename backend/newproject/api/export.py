@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from .config import lazy_singleton, options_from, settings_section
+from .doctree import document_tree
+from .documents import content_hash
+from .renderers import FORMATS, RENDERER_VERSION, render, render_markdown, unsupported_characters
+
+logger = logging.getLogger(__name__)
+
+# Server-side document export. Documents are rendered by api.renderers in a pool of worker
+# processes (the renderers are pure Python and CPU bound, so threads would serialise on
+# the GIL) and the files are kept in EXPORT['PATH'] under a name derived from the document
+# hash, the format, the cover page and the renderer version. A repeat download of the
+# same document is then a plain file read. Files unused for MAX_AGE seconds, and the least
+# recently used ones beyond MAX_BYTES, are deleted after renders.
+#
+# PDFs are set in Helvetica unless PDF_FONT names a TrueType font to embed; without one,
+# documents with characters outside cp1252 (Greek, Cyrillic, CJK...) are refused rather
+# than exported with "?" in their place.
+
+DEFAULT_EXPORT = {
+    'PATH': None,  # directory, defaults to BASE_DIR / 'exports'
+    'WORKERS': 2,
+    'EXECUTOR': 'process',  # or 'thread'
+    'TIMEOUT': 120,  # seconds to wait for one render
+    'MAX_BYTES': 1024 * 1024 * 1024,  # None keeps every file
+    'MAX_AGE': 30 * 24 * 60 * 60,  # seconds since last download; None keeps every file
+    'PDF_FONT': None,  # path of a TrueType font to embed in PDFs
+    'PDF_BOLD_FONT': None,  # defaults to PDF_FONT
+}
+
+# Seconds between scans of the export directory for files to delete
+PRUNE_INTERVAL = 60
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "md": "text/markdown; charset=utf-8",
+}
+
+COVER_FIELDS = ("title", "author", "company")
+COVER_FIELD_MAX_LENGTH = 200
+
+
+class InvalidExportRequest(ValueError):
+    pass
+
+
+export_config = settings_section('EXPORT', DEFAULT_EXPORT)
+
+
+def cover_from(params):
+    """Cover page fields from the query parameters; an empty dict means no cover page."""
+    cover = {}
+    for field in COVER_FIELDS:
+        value = (params.get(field) or "").strip()
+        if len(value) > COVER_FIELD_MAX_LENGTH:
+            raise InvalidExportRequest(f"{field} must be at most {COVER_FIELD_MAX_LENGTH} characters")
+        if value:
+            cover[field] = value
+    return cover
+
+
+def artifact_name(document_hash, fmt, cover, fonts=None):
+    key = json.dumps([document_hash, fmt, cover, RENDERER_VERSION, fonts], sort_keys=True)
+    return f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.{fmt}"
+
+
+class Exporter:
+    """Renders documents on a worker pool and keeps the files on disk."""
+
+    def __init__(self, path=None, workers=2, executor='process', timeout=120, max_bytes=None,
+                 max_age=None, pdf_font=None, pdf_bold_font=None):
+        self.directory = Path(path or settings.BASE_DIR / 'exports')
+        self.workers = workers
+        self.executor = executor
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pdf_fonts = [str(pdf_font), str(pdf_bold_font or pdf_font)] if pdf_font else None
+        self.hits = 0
+        self.renders = 0
+        self.failures = 0
+        self.evictions = 0
+        self._pruned_at = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.executor == 'process':
+                        # spawn rather than fork: the server process is multi-threaded
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def export(self, content, fmt, cover=None, key=None):
+        """Return the path of content rendered as fmt, rendering it only if not stored yet.
+
+        key is the content's sha256 when the caller already has it (GeneratedDocument.content_hash).
+        """
+        if fmt not in FORMATS:
+            raise InvalidExportRequest(f"Invalid format: must be one of {', '.join(FORMATS)}")
+        cover = cover or {}
+        fonts = self.pdf_fonts if fmt == "pdf" else None
+        path = self.directory / artifact_name(key or content_hash(content), fmt, cover, fonts)
+        try:
+            # Marks the file as recently used, for pruning
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                self.hits += 1
+            return path
+
+        if fmt == "pdf" and not fonts:
+            unsupported = unsupported_characters(content + "".join(cover.values()))
+            if unsupported:
+                raise InvalidExportRequest(
+                    f"The document has characters PDF export cannot show: {''.join(unsupported[:20])}"
+                )
+        try:
+            if fmt == "md":
+                data = render_markdown(content, cover)
+            else:
+                tree = document_tree(content, key)
+                data = self.pool().submit(render, fmt, tree, cover, fonts).result(timeout=self.timeout)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        # Write under a temporary name first so readers never see a partial file
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self.renders += 1
+            prune = self._pruned_at is None or time.monotonic() - self._pruned_at >= PRUNE_INTERVAL
+            if prune:
+                self._pruned_at = time.monotonic()
+        logger.info("Rendered %s export %s (%s bytes)", fmt, path.name, len(data))
+        if prune:
+            self.prune()
+        return path
+
+    def prune(self):
+        """Delete the files unused for max_age seconds, then the least recently used ones
+        until the directory holds at most max_bytes. Returns the number deleted."""
+        if not self.max_bytes and not self.max_age:
+            return 0
+        now = time.time()
+        files = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    # Only leftovers of crashed renders count among the temporary files
+                    stale = self.max_age and now - stat.st_mtime > self.max_age
+                    if entry.is_file() and (stale or not entry.name.endswith(".tmp")):
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for used_at, size, name in files:
+            expired = self.max_age and now - used_at > self.max_age
+            if not expired and not (self.max_bytes and total > self.max_bytes):
+                break
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+        if deleted:
+            with self._lock:
+                self.evictions += deleted
+            logger.info("Deleted %s export files, %s bytes left", deleted, total)
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "renders": self.renders,
+                "failures": self.failures,
+                "evictions": self.evictions,
+                "workers": self.workers,
+                "executor": self.executor,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+@lazy_singleton
+def get_exporter():
+    """Return the process-wide Exporter built from settings.EXPORT."""
+    return Exporter(**options_from(export_config()))
@@ -0,0 +1,129 @@
+import asyncio
+import random
+import re
+import threading
+import time
+
+# Outline entries in a prompt, e.g. "12. Model Description" or "1. Abstract (40 lines)"
+OUTLINE_ITEM = re.compile(r"^\d+\.\s+(.+?)(?:\s+\(\d+ lines\))?\s*$", re.MULTILINE)
+# Headings named in a prompt without an outline, e.g. "## Conclusion"
+HEADING_ITEM = re.compile(r"##\s+([^,]+)")
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for the provider's 429 (google.api_core.exceptions.ResourceExhausted)."""
+
+    code = 429
+
+    def __init__(self, message="429 Resource has been exhausted (e.g. check quota)."):
+        super().__init__(message)
+
+
+class FakeCandidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class FakeResponse:
+    """Mimics the parts of GenerateContentResponse the views rely on."""
+
+    def __init__(self, chunks, chunk_delay=0.0, finish_reason="STOP", error=None):
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+        # Raised when the reply is first read, like a streamed call's 429
+        self._error = error
+        self.candidates = [FakeCandidate(finish_reason)]
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def __iter__(self):
+        if self._error:
+            raise self._error
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield FakeResponse([chunk])
+
+    async def __aiter__(self):
+        if self._error:
+            raise self._error
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse([chunk])
+
+
+class FakeGenerativeModel:
+    """Local stand-in for genai.GenerativeModel that never leaves the process.
+
+    The reply contains a "## <title>" section for every outline item or heading named in the
+    prompt, so documents produced by it pass section validation. Latency, chunking, the
+    amount of body text, truncation and injected 429s are configurable for tests and
+    benchmarks. An injected 429 of a streamed call is raised when its reply is read.
+    """
+
+    def __init__(self, model_name="fake", generation_config=None, latency=0.0,
+                 chunk_size=256, chunk_delay=0.0, paragraphs=2, text=None,
+                 throttle_rate=0.0, throttle_first=0, max_chars=None, seconds_per_char=0.0):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.latency = latency
+        # Added to latency for every character of the reply, like a model's decode speed
+        self.seconds_per_char = seconds_per_char
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.paragraphs = paragraphs
+        self.text = text
+        # Replies longer than max_chars are cut off there, as at the output token cap
+        self.max_chars = max_chars
+        # 429 injection: fail this fraction of calls at random, and/or the first N calls
+        self.throttle_rate = throttle_rate
+        self.throttle_first = throttle_first
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _throttled(self):
+        with self._calls_lock:
+            self.calls += 1
+            call = self.calls
+        return call <= self.throttle_first or bool(self.throttle_rate and random.random() < self.throttle_rate)
+
+    def render(self, prompt):
+        if self.text is not None:
+            return self.text
+        titles = OUTLINE_ITEM.findall(prompt) or [title.strip() for title in HEADING_ITEM.findall(prompt)]
+        body = "\n\n".join(
+            "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+            "incididunt ut labore et dolore magna aliqua."
+            for _ in range(self.paragraphs)
+        )
+        return "\n\n".join(f"## {title}\n\n{body}\n\n- First point\n- Second point" for title in titles)
+
+    def _response(self, prompt, stream):
+        throttled = self._throttled()
+        if throttled and not stream:
+            raise FakeRateLimitError()
+        text = self.render(prompt)
+        finish_reason = "STOP"
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text, finish_reason = text[:self.max_chars], "MAX_TOKENS"
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        return FakeResponse(chunks, self.chunk_delay if stream else 0.0, finish_reason,
+                            FakeRateLimitError() if throttled else None)
+
+    def _delay(self, response):
+        return self.latency + self.seconds_per_char * len(response.text)
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        response = self._response(contents, stream)
+        if self._delay(response):
+            time.sleep(self._delay(response))
+        return response
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        response = self._response(contents, stream)
+        if self._delay(response):
+            await asyncio.sleep(self._delay(response))
+        return response
@@ -0,0 +1,266 @@
+import logging
+
+from django.conf import settings
+
+from .cache import get_document_cache, make_cache_key
+from .llm import get_model
+from .metrics import stage
+from .singleflight import get_single_flight
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-1.5-pro"  # Updated to use gemini-1.5-pro
+
+# Default config the model is created with (used by the missing sections follow-up)
+MODEL_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+# Generation config for the full document
+GENERATION_CONFIG = {
+    "temperature": 0.9,  # Increased for more creative responses
+    "top_p": 0.9,
+    "top_k": 40,
+    "max_output_tokens": 8192,  # Increased token limit
+}
+
+# The 18 sections every document is made of, in order
+OUTLINE = [
+    {"title": "Abstract", "lines": 40},
+    {"title": "Table of Contents"},
+    {"title": "Introduction", "lines": 30},
+    {"title": "Project Overview", "lines": 35},
+    {"title": "Literature Review"},
+    {"title": "Problem Statement & Motivation"},
+    {"title": "Aim and Objectives"},
+    {"title": "Methodology"},
+    {"title": "Functional & Non-Functional Requirements"},
+    {"title": "System Architecture"},
+    {"title": "Software & Hardware Requirements"},
+    {"title": "Model Description", "points": [
+        "Detailed explanation of model selection",
+        "Working mechanism analysis",
+        "Justification for model choice",
+    ]},
+    {"title": "Input and Output Design", "points": [
+        "Input parameters specification",
+        "Data flow description",
+        "Expected output formats",
+    ]},
+    {"title": "Testing and Implementation", "points": [
+        "Testing strategies",
+        "Implementation phases",
+        "Validation steps",
+    ]},
+    {"title": "Deployment Strategy", "points": [
+        "Deployment scenarios",
+        "Implementation steps",
+        "Resource requirements",
+    ]},
+    {"title": "Maintenance and Future Enhancements", "points": [
+        "Maintenance procedures",
+        "Potential improvements",
+        "Scalability considerations",
+    ]},
+    {"title": "Conclusion", "lines": 30},
+    {"title": "References"},
+]
+
+REQUIRED_FIELDS = ["industry", "targetAudience", "technology"]
+LIST_FIELDS = ["technology", "web_frontend", "web_backend", "web_hosting", "web_database", "security_features"]
+TEXT_FIELDS = ["industry", "industry_other", "target_audience", "sub_technology", "platform"]
+
+
+GENERATION_MODES = ["single", "sectioned"]
+
+
+class SurveyValidationError(ValueError):
+    pass
+
+
+class SurveyBatchValidationError(SurveyValidationError):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid survey(s) in batch")
+        self.errors = errors
+
+
+def parse_survey_payload(user_input):
+    """Validate a survey form payload and map it onto Survey model fields.
+
+    Raises SurveyValidationError with a client-facing message when the payload is invalid.
+    """
+    if not user_input:
+        raise SurveyValidationError("No input data provided")
+
+    # Validate required fields
+    missing_fields = [field for field in REQUIRED_FIELDS if not user_input.get(field)]
+    if missing_fields:
+        raise SurveyValidationError(f"Missing required fields: {', '.join(missing_fields)}")
+
+    # Initialize empty lists for optional fields
+    survey_data = {
+        "industry": user_input.get("industry"),
+        "industry_other": user_input.get("industryOther") or "",
+        "target_audience": user_input.get("targetAudience"),
+        "technology": user_input.get("technology") or [],
+        "sub_technology": user_input.get("subTechnology") or "",
+        "platform": user_input.get("platform") or "",
+        "web_frontend": user_input.get("webFrontend") or [],
+        "web_backend": user_input.get("webBackend") or [],
+        "web_hosting": user_input.get("webHosting") or [],
+        "web_database": user_input.get("webDatabase") or [],
+        "security_features": user_input.get("securityFeatures") or []
+    }
+
+    # Validate data types
+    for field in TEXT_FIELDS:
+        if not isinstance(survey_data[field], str):
+            raise SurveyValidationError(f"Invalid data type for {field}: must be a string")
+    for field in LIST_FIELDS:
+        if not isinstance(survey_data[field], list):
+            raise SurveyValidationError(f"Invalid data type for {field}: must be a list")
+        # The prompt, the cache key and the search index all expect lists of strings
+        if not all(isinstance(item, str) for item in survey_data[field]):
+            raise SurveyValidationError(f"Invalid data type for {field}: must be a list of strings")
+
+    return survey_data
+
+
+def parse_survey_batch(user_input, max_surveys):
+    """Validate every survey of a batch payload ({"surveys": [...]}) in one pass.
+
+    Returns the list of survey_data dicts, or raises SurveyBatchValidationError listing
+    the problem with each invalid item by its index.
+    """
+    surveys = (user_input or {}).get("surveys")
+    if not isinstance(surveys, list) or not surveys:
+        raise SurveyValidationError("surveys must be a non-empty list")
+    if len(surveys) > max_surveys:
+        raise SurveyValidationError(f"A batch may contain at most {max_surveys} surveys")
+
+    parsed, errors = [], {}
+    for index, item in enumerate(surveys):
+        try:
+            if not isinstance(item, dict):
+                raise SurveyValidationError("Each survey must be an object")
+            parsed.append(parse_survey_payload(item))
+        except SurveyValidationError as e:
+            errors[index] = str(e)
+    if errors:
+        raise SurveyBatchValidationError(errors)
+    return parsed
+
+
+def generation_mode(user_input):
+    """Return the generation mode requested by the payload, defaulting to settings.GENERATION_MODE."""
+    mode = (user_input or {}).get("mode") or getattr(settings, "GENERATION_MODE", "single")
+    if mode not in GENERATION_MODES:
+        raise SurveyValidationError(f"Invalid mode: must be one of {', '.join(GENERATION_MODES)}")
+    return mode
+
+
+def outline_text(sections=None):
+    """Render outline entries the way the prompt lists them, numbered by their position."""
+    lines = []
+    for number, section in enumerate(OUTLINE, start=1):
+        if sections is not None and section not in sections:
+            continue
+        title = section["title"]
+        if section.get("lines"):
+            title += f" ({section['lines']} lines)"
+        lines.append(f"{number}. {title}")
+        lines.extend(f"- {point}" for point in section.get("points", []))
+    return "\n".join(lines)
+
+
+def specifications_text(survey_data):
+    technologies = ", ".join(survey_data.get("technology") or [])
+    frontend = ", ".join(survey_data.get("web_frontend") or [])
+    backend = ", ".join(survey_data.get("web_backend") or [])
+    database = ", ".join(survey_data.get("web_database") or [])
+
+    return f"""Technical Specifications:
+Industry: {survey_data.get('industry')}
+Technologies: {technologies}
+Frontend: {frontend}
+Backend: {backend}
+Database: {database}"""
+
+
+def build_prompt(survey_data):
+    return f"""Create a comprehensive project documentation for a {survey_data.get('industry')} project. Follow this EXACT structure and include ALL sections:
+
+{outline_text()}
+
+Important:
+- Each section MUST begin with its corresponding heading (e.g., "## Model Description")
+- Include ALL sections listed above
+- Maintain consistent formatting
+- Use proper section breaks
+- Ensure comprehensive coverage of each topic
+- Keep the specified line counts where indicated
+
+{specifications_text(survey_data)}
+
+Please provide detailed content for each section, ensuring no sections are omitted."""
+
+
+def create_model():
+    """Return the shared model handle for GEMINI_MODEL from the configured provider."""
+    return get_model(GEMINI_MODEL, MODEL_CONFIG)
+
+
+def validate_response(model, response_text, survey_data, response=None, plan=None):
+    """Regenerate the outline sections response_text is missing or has cut off and splice
+    them in (api.repair). response is the model's reply, for its finish reason; plan is
+    the request's RoutePlan, whose tiers the sections are regenerated with."""
+    from .repair import repair_sections
+
+    with stage("followup"):
+        return repair_sections(model, survey_data, response_text, response, plan)
+
+
+def generate_document(survey_data, model=None, mode=None):
+    """Run the full generation for survey_data, going through the document cache.
+
+    Returns (content, cached); cached is also True when an identical generation already
+    in flight was shared. Generation errors propagate to the caller.
+    """
+    from .routing import route_survey
+    from .sectioned import generate_sectioned_document
+
+    plan = route_survey(survey_data, model)
+    document_cache = get_document_cache()
+    cache_key = make_cache_key(survey_data, plan.model_name, plan.generation_config)
+    cached_content = document_cache.get(cache_key)
+    if cached_content is not None:
+        return cached_content, True
+
+    def generate():
+        tier = plan.document_tier
+        generation_model = tier.model()
+        if plan.generation_mode(mode or generation_mode(None)) == "sectioned":
+            content = generate_sectioned_document(generation_model, survey_data, plan)
+        else:
+            response = generation_model.generate_content(
+                contents=build_prompt(survey_data), generation_config=tier.generation_config
+            )
+            if not (response and hasattr(response, 'text')):
+                raise ValueError("Invalid response format from Gemini API")
+            content = validate_response(generation_model, response.text, survey_data, response, plan)
+        document_cache.set(cache_key, content)
+        return content
+
+    # Shares the generation with identical requests already in flight (api.singleflight)
+    return get_single_flight().do(cache_key, generate, recheck=lambda: document_cache.get(cache_key))
+
+
+async def avalidate_response(model, response_text, survey_data, response=None, plan=None):
+    """Async counterpart of validate_response."""
+    from .repair import arepair_sections
+
+    with stage("followup"):
+        return await arepair_sections(model, survey_data, response_text, response, plan)
@@ -0,0 +1,268 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Count, F
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from .config import lazy_singleton, options_from, settings_section
+from .documents import save_document
+from .generation import build_prompt, generate_document
+from .metrics import gauge
+from .models import GeneratedDocument, GenerationJob
+from .ratelimit import TokenBucket
+from .routing import route_survey
+from .scheduler import BACKGROUND, llm_priority
+from .writer import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_QUEUE = {
+    'WORKERS': 2,
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_SECONDS': 5,
+    'BACKOFF_MAX_SECONDS': 300,
+    'POLL_INTERVAL': 1.0,
+    'STALE_AFTER_SECONDS': 15 * 60,
+    'RUN_IN_PROCESS': True,
+    'RATE_PER_MINUTE': 0,
+    'RATE_BURST': 1,
+}
+
+
+# Workers look for jobs left running by dead processes every this many polls
+STALE_SWEEP_POLLS = 60
+
+job_queue_config = settings_section('JOB_QUEUE', DEFAULT_JOB_QUEUE)
+
+
+def run_generation_job(job):
+    """Generate and store the document for job.survey and return it."""
+    survey_data = model_to_dict(job.survey, exclude=['id', 'created_at'])
+    # Queued work yields the model budget to interactive requests
+    with llm_priority(BACKGROUND):
+        content, cached = generate_document(survey_data)
+    if cached:
+        logger.info("Job %s served from the document cache", job.id)
+    if not GeneratedDocument.objects.filter(survey=job.survey).exists():
+        plan = route_survey(survey_data)
+        save_document(job.survey, content, prompt=build_prompt(survey_data), from_cache=cached,
+                      model_name=plan.model_name, generation_config=plan.generation_config)
+    return content
+
+
+class JobQueue:
+    """Database-backed generation queue worked by a pool of threads.
+
+    GenerationJob rows are the queue: any process running workers (the web process, or
+    manage.py run_jobs) claims jobs with a conditional UPDATE, so no broker is needed and
+    queued work survives restarts. The number of worker threads bounds how many
+    generations run at once, and with rate_per_minute set a token bucket paces how often
+    jobs may start in this process. Failed attempts are retried with exponential backoff,
+    and jobs left running by a process that died are requeued once they go stale.
+    """
+
+    def __init__(self, workers, max_attempts, backoff_seconds, backoff_max_seconds,
+                 poll_interval, stale_after_seconds, handler=run_generation_job,
+                 rate_per_minute=0, rate_burst=1, **options):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.poll_interval = poll_interval
+        self.stale_after_seconds = stale_after_seconds
+        self.handler = handler
+        self.rate_limiter = TokenBucket.per_minute(rate_per_minute, rate_burst) if rate_per_minute else None
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self._threads = []
+        self._pid = None
+        self._next_sweep = 0.0
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            # Worker threads do not survive a fork (e.g. gunicorn --preload): start anew in the child
+            if self._threads and self._pid == os.getpid():
+                return
+            self._threads = []
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"generation-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info("Started %s generation workers", self.workers)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+
+    def submit(self, survey):
+        job = GenerationJob.objects.create(survey=survey)
+        self._notify()
+        return job
+
+    def submit_many(self, surveys):
+        # One INSERT for the whole batch; the workers pick the jobs up in id order
+        jobs = bulk_insert([GenerationJob(survey=survey) for survey in surveys])
+        self._notify()
+        return jobs
+
+    def backoff(self, attempts):
+        return min(self.backoff_max_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+
+    def stats(self):
+        counts = dict(
+            GenerationJob.objects.values_list('status').annotate(count=Count('id')).order_by()
+        )
+        return {
+            'queue_depth': counts.get(GenerationJob.STATUS_QUEUED, 0),
+            'jobs': {status: counts.get(status, 0) for status, _ in GenerationJob.STATUS_CHOICES},
+            'workers': len(self._threads),
+            'in_flight': self.running,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate_limit_wait_seconds': round(self.rate_limiter.waited, 3) if self.rate_limiter else None,
+        }
+
+    def _notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _sweep_if_due(self):
+        # One worker at a time, every STALE_SWEEP_POLLS polls, beginning with the first
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + self.poll_interval * STALE_SWEEP_POLLS
+        try:
+            self._requeue_stale_jobs()
+        except Exception as e:
+            logger.error("Failed to requeue stale generation jobs: %s", e)
+
+    def _requeue_stale_jobs(self):
+        # Jobs left running by a process that died mid-generation
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after_seconds)
+        requeued = GenerationJob.objects.filter(
+            status=GenerationJob.STATUS_RUNNING, started_at__lt=cutoff
+        ).update(status=GenerationJob.STATUS_QUEUED, available_at=timezone.now())
+        if requeued:
+            logger.warning("Requeued %s stale generation jobs", requeued)
+
+    def _claim(self):
+        now = timezone.now()
+        candidates = GenerationJob.objects.filter(
+            status=GenerationJob.STATUS_QUEUED, available_at__lte=now
+        ).order_by('available_at', 'id').values_list('id', flat=True)[:self.workers]
+        for job_id in candidates:
+            claimed = GenerationJob.objects.filter(id=job_id, status=GenerationJob.STATUS_QUEUED).update(
+                status=GenerationJob.STATUS_RUNNING, attempts=F('attempts') + 1, started_at=now
+            )
+            if claimed:
+                return GenerationJob.objects.select_related('survey').get(id=job_id)
+        return None
+
+    def _work(self):
+        while not self._stopping.is_set():
+            close_old_connections()
+            self._sweep_if_due()
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error("Failed to claim generation job: %s", e)
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+        close_old_connections()
+
+    def _run(self, job):
+        if self.rate_limiter and not self.rate_limiter.acquire(stop=self._stopping):
+            # Stopped while waiting for a token: hand the job back untouched
+            GenerationJob.objects.filter(id=job.id).update(
+                status=GenerationJob.STATUS_QUEUED, attempts=F('attempts') - 1, started_at=None
+            )
+            return
+        with self._lock:
+            self.running += 1
+        try:
+            result = self.handler(job)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            GenerationJob.objects.filter(id=job.id).update(
+                status=GenerationJob.STATUS_SUCCEEDED, result=result, error=None, finished_at=timezone.now()
+            )
+            with self._lock:
+                self.succeeded += 1
+            logger.info("Generation job %s succeeded after %s attempt(s)", job.id, job.attempts)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _fail(self, job, error):
+        if job.attempts < self.max_attempts:
+            delay = self.backoff(job.attempts)
+            logger.warning("Generation job %s attempt %s failed, retrying in %ss: %s", job.id, job.attempts, delay, error)
+            GenerationJob.objects.filter(id=job.id).update(
+                status=GenerationJob.STATUS_QUEUED, error=str(error),
+                available_at=timezone.now() + timedelta(seconds=delay),
+            )
+            with self._lock:
+                self.retried += 1
+        else:
+            logger.error("Generation job %s failed after %s attempts: %s", job.id, job.attempts, error)
+            GenerationJob.objects.filter(id=job.id).update(
+                status=GenerationJob.STATUS_FAILED, error=str(error), finished_at=timezone.now()
+            )
+            with self._lock:
+                self.failed += 1
+
+
+@lazy_singleton
+def get_job_queue():
+    """Return the process-wide JobQueue built from settings.JOB_QUEUE."""
+    return JobQueue(**options_from(job_queue_config()))
+
+
+def start_in_process_workers():
+    """Start this process's workers if JOB_QUEUE['RUN_IN_PROCESS'] is set; a no-op once
+    they run. Called when the app is ready, so queued jobs are picked up after a restart
+    without waiting for the next submission, and again on submission, e.g. after a fork."""
+    if job_queue_config()['RUN_IN_PROCESS']:
+        get_job_queue().start()
+
+
+def enqueue_survey(survey):
+    """Queue generation for survey, starting in-process workers if configured to."""
+    start_in_process_workers()
+    return get_job_queue().submit(survey)
+
+
+def enqueue_surveys(surveys):
+    """Queue generation for many surveys at once; see enqueue_survey."""
+    start_in_process_workers()
+    return get_job_queue().submit_many(surveys)
+
+
+def _queue_depth():
+    return {(): GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED).count()}
+
+
+QUEUE_DEPTH = gauge("generation_jobs_queued", "Generation jobs waiting for a worker.", collect=_queue_depth)
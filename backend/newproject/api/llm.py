@@ -0,0 +1,156 @@
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+
+from django.conf import settings
+
+from .config import lazy_singleton
+from .fakes import FakeGenerativeModel
+from .scheduler import ScheduledModel, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Process-wide language model client layer. A provider hands out model handles that
+# expose generate_content(contents, generation_config=..., stream=...) and
+# generate_content_async(...). Handles are built once per (model, config) pair and
+# shared by every request, so the per-request cost is a dict lookup and all calls reuse
+# the provider's long-lived connection instead of setting one up per request. Unless
+# LLM_SCHEDULER is disabled, handles send their calls through the api.scheduler budgets.
+# The Gemini SDK (google.generativeai and its gRPC/protobuf stack) is only imported when
+# the first Gemini model handle is built, so processes that never generate never load it.
+
+SDK_MODULE = "google.generativeai"
+
+
+def _config_key(generation_config):
+    return json.dumps(generation_config or {}, sort_keys=True)
+
+
+class LLMProvider:
+    """Base class for model providers; subclasses implement create_model."""
+
+    name = None
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def create_model(self, model_name, generation_config):
+        raise NotImplementedError
+
+    def get_model(self, model_name, generation_config=None):
+        key = (model_name, _config_key(generation_config))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self.create_model(model_name, generation_config)
+                    scheduler = get_scheduler()
+                    if scheduler.enabled:
+                        model = ScheduledModel(model, scheduler, generation_config)
+                    self._models[key] = model
+                    logger.info("Created %s model handle for %s", self.name, model_name)
+        return model
+
+
+class GeminiProvider(LLMProvider):
+    """Gemini API models sharing one configured client.
+
+    google.generativeai keeps a single process-wide transport once configured: a gRPC
+    channel (one multiplexed HTTP/2 connection) by default, or a keep-alive HTTP session
+    with transport='rest'.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key=None, transport=None):
+        super().__init__()
+        self.api_key = api_key
+        self.transport = transport
+        self._configured = False
+
+    def configure(self):
+        if self._configured:
+            return
+        api_key = self.api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("Gemini API key not found in environment variables.")
+        import google.generativeai as genai
+
+        options = {"api_key": api_key}
+        if self.transport:
+            options["transport"] = self.transport
+        genai.configure(**options)
+        self._configured = True
+
+    def create_model(self, model_name, generation_config):
+        self.configure()
+        import google.generativeai as genai
+
+        return genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+
+
+class FakeProvider(LLMProvider):
+    """Local provider backed by api.fakes.FakeGenerativeModel, for tests and benchmarks.
+
+    models maps a model name to options that override the shared ones for that model, so
+    e.g. routing tiers can be given different latencies.
+    """
+
+    name = "fake"
+
+    def __init__(self, models=None, **options):
+        super().__init__()
+        self.models = models or {}
+        self.options = options
+
+    def create_model(self, model_name, generation_config):
+        options = {**self.options, **self.models.get(model_name, {})}
+        return FakeGenerativeModel(model_name=model_name, generation_config=generation_config, **options)
+
+
+def build_provider():
+    name = getattr(settings, "GEMINI_PROVIDER", "gemini")
+    if name == "fake":
+        return FakeProvider(**getattr(settings, "FAKE_GEMINI", {}))
+    if name == "gemini":
+        return GeminiProvider(transport=getattr(settings, "GEMINI_TRANSPORT", None))
+    raise ValueError(f"Unknown GEMINI_PROVIDER: {name}")
+
+
+@lazy_singleton
+def get_provider():
+    """Return the process-wide provider selected by settings.GEMINI_PROVIDER."""
+    return build_provider()
+
+
+def set_provider(provider):
+    """Replace the process-wide provider, e.g. with a FakeProvider in tests. Returns the old one."""
+    return get_provider.set(provider)
+
+
+def get_model(model_name, generation_config=None):
+    return get_provider().get_model(model_name, generation_config)
+
+
+def configuration_errors():
+    """Problems that keep the configured provider from making model calls, as messages."""
+    name = getattr(settings, "GEMINI_PROVIDER", "gemini")
+    if name == "fake":
+        return []
+    if name != "gemini":
+        return [f"Unknown GEMINI_PROVIDER: {name}"]
+    errors = []
+    if not os.getenv("GEMINI_API_KEY"):
+        errors.append("Gemini API key not found in environment variables.")
+    if SDK_MODULE not in sys.modules and importlib.util.find_spec(SDK_MODULE) is None:
+        errors.append("The google-generativeai package is not installed.")
+    return errors
+
+
+def sdk_loaded():
+    return SDK_MODULE in sys.modules
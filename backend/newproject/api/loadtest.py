@@ -0,0 +1,209 @@
+import json
+import os
+import socket
+from collections import Counter
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Helpers shared by the benchmark management commands: spawn a local server against a
+# scratch database with the fake model provider, drive it with concurrent HTTP requests
+# and summarize the latencies.
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def _request(url, payload, timeout):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except (urllib.error.URLError, OSError):
+        status = "error"
+    # 304 is a success for conditional requests
+    ok = status != "error" and (200 <= status < 300 or status == 304)
+    return ok, time.perf_counter() - started, status
+
+
+def run_load(url, total, concurrency, payload_for=None, timeout=300):
+    """Send total requests to url, at most concurrency at a time, and summarize them.
+
+    payload_for(i) returns the JSON body of request i, or None for a GET.
+    """
+    payload_for = payload_for or (lambda i: None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _request(url, payload_for(i), timeout), range(total)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for ok, latency, _ in results if ok]
+    summary = summarize(latencies, len(results) - len(latencies), elapsed)
+    statuses = Counter(str(status) for _, _, status in results)
+    summary["statuses"] = dict(sorted(statuses.items()))
+    return summary
+
+
+def survey_payload(i):
+    # A distinct industry per request keeps every call a document cache miss
+    return {
+        "industry": f"Benchmark {i}",
+        "targetAudience": "Enterprises",
+        "technology": ["AI", "SaaS"],
+        "webFrontend": ["React"],
+        "webBackend": ["Django"],
+        "webDatabase": ["PostgreSQL"],
+    }
+
+
+def server_env(database_path, **overrides):
+    env = dict(os.environ)
+    env["GEMINI_PROVIDER"] = "fake"
+    env["SQLITE_PATH"] = str(database_path)
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+def migrate(env):
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--no-input", "-v", "0"],
+        cwd=settings.BASE_DIR, env=env, check=True,
+    )
+
+
+def seed_surveys(env, count):
+    """Insert count surveys into the server's database, so read endpoints have rows to return."""
+    code = (
+        "from api.models import Survey; Survey.objects.bulk_create(["
+        "Survey(industry=f'Seed {i}', target_audience='Enterprises', technology=['AI', 'SaaS'], "
+        f"web_frontend=['React'], web_backend=['Django']) for i in range({int(count)})], batch_size=500)"
+    )
+    subprocess.run(
+        [sys.executable, "manage.py", "shell", "-c", code],
+        cwd=settings.BASE_DIR, env=env, check=True,
+    )
+
+
+def _proc_status(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            fields[name] = value.strip()
+    return fields
+
+
+def process_memory(pid):
+    """{pid: {"rss_mb", "peak_rss_mb"}} for pid and every process below it, e.g. a server
+    master and its workers. Read from /proc, so empty on systems without it."""
+    if not os.path.isdir("/proc"):
+        return {}
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                parents[int(entry)] = int(_proc_status(entry).get("PPid", 0))
+            except (OSError, ValueError):
+                continue
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(frontier)
+    memory = {}
+    for member in tree:
+        try:
+            status = _proc_status(member)
+        except OSError:
+            continue
+        memory[member] = {
+            "rss_mb": round(int(status.get("VmRSS", "0 kB").split()[0]) / 1024, 1),
+            "peak_rss_mb": round(int(status.get("VmHWM", "0 kB").split()[0]) / 1024, 1),
+        }
+    return memory
+
+
+SERVER_COMMANDS = {
+    "gunicorn": lambda port, workers, threads: [
+        sys.executable, "-m", "gunicorn", "newproject.wsgi:application",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads),
+        "--timeout", "600", "--log-level", "warning",
+    ],
+    "uvicorn": lambda port, workers, threads: [
+        sys.executable, "-m", "uvicorn", "newproject.asgi:application",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning", "--no-access-log",
+    ],
+}
+
+
+class LocalServer:
+    """Runs gunicorn (WSGI) or uvicorn (ASGI) on a free port for the duration of a with block."""
+
+    def __init__(self, server, env, workers=1, threads=1, startup_timeout=30):
+        self.server = server
+        self.env = env
+        self.workers = workers
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self.port = free_port()
+        self.process = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        command = SERVER_COMMANDS[self.server](self.port, self.workers, self.threads)
+        self.process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=self.env)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.server} exited with code {self.process.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"{self.server} did not start within {self.startup_timeout}s")
+
+    def __exit__(self, *exc_info):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
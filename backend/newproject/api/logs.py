@@ -0,0 +1,219 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+
+from django.utils.deprecation import MiddlewareMixin
+
+from .metrics import counter
+
+# Structured, non-blocking logging. Request threads only put records on a bounded queue
+# (QueueHandler); a listener thread per process formats them and writes them out. Only
+# the message is built on the request thread, so it shows the arguments as they were.
+# Records carry the id of the request that logged them, events can be sampled, and long
+# messages and fields are truncated. Configured from settings.LOGGING; see LOG_FORMAT,
+# LOG_SAMPLING and the LOG_MAX_* variables there.
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# The id of the request being handled. Each request sets it on entry, so it also covers
+# the response body of a streamed response, which is produced after the view returned.
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+LOG_RECORDS_DROPPED = counter("log_records_dropped_total",
+                              "Log records dropped because the log queue was full.")
+LOG_RECORDS_SAMPLED_OUT = counter("log_records_sampled_out_total",
+                                  "Log records skipped by event sampling.", ["event"])
+
+# Attributes of every LogRecord; anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+def event_name(record):
+    """The event a record belongs to: extra={"event": ...}, else its message template."""
+    return getattr(record, "event", None) or str(record.msg)
+
+
+def _truncate(text, limit):
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... [{len(text) - limit} more chars]"
+    return text
+
+
+class RequestIdMiddleware(MiddlewareMixin):
+    """Give every request a correlation id (the client's X-Request-ID if it is a sane
+    one) for its log records, and echo it in the response."""
+
+    def process_request(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        request.request_id = request_id
+        request._request_id_token = request_id_var.set(request_id)
+
+    def process_response(self, request, response):
+        request_id = getattr(request, "request_id", None)
+        if request_id:
+            response[REQUEST_ID_HEADER] = request_id
+        token = getattr(request, "_request_id_token", None)
+        if token is not None:
+            # A WSGI thread goes on to other requests: unset the id once this one is done,
+            # when the server closes the response (after a streamed body, and after
+            # django.request has logged an error response)
+            response._resource_closers.append(lambda: _reset_request_id(token))
+        return response
+
+
+def _reset_request_id(token):
+    try:
+        request_id_var.reset(token)
+    except ValueError:
+        # Set in another context: under ASGI each request has its own, which ends with it
+        pass
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records of the events in rates ({event: fraction}).
+
+    Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        event = event_name(record)
+        rate = self.rates.get(event)
+        if rate is None or random.random() < rate:
+            return True
+        LOG_RECORDS_SAMPLED_OUT.inc(event=event)
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event, message, request id, the
+    record's extra fields and any traceback, with long values truncated."""
+
+    def __init__(self, max_message_chars=2000, max_field_chars=500, max_traceback_chars=8000):
+        super().__init__()
+        self.max_message_chars = max_message_chars
+        self.max_field_chars = max_field_chars
+        self.max_traceback_chars = max_traceback_chars
+
+    def _field(self, value):
+        if isinstance(value, (bool, int, float)) or value is None:
+            return value
+        return _truncate(value if isinstance(value, str) else str(value), self.max_field_chars)
+
+    def format(self, record):
+        event = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": event_name(record),
+            "message": _truncate(record.getMessage(), self.max_message_chars),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            event["request_id"] = request_id
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and name not in ("event", "request_id"):
+                event[name] = self._field(value)
+        if record.exc_info:
+            event["exc"] = _truncate(self.formatException(record.exc_info), self.max_traceback_chars)
+        elif record.exc_text:
+            event["exc"] = _truncate(record.exc_text, self.max_traceback_chars)
+        return json.dumps(event, default=str)
+
+
+class PlainFormatter(logging.Formatter):
+    """The logging.basicConfig format, with the request id and truncated messages."""
+
+    def __init__(self, fmt="%(levelname)s:%(name)s:%(message)s", max_message_chars=2000):
+        super().__init__(fmt)
+        self.max_message_chars = max_message_chars
+
+    def formatMessage(self, record):
+        record.message = _truncate(record.message, self.max_message_chars)
+        text = super().formatMessage(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{text} [request {request_id}]" if request_id else text
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Hand records to a listener thread that formats and writes them to stream.
+
+    The formatter set on this handler is used by the listener, so the calling thread
+    never formats a message or waits on I/O. When the queue is full, records are dropped
+    and counted (log_records_dropped_total) instead of blocking the caller.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.flush_and_stop)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # Started on first use in each process: a listener thread does not survive a fork
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.Queue(self.queue.maxsize)
+                    self.listener = logging.handlers.QueueListener(self.queue, self.target)
+                    self.listener.start()
+                    self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Formatting is left to the listener, but the message is built here like the
+        # stdlib's prepare does: the arguments may be changed (or not be thread-safe) by
+        # the time the listener gets to them. The template is kept as the record's event
+        record = copy.copy(record)
+        record.event = event_name(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush_and_stop(self):
+        """Write out the queued records and stop the listener."""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+        self.target.flush()
+
+    def close(self):
+        self.flush_and_stop()
+        super().close()
@@ -0,0 +1,59 @@
+import importlib.util
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from api.loadtest import LocalServer, migrate, run_load, server_env, survey_payload
+
+# (label, server, path) for each way of serving a survey generation
+TARGETS = [
+    ("wsgi-sync", "gunicorn", "/api/survey/"),
+    ("asgi-sync", "uvicorn", "/api/survey/"),
+    ("asgi-async", "uvicorn", "/api/survey/async/"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync survey view under gunicorn and uvicorn with the async view under "
+        "uvicorn, using the fake model provider with a fixed generation latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument("--latency", type=float, default=2.0, help="Fake model latency in seconds")
+        parser.add_argument("--workers", type=int, default=1, help="Server processes per target")
+        parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+        parser.add_argument("--targets", nargs="+", choices=[label for label, _, _ in TARGETS],
+                            default=[label for label, _, _ in TARGETS])
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        results = {}
+        with tempfile.TemporaryDirectory() as scratch:
+            env = server_env(Path(scratch) / "bench.sqlite3", FAKE_GEMINI_LATENCY=options["latency"])
+            migrate(env)
+            for label, server, path in TARGETS:
+                if label not in options["targets"]:
+                    continue
+                if importlib.util.find_spec(server) is None:
+                    self.stderr.write(f"Skipping {label}: {server} is not installed")
+                    continue
+                with LocalServer(server, env, options["workers"], options["threads"]) as local:
+                    summary = run_load(
+                        local.base_url + path,
+                        options["requests"],
+                        options["concurrency"],
+                        payload_for=survey_payload,
+                    )
+                results[label] = summary
+                self.stdout.write(
+                    f"{label:<11} rps={summary['rps']:<8} p50={summary['p50_ms']}ms "
+                    f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms errors={summary['errors']}"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2))
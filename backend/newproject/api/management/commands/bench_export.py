@@ -0,0 +1,74 @@
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.doctree import parse_document
+from api.export import Exporter
+from api.fakes import FakeGenerativeModel
+from api.generation import build_prompt
+from api.renderers import RENDERERS, render
+
+SAMPLE_SURVEY = {
+    "industry": "Healthcare",
+    "target_audience": "Enterprises",
+    "technology": ["AI", "SaaS"],
+    "web_frontend": ["React"],
+    "web_backend": ["Django"],
+    "web_database": ["PostgreSQL"],
+}
+
+
+def sample_document(paragraphs):
+    """An 18-section document from the fake model, with paragraphs per section."""
+    return FakeGenerativeModel(paragraphs=paragraphs).render(build_prompt(SAMPLE_SURVEY))
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Render documents of increasing length to every export format and report render "
+        "time, output size and the time to serve the cached artifact."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paragraphs", type=int, nargs="+", default=[2, 8, 32],
+                            help="Paragraphs per section of the sample documents")
+        parser.add_argument("--repeat", type=int, default=5, help="Renders per format and size")
+        parser.add_argument("--workers", type=int, default=2, help="Export pool processes")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        with tempfile.TemporaryDirectory() as directory:
+            exporter = Exporter(path=directory, workers=options["workers"])
+            try:
+                # Start the worker processes before timing anything
+                exporter.pool().submit(render, "docx", {"sections": []}).result()
+                for paragraphs in options["paragraphs"]:
+                    content = sample_document(paragraphs)
+                    tree = parse_document(content)
+                    self.stdout.write(
+                        f"\n{paragraphs} paragraphs/section: {len(content) / 1024:.1f} KiB markdown, "
+                        f"parse {median_ms(lambda: parse_document(content), repeat):.2f}ms"
+                    )
+                    for fmt in RENDERERS:
+                        size = len(render(fmt, tree))
+                        inline = median_ms(lambda: render(fmt, tree), repeat)
+                        pooled = median_ms(lambda: exporter.pool().submit(render, fmt, tree).result(), repeat)
+                        exporter.export(content, fmt)
+                        cached = median_ms(lambda: exporter.export(content, fmt).read_bytes(), repeat)
+                        self.stdout.write(
+                            f"  {fmt:<5} {size / 1024:8.1f} KiB  render={inline:8.2f}ms  "
+                            f"pool={pooled:8.2f}ms  cached={cached:6.2f}ms"
+                        )
+            finally:
+                exporter.shutdown()
@@ -0,0 +1,119 @@
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.loadtest import survey_payload
+from api.logs import JSONFormatter, PlainFormatter, QueueHandler, SamplingFilter, request_id_var
+
+EVENT = "survey.payload"
+
+
+class CountingStream:
+    """A stream that counts what is written to it, each write blocking for write_delay
+    seconds like a write to a busy pipe or log collector."""
+
+    def __init__(self, write_delay=0.0):
+        self.write_delay = write_delay
+        self.chars = 0
+        self.lines = 0
+
+    def write(self, text):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        self.chars += len(text)
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+def synchronous(stream, max_chars):
+    # The logging.basicConfig set-up the views used to log through
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    return handler
+
+
+def queued(formatter, rates=None):
+    def build(stream, max_chars):
+        handler = QueueHandler(stream, queue_size=1_000_000)
+        handler.setFormatter(formatter(max_chars))
+        if rates:
+            handler.addFilter(SamplingFilter(rates))
+        return handler
+    return build
+
+
+# (label, handler factory, level of the payload record)
+CONFIGS = [
+    ("sync plain, INFO", synchronous, logging.INFO),
+    ("queue plain, INFO", queued(lambda n: PlainFormatter(max_message_chars=n)), logging.INFO),
+    ("queue json, INFO", queued(lambda n: JSONFormatter(max_message_chars=n)), logging.INFO),
+    ("queue json, INFO 10%", queued(lambda n: JSONFormatter(max_message_chars=n), {EVENT: 0.1}), logging.INFO),
+    ("queue json, DEBUG off", queued(lambda n: JSONFormatter(max_message_chars=n)), logging.DEBUG),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what logging a survey payload costs the request threads: the old synchronous "
+        "plain handler against the queued plain and JSON handlers of api.logs, with event "
+        "sampling and with the record below the log level, writing to a stream that blocks "
+        "briefly on every write. Reports the caller's time per record, the listener's time "
+        "to write out what is still queued when the callers finish and the characters written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=20000, help="Records per caller thread")
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Caller threads")
+        parser.add_argument("--payload-chars", type=int, default=2000,
+                            help="Size of the free-text field added to the logged payload")
+        parser.add_argument("--max-chars", type=int, default=500, help="Message truncation of the queued handlers")
+        parser.add_argument("--write-delay", type=float, default=0.0001,
+                            help="Seconds each write to the log stream blocks for")
+        parser.add_argument("--to-devnull", action="store_true",
+                            help="Write to /dev/null through a file instead of an in-memory counter")
+
+    def handle(self, *args, **options):
+        payload = {**survey_payload(1), "notes": "x" * options["payload_chars"]}
+        logger = logging.getLogger("bench.logging")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        self.stdout.write(f"{'handler':<24}{'threads':>8}{'caller us/rec':>15}{'drain ms':>10}"
+                          f"{'lines':>9}{'chars/rec':>11}")
+        for label, build, level in CONFIGS:
+            for threads in options["threads"]:
+                stream = open(os.devnull, "w") if options["to_devnull"] else CountingStream(options["write_delay"])
+                handler = build(stream, options["max_chars"])
+                logger.handlers = [handler]
+                try:
+                    caller_us, drain_ms = self.measure(logger, handler, level, payload, options["records"], threads)
+                finally:
+                    logger.handlers = []
+                    handler.close()
+                lines = getattr(stream, "lines", None)
+                chars = f"{stream.chars / max(lines, 1):.0f}" if lines is not None else "-"
+                self.stdout.write(f"{label:<24}{threads:>8}{caller_us:>15.2f}{drain_ms:>10.0f}"
+                                  f"{lines if lines is not None else '-':>9}{chars:>11}")
+                if options["to_devnull"]:
+                    stream.close()
+
+    def measure(self, logger, handler, level, payload, records, threads):
+        def caller(index):
+            request_id_var.set(f"bench-{index}")
+            started = time.perf_counter()
+            for _ in range(records):
+                logger.log(level, "Raw request data received: %s", payload, extra={"event": EVENT})
+            return (time.perf_counter() - started) / records
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            per_record = list(pool.map(caller, range(threads)))
+        started = time.perf_counter()
+        if isinstance(handler, QueueHandler):
+            handler.flush_and_stop()
+        return statistics.mean(per_record) * 1e6, (time.perf_counter() - started) * 1000
@@ -0,0 +1,94 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.compact import MessagePackRenderer, columnar
+from api.compression import compress
+from api.doctree import OUTPUT_FORMATS, document_fields
+from api.management.commands.bench_export import sample_document
+from api.management.commands.bench_similarity import random_survey
+from api.pagination import HISTORY_FIELDS
+
+RENDERERS = {"json": JSONRenderer(), "msgpack": MessagePackRenderer()}
+# (label, encoding, level)
+COMPRESSIONS = [
+    ("identity", None, None),
+    ("gzip-1", "gzip", 1),
+    ("gzip-6", "gzip", 6),
+    ("br-1", "br", 1),
+    ("br-5", "br", 5),
+    ("br-11", "br", 11),
+]
+
+
+def median_us(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def history_page(rows, seed):
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    page = []
+    for survey_id in range(rows, 0, -1):
+        survey = random_survey(rng)
+        page.append({
+            "id": survey_id, **survey, "sub_technology": "", "platform": "Web",
+            "created_at": (now - datetime.timedelta(minutes=survey_id)).isoformat(),
+        })
+    return [{field: row[field] for field in HISTORY_FIELDS} for row in page]
+
+
+class Command(BaseCommand):
+    help = (
+        "Encode survey responses (every document output format and both history layouts) "
+        "as JSON and MessagePack, compress them with gzip and brotli at several levels, and "
+        "report the payload size and the CPU time of serializing and compressing each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paragraphs", type=int, nargs="+", default=[2, 8, 32],
+                            help="Paragraphs per section of the sample documents")
+        parser.add_argument("--history-rows", type=int, default=200, help="Surveys on the history page")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per measurement")
+
+    def report(self, label, data, repeat):
+        self.stdout.write(f"\n{label}")
+        self.stdout.write(f"  {'encoding':<9}{'compression':<12}{'bytes':>9}{'ratio':>8}"
+                          f"{'serialize':>12}{'compress':>11}")
+        baseline = None
+        for name, renderer in RENDERERS.items():
+            body = renderer.render(data)
+            serialize = median_us(lambda: renderer.render(data), repeat)
+            for compression, encoding, level in COMPRESSIONS:
+                if encoding is None:
+                    size, cost = len(body), 0.0
+                else:
+                    options = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+                    size = len(compress(body, encoding, **options))
+                    cost = median_us(lambda: compress(body, encoding, **options), repeat)
+                baseline = baseline or size
+                self.stdout.write(f"  {name:<9}{compression:<12}{size:>9}{baseline / size:>7.1f}x"
+                                  f"{serialize:>10.0f}us{cost:>9.0f}us")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        for paragraphs in options["paragraphs"]:
+            content = sample_document(paragraphs)
+            for fmt in OUTPUT_FORMATS:
+                data = {**document_fields(content, fmt), "survey_id": 1,
+                        "timestamp": datetime.datetime.now().isoformat()}
+                self.report(f"document, {paragraphs} paragraphs/section, output={fmt}", data, repeat)
+
+        rows = history_page(options["history_rows"], seed=1)
+        for layout, surveys in (("objects", rows), ("columns", columnar(rows, HISTORY_FIELDS))):
+            self.report(f"history, {len(rows)} surveys, layout={layout}",
+                        {"surveys": surveys, "next_cursor": None}, repeat)
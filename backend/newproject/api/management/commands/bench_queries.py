@@ -0,0 +1,114 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.models import Survey
+from api.pagination import encode_cursor, history_queryset
+
+INDUSTRIES = ["Healthcare", "Technology", "Finance", "Education", "Entertainment",
+              "Retail/E-commerce", "Environment/Sustainability", "Other"]
+AUDIENCES = ["Consumers (B2C)", "Small businesses", "Enterprises", "Governments", "Specific groups"]
+TECHNOLOGIES = ["AI", "Blockchain", "SaaS", "E-commerce", "IoT", "Mobile App Development"]
+
+
+def seed_surveys(total, batch_size=5000):
+    rng = random.Random(42)
+    created = 0
+    while created < total:
+        size = min(batch_size, total - created)
+        Survey.objects.bulk_create([
+            Survey(
+                industry=rng.choice(INDUSTRIES),
+                target_audience=rng.choice(AUDIENCES),
+                technology=rng.sample(TECHNOLOGIES, 2),
+                web_frontend=["React"],
+                web_backend=["Django"],
+                web_database=["PostgreSQL"],
+            )
+            for _ in range(size)
+        ], batch_size=1000)
+        created += size
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch test database with N surveys, check that the history and activity "
+        "queries use the Survey indexes, and report endpoint latency for each size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                            help="Table sizes to benchmark, e.g. --rows 10000 100000 1000000")
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per endpoint")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seeded = 0
+            for rows in sorted(options["rows"]):
+                seed_surveys(rows - seeded)
+                seeded = rows
+                self.stdout.write(f"\n{rows} surveys")
+                self.check_plans()
+                self.time_endpoints(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def query_cases(self):
+        newest = Survey.objects.order_by('-created_at', '-id').values('created_at', 'id')[100]
+        cursor = encode_cursor(newest['created_at'], newest['id'])
+        return [
+            ("activity", Survey.objects.order_by('-created_at')[:1], "survey_created_idx"),
+            ("history", history_queryset(Survey.objects.all(), {}), "survey_created_idx"),
+            ("history cursor", history_queryset(Survey.objects.all(), {"cursor": cursor}), "survey_created_idx"),
+            ("history industry", history_queryset(Survey.objects.all(), {"industry": "Finance"}),
+             "survey_industry_created_idx"),
+            ("history audience", history_queryset(Survey.objects.all(), {"target_audience": "Enterprises"}),
+             "survey_audience_created_idx"),
+        ]
+
+    def check_plans(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+            elif connection.vendor == "postgresql":
+                cursor.execute("ANALYZE api_survey")
+        failures = []
+        for label, queryset, index in self.query_cases():
+            plan = queryset.explain()
+            uses_index = index in plan
+            self.stdout.write(f"  plan {label:<17} {'uses ' + index if uses_index else 'MISSING ' + index}")
+            if not uses_index:
+                failures.append(f"{label}: expected {index} in plan:\n{plan}")
+        if failures:
+            raise CommandError("\n".join(failures))
+
+    def time_endpoints(self, repeat):
+        client = Client()
+        first_page = client.get("/api/history/").json()
+        urls = [
+            ("activity", "/api/activity/"),
+            ("history", "/api/history/"),
+            ("history cursor", f"/api/history/?cursor={first_page['next_cursor']}"),
+            ("history industry", "/api/history/?industry=Finance"),
+            ("history audience", "/api/history/?target_audience=Enterprises"),
+        ]
+        for label, url in urls:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} returned {response.status_code}")
+            timings.sort()
+            self.stdout.write(
+                f"  {label:<17} p50={timings[len(timings) // 2] * 1000:.2f}ms "
+                f"max={timings[-1] * 1000:.2f}ms"
+            )
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.generation import GEMINI_MODEL, build_prompt, validate_response
+from api.llm import FakeProvider, set_provider
+from api.management.commands.bench_similarity import random_survey
+from api.routing import TIER_CALLS, TIER_TOKENS, ModelRouter
+from api.scheduler import get_scheduler
+from api.sectioned import generate_sectioned_document
+
+FAST_MODEL = "fake-fast"
+SECTIONS = {
+    "Table of Contents": "fast",
+    "Software & Hardware Requirements": "fast",
+    "References": "fast",
+}
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def samples(metric):
+    return {labels: value for _, labels, value in metric.samples()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate documents with fake models of different speeds (a slow 'pro' and a fast "
+        "tier) in one call, per section group on the pro model, with sections routed to "
+        "tiers and with a profile routing whole requests to the fast tier, and report "
+        "end-to-end latency and the calls and tokens of each tier. Run it with "
+        "LLM_SCHEDULER_ENABLED=0 so the call budget does not pace the runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=20, help="Documents per configuration")
+        parser.add_argument("--pro-latency", type=float, default=0.2, help="Seconds before the pro model answers")
+        parser.add_argument("--pro-seconds-per-char", type=float, default=0.0002)
+        parser.add_argument("--fast-latency", type=float, default=0.05)
+        parser.add_argument("--fast-seconds-per-char", type=float, default=0.00004)
+        parser.add_argument("--paragraphs", type=int, default=3, help="Paragraphs per section in replies")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if get_scheduler().enabled:
+            self.stderr.write("The LLM scheduler is enabled; its RPM budget will dominate the timings")
+
+        provider = FakeProvider(paragraphs=options["paragraphs"], models={
+            GEMINI_MODEL: {"latency": options["pro_latency"], "seconds_per_char": options["pro_seconds_per_char"]},
+            FAST_MODEL: {"latency": options["fast_latency"], "seconds_per_char": options["fast_seconds_per_char"]},
+        })
+        tiers = {"fast": {"MODEL": FAST_MODEL}}
+        configs = [
+            ("single-pro", ModelRouter(), "single"),
+            ("sectioned-pro", ModelRouter(), "sectioned"),
+            ("routed-sections", ModelRouter(enabled=True, tiers=tiers, sections=SECTIONS), "single"),
+            ("routed-profile", ModelRouter(enabled=True, tiers=tiers, profiles=[
+                {"MATCH": {"target_audience": "Consumers (B2C)"}, "TIER": "fast"},
+            ]), "single"),
+        ]
+
+        rng = random.Random(options["seed"])
+        surveys = [dict(random_survey(rng), target_audience="Consumers (B2C)") for _ in range(options["documents"])]
+        previous = set_provider(provider)
+        try:
+            for label, router, mode in configs:
+                calls_before, tokens_before = samples(TIER_CALLS), samples(TIER_TOKENS)
+                timings, sizes = [], []
+                for survey in surveys:
+                    started = time.perf_counter()
+                    content = self.generate(router.route(survey), survey, mode)
+                    timings.append(time.perf_counter() - started)
+                    sizes.append(len(content))
+                calls, tokens = samples(TIER_CALLS), samples(TIER_TOKENS)
+                usage = {
+                    labels: value - calls_before.get(labels, 0) for labels, value in calls.items()
+                    if value != calls_before.get(labels, 0)
+                }
+                output = {
+                    labels: value - tokens_before.get(labels, 0) for labels, value in tokens.items()
+                    if "output" in labels and value != tokens_before.get(labels, 0)
+                }
+                self.stdout.write(
+                    f"{label:<16} p50={percentile(timings, 0.5) * 1000:.0f}ms "
+                    f"p95={percentile(timings, 0.95) * 1000:.0f}ms mean={statistics.mean(timings) * 1000:.0f}ms "
+                    f"chars={statistics.mean(sizes):.0f}"
+                )
+                self.stdout.write(f"{'':<16} calls {usage}")
+                self.stdout.write(f"{'':<16} output tokens {output}")
+        finally:
+            set_provider(previous)
+
+    def generate(self, plan, survey, mode):
+        # The generation of generate_document without its cache and request coalescing
+        tier = plan.document_tier
+        model = tier.model()
+        if plan.generation_mode(mode) == "sectioned":
+            return generate_sectioned_document(model, survey, plan)
+        response = model.generate_content(build_prompt(survey), generation_config=tier.generation_config)
+        return validate_response(model, response.text, survey, response, plan)
@@ -0,0 +1,150 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.management.commands.bench_queries import AUDIENCES, INDUSTRIES, TECHNOLOGIES
+from api.models import SearchEntry, Survey
+from api.search import FTS_TABLE, search_backend, search_surveys, survey_text
+
+# Filler vocabulary of the synthetic documents, and words planted in a share of them so
+# the queries below match rare, medium and common terms
+FILLER = [f"{syllable}{suffix}" for syllable in (
+    "data", "user", "cloud", "market", "model", "report", "stack", "budget", "team", "risk",
+    "scale", "launch", "audit", "query", "cache", "metric", "design", "portal", "vendor", "ledger",
+) for suffix in ("", "s", "ing", "ed", "er", "ion", "al", "ity", "ize", "ware")]
+PLANTED = [("HIPAA", 0.005), ("Kubernetes", 0.05), ("real-time analytics", 0.02), ("compliance", 0.3)]
+
+QUERIES = [
+    ("rare word", {"q": "hipaa"}),
+    ("no match", {"q": "zanzibar"}),
+    ("medium word", {"q": "kubernetes"}),
+    ("common word", {"q": "compliance"}),
+    ("common recent", {"q": "compliance", "sort": "recent"}),
+    ("answers word", {"q": "react"}),
+    ("two words", {"q": "kubernetes compliance"}),
+    ("phrase", {"q": '"real-time analytics"'}),
+    ("prefix", {"q": "kube*"}),
+    ("filtered", {"q": "kubernetes", "industry": "Healthcare"}),
+    ("page 10", {"q": "compliance", "page": 10}),
+]
+
+
+def synthetic_document(rng, words):
+    text = rng.choices(FILLER, k=words)
+    for term, share in PLANTED:
+        if rng.random() < share:
+            text.insert(rng.randrange(len(text)), term)
+    return "\n\n".join(" ".join(text[i:i + 60]) for i in range(0, len(text), 60))
+
+
+def seed(total, words, rng, batch_size=2000):
+    """Insert total surveys and their search entries; returns the seconds spent indexing."""
+    indexing = 0.0
+    created = 0
+    while created < total:
+        size = min(batch_size, total - created)
+        with transaction.atomic():
+            surveys = Survey.objects.bulk_create([
+                Survey(
+                    industry=rng.choice(INDUSTRIES),
+                    target_audience=rng.choice(AUDIENCES),
+                    technology=rng.sample(TECHNOLOGIES, 2),
+                    web_frontend=[rng.choice(["React", "Vue", "Angular"])],
+                    web_backend=["Django"],
+                    web_database=["PostgreSQL"],
+                )
+                for _ in range(size)
+            ])
+            entries = [
+                SearchEntry(survey_id=survey.id, survey_text=survey_text(survey),
+                            document_text=synthetic_document(rng, words))
+                for survey in surveys
+            ]
+            started = time.perf_counter()
+            SearchEntry.objects.bulk_create(entries, batch_size=500)
+            indexing += time.perf_counter() - started
+        created += size
+    return indexing
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch test database with N surveys and synthetic documents, and report the "
+        "cost of indexing them and the latency of /api/search/ for rare, common, phrase, "
+        "prefix, filtered and deep-page queries at each size, optionally against a LIKE scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                            help="Table sizes to benchmark, e.g. --rows 10000 100000 300000")
+        parser.add_argument("--words", type=int, default=300, help="Words per synthetic document")
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per query")
+        parser.add_argument("--like", action="store_true",
+                            help="Also time the LIKE scan other database backends fall back to")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            backend = search_backend()
+            if backend == "like":
+                raise CommandError("The database has no full-text index (FTS5 or tsvector)")
+            rng = random.Random(42)
+            seeded = 0
+            for rows in sorted(options["rows"]):
+                indexing = seed(rows - seeded, options["words"], rng)
+                self.stdout.write(f"\n{rows} surveys ({backend}): indexed {rows - seeded} documents in "
+                                  f"{indexing:.1f}s, {(rows - seeded) / indexing:.0f}/s{self.index_size()}")
+                seeded = rows
+                self.optimize(backend)
+                self.time_queries(options["repeat"], options["like"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def optimize(self, backend):
+        with connection.cursor() as cursor:
+            if backend == "fts5":
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            else:
+                cursor.execute("ANALYZE api_searchentry")
+
+    def index_size(self):
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "sqlite":
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE %s", [f"{FTS_TABLE}%"])
+                else:
+                    cursor.execute("SELECT pg_relation_size('api_searchentry_vector_idx')")
+                size = cursor.fetchone()[0]
+        except Exception:
+            return ""
+        return f", index {size / 2**20:.1f}MB" if size else ""
+
+    def time_queries(self, repeat, like):
+        client = Client()
+        for label, params in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get("/api/search/", params)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{params} returned {response.status_code}: {response.content[:200]}")
+            results = len(response.json()["results"])
+            line = (f"  {label:<13} p50={percentile(timings, 0.5) * 1000:7.2f}ms "
+                    f"p95={percentile(timings, 0.95) * 1000:7.2f}ms results={results:<3}")
+            if like:
+                started = time.perf_counter()
+                search_surveys(params, backend="like")
+                line += f" like={(time.perf_counter() - started) * 1000:8.1f}ms"
+            self.stdout.write(line)
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import SimilarityIndex
+
+# Answer options of the survey form
+INDUSTRIES = ["Healthcare", "Technology", "Finance", "Education", "Entertainment",
+              "Retail/E-commerce", "Environment/Sustainability", "Other"]
+OTHER_INDUSTRIES = ["Agriculture", "Logistics", "Energy", "Tourism", "Real estate", "Legal services"]
+AUDIENCES = ["Consumers (B2C)", "Small businesses", "Enterprises", "Governments", "Specific groups"]
+TECHNOLOGIES = ["AI", "Blockchain", "SaaS", "E-commerce", "IoT", "Mobile App Development"]
+FRONTENDS = ["React", "Vue.js", "Angular", "Svelte"]
+BACKENDS = ["Node.js", "Django", "Flask", "Ruby on Rails", "Laravel", "Spring Boot", "ASP.NET"]
+HOSTING = ["AWS", "Google Cloud", "Azure", "DigitalOcean", "Heroku"]
+DATABASES = ["SQL", "NoSQL", "Firebase"]
+SECURITY = ["OAuth", "JWT", "MFA", "SSL"]
+
+
+def random_survey(rng):
+    industry = rng.choice(INDUSTRIES)
+    return {
+        "industry": industry,
+        "industry_other": rng.choice(OTHER_INDUSTRIES) if industry == "Other" else "",
+        "target_audience": rng.choice(AUDIENCES),
+        "technology": rng.sample(TECHNOLOGIES, rng.randint(1, 3)),
+        "web_frontend": rng.sample(FRONTENDS, rng.randint(0, 1)),
+        "web_backend": rng.sample(BACKENDS, rng.randint(0, 2)),
+        "web_hosting": rng.sample(HOSTING, rng.randint(0, 1)),
+        "web_database": rng.sample(DATABASES, rng.randint(0, 2)),
+        "security_features": rng.sample(SECURITY, rng.randint(0, 3)),
+    }
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a similarity index with random survey answers and report the build time and "
+        "the latency of top-k queries, before and after surveys are added to the delta."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--surveys", type=int, default=100_000, help="Surveys in the index")
+        parser.add_argument("--queries", type=int, default=500, help="Queries per measurement")
+        parser.add_argument("--delta", type=int, default=500, help="Surveys added after the build")
+        parser.add_argument("-k", type=int, default=10, help="Results per query")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def measure(self, index, queries, k):
+        timings = []
+        for survey in queries:
+            started = time.perf_counter()
+            index.search(survey, k)
+            timings.append(time.perf_counter() - started)
+        return (f"p50={percentile(timings, 0.5):.2f}ms p95={percentile(timings, 0.95):.2f}ms "
+                f"p99={percentile(timings, 0.99):.2f}ms mean={statistics.mean(timings) * 1000:.2f}ms")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        surveys = [random_survey(rng) for _ in range(options["surveys"])]
+        queries = [random_survey(rng) for _ in range(options["queries"])]
+        # Every index operation runs without the database: nothing is pulled from it
+        index = SimilarityIndex(refresh_interval=None, rebuild_after=options["delta"] + 1)
+
+        started = time.perf_counter()
+        for survey_id, survey in enumerate(surveys, start=1):
+            index.add(survey_id, survey)
+        added = time.perf_counter() - started
+        started = time.perf_counter()
+        index.build()
+        built = time.perf_counter() - started
+        stats = index.stats()
+        self.stdout.write(
+            f"{stats['surveys']} surveys, {stats['tokens']} distinct tokens: "
+            f"tokenise+add {added:.2f}s ({added / len(surveys) * 1e6:.1f}us/survey), build {built * 1000:.0f}ms"
+        )
+        self.stdout.write(f"query k={options['k']}: {self.measure(index, queries, options['k'])}")
+
+        for survey_id in range(len(surveys) + 1, len(surveys) + options["delta"] + 1):
+            index.add(survey_id, random_survey(rng))
+        self.stdout.write(
+            f"query k={options['k']} with {index.stats()['delta']} surveys in the delta: "
+            f"{self.measure(index, queries, options['k'])}"
+        )
+
+        # A near-duplicate: same answers in a different order with one extra feature
+        probe = dict(surveys[0], technology=list(reversed(surveys[0]["technology"])),
+                     security_features=surveys[0]["security_features"] + ["SSL"])
+        top = index.search(probe, 3)
+        self.stdout.write(f"near-duplicate of survey 1 -> {[(i, round(s, 3)) for i, s in top]}")
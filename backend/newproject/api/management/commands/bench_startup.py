@@ -0,0 +1,102 @@
+import importlib.util
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.llm import SDK_MODULE
+from api.loadtest import LocalServer, migrate, server_env
+
+# What a web worker imports before it can serve: settings, apps and the URLconf
+BOOT = "import django; django.setup(); import newproject.urls"
+
+
+def parse_importtime(stderr):
+    """[(depth, self_us, cumulative_us, module)] from `python -X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Report what a cold API process spends its start-up on: a `python -X importtime` "
+        "breakdown of booting Django and importing the URLconf, the wall time of booting, "
+        "of `manage.py check` and of importing the Gemini SDK (paid on the first Gemini "
+        "generation), and the time from starting a server to its first answered request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Cold starts per measurement")
+        parser.add_argument("--top", type=int, default=12, help="Slowest top-level imports to list")
+        parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+        parser.add_argument("--path", default="/api/history/", help="Endpoint of the first request")
+
+    def run_python(self, env, *args):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, *args], cwd=settings.BASE_DIR, env=env,
+                                   capture_output=True, text=True, check=True)
+        return time.perf_counter() - started, completed
+
+    def median_ms(self, env, repeat, *args):
+        return statistics.median(self.run_python(env, *args)[0] for _ in range(repeat)) * 1000
+
+    def first_response_ms(self, env, path):
+        started = time.perf_counter()
+        with LocalServer(self.options["server"], env) as local:
+            while True:
+                try:
+                    urllib.request.urlopen(local.base_url + path, timeout=30).read()
+                    break
+                except urllib.error.HTTPError:
+                    break  # Answered, even if with an error status
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.01)
+            return (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        self.options = options
+        repeat = options["repeat"]
+        with tempfile.TemporaryDirectory() as scratch:
+            env = server_env(Path(scratch) / "startup.sqlite3", DJANGO_SETTINGS_MODULE="newproject.settings",
+                             LLM_SCHEDULER_ENABLED=0)
+            migrate(env)
+
+            _, completed = self.run_python(env, "-X", "importtime", "-c", BOOT)
+            modules = parse_importtime(completed.stderr)
+            top_level = sorted((m for m in modules if m[0] == 0), key=lambda m: m[2], reverse=True)
+            total = sum(m[2] for m in top_level)
+            self.stdout.write(f"importtime: {len(modules)} modules, {total / 1000:.0f}ms in total; "
+                              f"{SDK_MODULE} imported: {any(m[3] == SDK_MODULE for m in modules)}")
+            for _, self_us, cumulative_us, name in top_level[:options["top"]]:
+                self.stdout.write(f"  {cumulative_us / 1000:>8.1f}ms  {name}")
+
+            self.stdout.write(f"\ncold start wall time, median of {repeat}:")
+            rows = [
+                ("interpreter only", ["-c", "pass"]),
+                ("django.setup + URLconf", ["-c", BOOT]),
+                ("manage.py check", ["manage.py", "check"]),
+            ]
+            if importlib.util.find_spec(SDK_MODULE) is not None:
+                rows.append((f"import {SDK_MODULE}", ["-c", f"import {SDK_MODULE}"]))
+                rows.append(("URLconf + SDK (eager import)", ["-c", f"{BOOT}; import {SDK_MODULE}"]))
+            for label, arguments in rows:
+                self.stdout.write(f"  {label:<30} {self.median_ms(env, repeat, *arguments):>8.0f}ms")
+
+            if importlib.util.find_spec(options["server"]) is None:
+                self.stderr.write(f"{options['server']} is not installed; skipping the server start")
+                return
+            timings = [self.first_response_ms(env, options["path"]) for _ in range(repeat)]
+            self.stdout.write(f"  {options['server'] + ' to first response':<30} {statistics.median(timings):>8.0f}ms")
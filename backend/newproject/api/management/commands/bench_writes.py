@@ -0,0 +1,84 @@
+import importlib.util
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from api.loadtest import LocalServer, migrate, run_load, server_env, survey_payload
+
+# (label, environment) for each SQLite configuration; every one gets a fresh database
+SQLITE_CONFIGS = [
+    ("sqlite-rollback", {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_BUSY_TIMEOUT": 5, "DB_CONN_MAX_AGE": 0}),
+    ("sqlite-wal", {"SQLITE_JOURNAL_MODE": "WAL", "DB_CONN_MAX_AGE": 0}),
+    ("sqlite-wal-persistent", {"SQLITE_JOURNAL_MODE": "WAL", "DB_CONN_MAX_AGE": 60}),
+    ("sqlite-wal-batched", {"SQLITE_JOURNAL_MODE": "WAL", "DB_CONN_MAX_AGE": 60, "SURVEY_WRITER_ENABLED": 1}),
+]
+
+
+def server_configs(engine):
+    """Configurations for the DB_ENGINE server database this command was started with."""
+    configs = [
+        (engine, {"DB_CONN_MAX_AGE": 0}),
+        (f"{engine}-persistent", {"DB_CONN_MAX_AGE": 60}),
+        (f"{engine}-batched", {"DB_CONN_MAX_AGE": 60, "SURVEY_WRITER_ENABLED": 1}),
+    ]
+    if engine == "postgresql":
+        configs.append(("postgresql-pooled", {"DB_POOL": 1}))
+    return configs
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent survey submissions at a local server for each database "
+        "configuration (SQLite journal modes, persistent connections, the buffered survey "
+        "writer and, with DB_ENGINE set, the server database) and report write throughput "
+        "and errors such as 'database is locked'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+        parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+        parser.add_argument("--path", default="/api/survey/", help="Endpoint to submit surveys to")
+        parser.add_argument("--configs", nargs="+", help="Only run these configurations")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec("gunicorn") is None:
+            self.stderr.write("gunicorn is not installed")
+            return
+
+        engine = os.getenv("DB_ENGINE", "sqlite")
+        configs = SQLITE_CONFIGS + (server_configs(engine) if engine != "sqlite" else [])
+        if options["configs"]:
+            configs = [(label, overrides) for label, overrides in configs if label in options["configs"]]
+
+        results = {}
+        with tempfile.TemporaryDirectory() as scratch:
+            for label, overrides in configs:
+                # The fake model answers at once and the call scheduler is off, so the
+                # database is the only thing requests wait for
+                env = server_env(Path(scratch) / f"{label}.sqlite3", LLM_SCHEDULER_ENABLED=0, **overrides)
+                migrate(env)
+                with LocalServer("gunicorn", env, options["workers"], options["threads"]) as local:
+                    # Unmeasured round so every worker has loaded its modules and connected
+                    run_load(local.base_url + options["path"], options["concurrency"] * 2, options["concurrency"],
+                             payload_for=lambda i: survey_payload(f"{label}-warmup-{i}"))
+                    summary = run_load(
+                        local.base_url + options["path"],
+                        options["requests"],
+                        options["concurrency"],
+                        # Offset per configuration so a shared server database sees new surveys
+                        payload_for=lambda i: survey_payload(f"{label}-{i}"),
+                    )
+                results[label] = summary
+                self.stdout.write(
+                    f"{label:<22} rps={summary['rps']:<8} p50={summary['p50_ms']}ms "
+                    f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms errors={summary['errors']}"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2))
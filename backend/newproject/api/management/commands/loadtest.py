@@ -0,0 +1,168 @@
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import LocalServer, migrate, process_memory, run_load, seed_surveys, server_env, survey_payload
+
+# Servers by interface
+SERVERS = {"wsgi": "gunicorn", "asgi": "uvicorn"}
+
+# name -> (path, payload_for(label) returning the body of request i, None for GET)
+SCENARIOS = {
+    "survey": ("/api/survey/", lambda label: lambda i: survey_payload(f"{label}-{i}")),
+    "survey-async": ("/api/survey/async/", lambda label: lambda i: survey_payload(f"{label}-{i}")),
+    "survey-stream": ("/api/survey/stream/", lambda label: lambda i: survey_payload(f"{label}-{i}")),
+    "history": ("/api/history/?page_size=50", lambda label: None),
+    "activity": ("/api/activity/", lambda label: None),
+}
+DEFAULT_SCENARIOS = ["survey", "history", "activity"]
+
+# Fake model options, passed to the servers as FAKE_GEMINI_* variables
+FAKE_OPTIONS = {
+    "latency": "FAKE_GEMINI_LATENCY",
+    "seconds_per_char": "FAKE_GEMINI_SECONDS_PER_CHAR",
+    "chunk_delay": "FAKE_GEMINI_CHUNK_DELAY",
+    "chunk_size": "FAKE_GEMINI_CHUNK_SIZE",
+    "throttle_rate": "FAKE_GEMINI_THROTTLE_RATE",
+    "paragraphs": "FAKE_GEMINI_PARAGRAPHS",
+    "max_chars": "FAKE_GEMINI_MAX_CHARS",
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def change(current, baseline):
+    return (current - baseline) / baseline * 100 if baseline else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the API end to end on local WSGI (gunicorn) and ASGI (uvicorn) servers with "
+        "the fake model provider, at each concurrency level, and report requests per second, "
+        "p50/p95/p99 latency, status codes and the memory of every server process. Results "
+        "can be saved as JSON and compared with an earlier run to catch regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=DEFAULT_SCENARIOS)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per level")
+        parser.add_argument("--warmup", type=int, default=20,
+                            help="Unmeasured requests before each level, so every worker has served some")
+        parser.add_argument("--workers", type=int, default=2, help="Server processes")
+        parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+        parser.add_argument("--seed-surveys", type=int, default=1000, help="Surveys stored before the run")
+        parser.add_argument("--scheduler", action="store_true",
+                            help="Keep the LLM call scheduler (and its RPM budget) on in the servers")
+        parser.add_argument("--latency", type=float, default=0.5, help="Fake model: seconds before it answers")
+        parser.add_argument("--seconds-per-char", type=float, default=0.0,
+                            help="Fake model: extra seconds per reply character")
+        parser.add_argument("--chunk-delay", type=float, default=0.0, help="Fake model: seconds between streamed chunks")
+        parser.add_argument("--chunk-size", type=int, default=256, help="Fake model: characters per streamed chunk")
+        parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fake model: fraction of calls answered 429")
+        parser.add_argument("--paragraphs", type=int, default=2, help="Fake model: paragraphs per section")
+        parser.add_argument("--max-chars", type=int, help="Fake model: cut replies off after this many characters")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+        parser.add_argument("--tolerance", type=float, default=10.0,
+                            help="Percent drop in rps or rise in p95 reported as a regression")
+
+    def handle(self, *args, **options):
+        baseline = json.loads(Path(options["compare"]).read_text()) if options["compare"] else None
+        fake = {env: options[name] for name, env in FAKE_OPTIONS.items() if options[name] is not None}
+        run = {
+            "meta": {
+                "revision": git_revision(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "options": {key: options[key] for key in (
+                    "servers", "scenarios", "concurrency", "requests", "warmup", "workers", "threads",
+                    "seed_surveys", "scheduler", "latency", "seconds_per_char", "chunk_delay",
+                    "chunk_size", "throttle_rate", "paragraphs", "max_chars",
+                )},
+            },
+            "results": {},
+        }
+
+        with tempfile.TemporaryDirectory() as scratch:
+            env = server_env(Path(scratch) / "loadtest.sqlite3",
+                             LLM_SCHEDULER_ENABLED=int(options["scheduler"]), **fake)
+            migrate(env)
+            seed_surveys(env, options["seed_surveys"])
+            for interface in options["servers"]:
+                server = SERVERS[interface]
+                if importlib.util.find_spec(server) is None:
+                    self.stderr.write(f"Skipping {interface}: {server} is not installed")
+                    continue
+                with LocalServer(server, env, options["workers"], options["threads"]) as local:
+                    run["results"][interface] = self.run_server(interface, local, options)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(run, indent=2))
+        if baseline is not None:
+            self.compare(run, baseline, options["tolerance"])
+
+    def run_server(self, interface, local, options):
+        results = {}
+        for scenario in options["scenarios"]:
+            path, payloads = SCENARIOS[scenario]
+            results[scenario] = {}
+            for concurrency in options["concurrency"]:
+                label = f"{interface}-{scenario}-c{concurrency}"
+                if options["warmup"]:
+                    run_load(local.base_url + path, options["warmup"], concurrency,
+                             payload_for=payloads(f"{label}-warmup"))
+                summary = run_load(local.base_url + path, options["requests"], concurrency,
+                                   payload_for=payloads(label))
+                memory = process_memory(local.process.pid)
+                summary["memory"] = {
+                    "processes": len(memory),
+                    "rss_mb": [usage["rss_mb"] for usage in memory.values()],
+                    "peak_rss_mb": max((usage["peak_rss_mb"] for usage in memory.values()), default=0.0),
+                    "total_rss_mb": round(sum(usage["rss_mb"] for usage in memory.values()), 1),
+                }
+                results[scenario][str(concurrency)] = summary
+                self.stdout.write(
+                    f"{interface:<5}{scenario:<14}c={concurrency:<4} rps={summary['rps']:<8} "
+                    f"p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms "
+                    f"statuses={summary['statuses']} rss={summary['memory']['rss_mb']}MB"
+                )
+        return results
+
+    def compare(self, run, baseline, tolerance):
+        if baseline.get("meta", {}).get("options") != run["meta"]["options"]:
+            self.stderr.write("The baseline was run with different options; the comparison is indicative only")
+        self.stdout.write(f"\ncompared with {baseline.get('meta', {}).get('revision') or 'the baseline'}:")
+        regressions = 0
+        for interface, scenarios in run["results"].items():
+            for scenario, levels in scenarios.items():
+                for concurrency, summary in levels.items():
+                    before = baseline.get("results", {}).get(interface, {}).get(scenario, {}).get(concurrency)
+                    if before is None:
+                        continue
+                    rps = change(summary["rps"], before["rps"])
+                    p95 = change(summary["p95_ms"], before["p95_ms"])
+                    regressed = rps < -tolerance or p95 > tolerance or summary["errors"] > before["errors"]
+                    regressions += regressed
+                    self.stdout.write(
+                        f"{interface:<5}{scenario:<14}c={concurrency:<4} rps {rps:+.1f}% p95 {p95:+.1f}% "
+                        f"errors {before['errors']}->{summary['errors']}{'  REGRESSION' if regressed else ''}"
+                    )
+        if regressions:
+            raise CommandError(f"{regressions} measurement(s) regressed by more than {tolerance}%")
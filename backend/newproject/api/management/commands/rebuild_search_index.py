@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from api.documents import document_content
+from api.models import DocumentSection, SearchEntry, Survey
+from api.search import document_text, optimize_index, search_backend, survey_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index from the stored surveys and documents, e.g. for "
+        "rows stored before the index existed or while SEARCH['ENABLED'] was off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Surveys per transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = options["batch_size"]
+        sections = Prefetch("document__sections", queryset=DocumentSection.objects.order_by("position"))
+        surveys = Survey.objects.select_related("document").prefetch_related(sections).order_by("id")
+
+        SearchEntry.objects.all().delete()
+        indexed, last_id = 0, 0
+        while True:
+            batch = list(surveys.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            entries = []
+            for survey in batch:
+                document = getattr(survey, "document", None)
+                entries.append(SearchEntry(
+                    survey_id=survey.id,
+                    survey_text=survey_text(survey),
+                    document_text=document_text(document_content(document)) if document else "",
+                ))
+            with transaction.atomic():
+                SearchEntry.objects.bulk_create(entries)
+            indexed += len(entries)
+            last_id = batch[-1].id
+        optimize_index()
+        self.stdout.write(f"Indexed {indexed} surveys ({search_backend()}) in {time.perf_counter() - started:.1f}s")
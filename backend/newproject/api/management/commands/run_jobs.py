@@ -0,0 +1,29 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import get_job_queue
+
+
+class Command(BaseCommand):
+    help = "Work the database-backed generation queue until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Override JOB_QUEUE['WORKERS']")
+
+    def handle(self, *args, **options):
+        queue = get_job_queue()
+        if options["workers"]:
+            queue.workers = options["workers"]
+
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+        queue.start()
+        self.stdout.write(f"Working generation queue with {queue.workers} workers")
+        try:
+            stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Waiting for running jobs to finish...")
+        queue.stop()
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus instrumentation: counters, gauges and histograms kept in process
+# memory and rendered in the text exposition format by the /metrics view. Each server
+# process exposes its own values; scrape every worker (or run one) to see them all.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Optional callable returning {label values tuple: value}, evaluated at scrape time
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        if self.collect is not None:
+            try:
+                collected = self.collect()
+            except Exception:
+                collected = {}
+            with self._lock:
+                for key, value in collected.items():
+                    self._values[tuple(str(part) for part in key)] = value
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, [("le", _format_value(bound))]), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), collect=None):
+    return REGISTRY.register(Counter(name, documentation, labelnames, collect))
+
+
+def gauge(name, documentation, labelnames=(), collect=None):
+    return REGISTRY.register(Gauge(name, documentation, labelnames, collect))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Survey pipeline metrics
+
+REQUEST_SECONDS = histogram(
+    "api_request_duration_seconds", "Time spent in an API view until its response is returned.", ["view"]
+)
+REQUESTS_IN_FLIGHT = gauge("api_requests_in_flight", "API requests currently being handled.", ["view"])
+REQUESTS_TOTAL = counter("api_requests_total", "API requests handled, by response status.", ["view", "status"])
+STAGE_SECONDS = histogram(
+    "survey_stage_duration_seconds", "Time spent in each stage of the survey pipeline.", ["stage"]
+)
+LLM_TOKENS = counter("llm_tokens_total", "Tokens sent to and generated by the model.", ["kind"])
+
+
+def _cache_stats():
+    from .cache import get_document_cache
+
+    stats = get_document_cache().stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+
+DOCUMENT_CACHE_LOOKUPS = counter(
+    "document_cache_lookups_total", "Document cache lookups by result.", ["result"], collect=_cache_stats
+)
+
+
+def stage(name):
+    """Time a pipeline stage: `with stage("generate"): ...`."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def instrumented(view_name):
+    """Record duration, in-flight count and status of a view (sync or async)."""
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                REQUESTS_IN_FLIGHT.inc(view=view_name)
+                started = time.perf_counter()
+                status = 500
+                try:
+                    response = await view(request, *args, **kwargs)
+                    status = response.status_code
+                    return response
+                finally:
+                    REQUESTS_IN_FLIGHT.dec(view=view_name)
+                    REQUEST_SECONDS.observe(time.perf_counter() - started, view=view_name)
+                    REQUESTS_TOTAL.inc(view=view_name, status=status)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            REQUESTS_IN_FLIGHT.inc(view=view_name)
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                REQUESTS_IN_FLIGHT.dec(view=view_name)
+                REQUEST_SECONDS.observe(time.perf_counter() - started, view=view_name)
+                REQUESTS_TOTAL.inc(view=view_name, status=status)
+        return wrapper
+    return decorator
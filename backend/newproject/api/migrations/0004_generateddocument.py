@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-17 11:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=255)),
+                ('generation_config', models.JSONField(default=dict)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('from_cache', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='document', to='api.survey')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DocumentSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('heading', models.CharField(blank=True, max_length=255)),
+                ('body', models.BinaryField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='api.generateddocument')),
+            ],
+            options={
+                'ordering': ['position'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'position'), name='unique_section_position')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_generateddocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['created_at', 'id'], name='survey_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['industry', 'created_at', 'id'], name='survey_industry_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['target_audience', 'created_at', 'id'], name='survey_audience_created_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.6 on 2026-10-17 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+# The full-text index over api_searchentry (api.search): an external-content FTS5 table
+# kept in sync by triggers on SQLite, a generated tsvector column with a GIN index on
+# PostgreSQL. Answers weigh more than the document in the ranking on both.
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE api_search_fts USING fts5(survey_text, document_text, "
+    "content='api_searchentry', content_rowid='survey_id', tokenize='porter unicode61 remove_diacritics 2')",
+    "INSERT INTO api_search_fts(api_search_fts, rank) VALUES ('rank', 'bm25(4.0, 1.0)')",
+    "CREATE TRIGGER api_searchentry_ai AFTER INSERT ON api_searchentry BEGIN "
+    "INSERT INTO api_search_fts(rowid, survey_text, document_text) "
+    "VALUES (new.survey_id, new.survey_text, new.document_text); END",
+    "CREATE TRIGGER api_searchentry_ad AFTER DELETE ON api_searchentry BEGIN "
+    "INSERT INTO api_search_fts(api_search_fts, rowid, survey_text, document_text) "
+    "VALUES ('delete', old.survey_id, old.survey_text, old.document_text); END",
+    "CREATE TRIGGER api_searchentry_au AFTER UPDATE ON api_searchentry BEGIN "
+    "INSERT INTO api_search_fts(api_search_fts, rowid, survey_text, document_text) "
+    "VALUES ('delete', old.survey_id, old.survey_text, old.document_text); "
+    "INSERT INTO api_search_fts(rowid, survey_text, document_text) "
+    "VALUES (new.survey_id, new.survey_text, new.document_text); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS api_searchentry_ai",
+    "DROP TRIGGER IF EXISTS api_searchentry_ad",
+    "DROP TRIGGER IF EXISTS api_searchentry_au",
+    "DROP TABLE IF EXISTS api_search_fts",
+]
+POSTGRESQL_INDEX = [
+    "ALTER TABLE api_searchentry ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', survey_text), 'A') || "
+    "setweight(to_tsvector('english', document_text), 'B')) STORED",
+    "CREATE INDEX api_searchentry_vector_idx ON api_searchentry USING GIN (search_vector)",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS api_searchentry_vector_idx",
+    "ALTER TABLE api_searchentry DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(SQLITE_INDEX[0])
+        except OperationalError:
+            # SQLite built without FTS5: api.search falls back to a LIKE scan
+            return
+        for statement in SQLITE_INDEX[1:]:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        for statement in POSTGRESQL_INDEX:
+            schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_survey_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='api.survey')),
+                ('survey_text', models.TextField()),
+                ('document_text', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Survey(models.Model):
     industry = models.CharField(max_length=255)
@@ -14,5 +15,87 @@ class Survey(models.Model):
     security_features = models.JSONField(default=list, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Latest activity and history are read newest first, optionally filtered by
+        # industry or audience; id breaks created_at ties for keyset pagination
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='survey_created_idx'),
+            models.Index(fields=['industry', 'created_at', 'id'], name='survey_industry_created_idx'),
+            models.Index(fields=['target_audience', 'created_at', 'id'], name='survey_audience_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.industry} - {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class GenerationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    result = models.TextField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status}) for survey {self.survey_id}"
+
+
+class GeneratedDocument(models.Model):
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE, related_name='document')
+    model_name = models.CharField(max_length=255)
+    generation_config = models.JSONField(default=dict)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    from_cache = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Document for survey {self.survey_id} ({self.model_name})"
+
+
+class DocumentSection(models.Model):
+    document = models.ForeignKey(GeneratedDocument, on_delete=models.CASCADE, related_name='sections')
+    position = models.PositiveIntegerField()
+    heading = models.CharField(max_length=255, blank=True)
+    # zlib-compressed markdown of the whole section, heading line included
+    body = models.BinaryField()
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'position'], name='unique_section_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.heading or 'Preamble'} (document {self.document_id})"
+
+
+class SearchEntry(models.Model):
+    """The searchable text of a survey and its document (api.search).
+
+    Indexed by the database itself: an FTS5 table on SQLite and a tsvector column on
+    PostgreSQL, both added by migration 0006 outside the model.
+    """
+
+    survey = models.OneToOneField(Survey, on_delete=models.CASCADE, primary_key=True, related_name='search_entry')
+    survey_text = models.TextField()
+    # The document without its markdown markup; empty until it is generated
+    document_text = models.TextField(blank=True, default='')
+
     def __str__(self):
-        return f"{self.industry} - {self.created_at.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"Search entry for survey {self.survey_id}"
@@ -0,0 +1,112 @@
+import base64
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .metrics import stage
+
+# Keyset (cursor) pagination over Survey history, newest first. The cursor is the
+# (created_at, id) of the last row of the previous page, so every page is an index range
+# scan no matter how deep the client has paged.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# "objects" is a list of dicts; "columns" names the fields once and sends one list per row
+HISTORY_LAYOUTS = ["objects", "columns"]
+
+HISTORY_FIELDS = [
+    'id', 'industry', 'industry_other', 'target_audience', 'technology', 'sub_technology',
+    'platform', 'web_frontend', 'web_backend', 'web_hosting', 'web_database',
+    'security_features', 'created_at',
+]
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = json.dumps([created_at.isoformat(), pk]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = parse_datetime(created_at)
+        if created_at is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+    return created_at, pk
+
+
+def page_size_from(params):
+    try:
+        page_size = int(params.get("page_size", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise InvalidPageRequest("page_size must be an integer")
+    if page_size < 1:
+        raise InvalidPageRequest("page_size must be positive")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def fields_from(params):
+    requested = [field.strip() for field in params.get("fields", "").split(",") if field.strip()]
+    if not requested:
+        return HISTORY_FIELDS
+    unknown = [field for field in requested if field not in HISTORY_FIELDS]
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(unknown)}")
+    # The keyset columns are always needed to build the next cursor
+    return ['id', 'created_at'] + [field for field in requested if field not in ('id', 'created_at')]
+
+
+def layout_from(params):
+    layout = params.get("layout") or "objects"
+    if layout not in HISTORY_LAYOUTS:
+        raise InvalidPageRequest(f"Invalid layout: must be one of {', '.join(HISTORY_LAYOUTS)}")
+    return layout
+
+
+def filter_surveys(queryset, params):
+    if params.get("industry"):
+        queryset = queryset.filter(industry=params["industry"])
+    if params.get("target_audience"):
+        queryset = queryset.filter(target_audience=params["target_audience"])
+    if params.get("technology"):
+        technology = params["technology"]
+        if connection.features.supports_json_field_contains:
+            queryset = queryset.filter(technology__contains=[technology])
+        else:
+            # SQLite stores JSON as text, match the quoted list element instead
+            queryset = queryset.filter(technology__icontains=json.dumps(technology))
+    return queryset
+
+
+def history_queryset(queryset, params):
+    """Build the query for one history page (one extra row tells whether there is a next page)."""
+    page_size = page_size_from(params)
+    fields = fields_from(params)
+    queryset = filter_surveys(queryset, params).order_by('-created_at', '-id')
+    if params.get("cursor"):
+        created_at, pk = decode_cursor(params["cursor"])
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return queryset.values(*fields)[:page_size + 1]
+
+
+def paginate_surveys(queryset, params):
+    """Return (rows, next_cursor) for the page of queryset described by params."""
+    page_size = page_size_from(params)
+    with stage("history_query"):
+        rows = list(history_queryset(queryset, params))
+    with stage("history_serialize"):
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        for row in rows:
+            row['created_at'] = row['created_at'].isoformat()
+    return rows, next_cursor
@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second refill, up to capacity banked.
+
+    Each model call (or other rate-limited action) takes a token. Up to capacity calls
+    can go out back to back, after which callers are paced at rate per second.
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.waited = 0.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=1):
+        return cls(requests_per_minute / 60, burst)
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available now; returns False instead of waiting."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None, stop=None):
+        """Block until tokens are taken. Returns False on timeout or once stop (an Event) is set."""
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited += now - started
+                    return True
+                delay = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                delay = min(delay, deadline - time.monotonic())
+                if delay <= 0:
+                    return False
+            if stop is not None:
+                if stop.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+
+    def wait_time(self, tokens=1):
+        """Seconds until tokens will be available, 0 if they are now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def refund(self, tokens):
+        """Give back tokens that were taken but not used."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
@@ -0,0 +1,542 @@
+import functools
+import io
+import os
+import re
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# Document renderers for exports. The PDF and DOCX renderers take the tree built by
+# api.doctree and return the file as bytes, using only the standard library so they can
+# run in worker processes without Django being set up. Bump RENDERER_VERSION when the
+# output changes, so cached artifacts from the previous version are not served again.
+
+RENDERER_VERSION = 2
+
+FORMATS = ["pdf", "docx", "md"]
+
+
+# Markdown
+
+def render_markdown(content, cover=None):
+    """The stored markdown itself, under a title block made of the cover fields.
+
+    Unlike the other formats it is not rebuilt from the tree, which keeps only the
+    markup the tree models (tables, links and code would be lost).
+    """
+    blocks = []
+    if cover and cover.get("title"):
+        blocks.append(f"# {cover['title']}")
+        details = [value for value in (cover.get("author"), cover.get("company")) if value]
+        if details:
+            blocks.append("\n".join(details))
+    blocks.append(content.strip())
+    return ("\n\n".join(blocks) + "\n").encode("utf-8")
+
+
+# DOCX (WordprocessingML in a zip, with just the parts Word requires)
+
+DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+
+DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+DOCX_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _docx_style(style_id, name, size, bold=False, before=0, after=120):
+    bold_xml = "<w:b/>" if bold else ""
+    return (
+        f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+        f'<w:basedOn w:val="Normal"/><w:pPr><w:keepNext/><w:spacing w:before="{before}" w:after="{after}"/></w:pPr>'
+        f'<w:rPr>{bold_xml}<w:sz w:val="{size}"/></w:rPr></w:style>'
+    )
+
+
+DOCX_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles xmlns:w="{W_NS}">'
+    '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri"/>'
+    '<w:sz w:val="22"/></w:rPr></w:rPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+    '<w:pPr><w:spacing w:after="120"/></w:pPr></w:style>'
+    + _docx_style("Title", "Title", 56, bold=True, before=2400, after=240)
+    + _docx_style("Heading2", "heading 2", 36, bold=True, before=240)
+    + _docx_style("Heading3", "heading 3", 28, bold=True, before=200)
+    + _docx_style("Heading4", "heading 4", 24, bold=True, before=160)
+    + '<w:style w:type="paragraph" w:styleId="ListParagraph"><w:name w:val="List Paragraph"/>'
+    '<w:basedOn w:val="Normal"/><w:pPr><w:spacing w:after="60"/><w:ind w:left="720" w:hanging="360"/></w:pPr></w:style>'
+    '</w:styles>'
+)
+
+
+def _docx_runs(spans):
+    runs = []
+    for span in spans:
+        if isinstance(span, str):
+            props, text = "", span
+        elif "strong" in span:
+            props, text = "<w:rPr><w:b/></w:rPr>", span["strong"]
+        else:
+            props, text = "<w:rPr><w:i/></w:rPr>", span["em"]
+        runs.append(f'<w:r>{props}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>')
+    return "".join(runs)
+
+
+def _docx_paragraph(spans, style=None, page_break=False):
+    props = []
+    if style:
+        props.append(f'<w:pStyle w:val="{style}"/>')
+    if page_break:
+        props.append("<w:pageBreakBefore/>")
+    p_pr = f"<w:pPr>{''.join(props)}</w:pPr>" if props else ""
+    return f"<w:p>{p_pr}{_docx_runs(spans)}</w:p>"
+
+
+def render_docx(tree, cover=None):
+    body = []
+    if cover and cover.get("title"):
+        body.append(_docx_paragraph([cover["title"]], "Title"))
+        body += [_docx_paragraph([value]) for value in (cover.get("author"), cover.get("company")) if value]
+    for section in tree["sections"]:
+        # Each section starts on a new page, as in the PDF
+        page_break = bool(body)
+        if section["title"]:
+            body.append(_docx_paragraph([section["title"]], "Heading2", page_break))
+            page_break = False
+        for block in section["blocks"]:
+            if block["type"] == "heading":
+                body.append(_docx_paragraph(block["content"], f"Heading{block['level']}", page_break))
+            elif block["type"] == "list":
+                for number, item in enumerate(block["items"], start=1):
+                    marker = f"{number}.\t" if block["ordered"] else "•\t"
+                    body.append(_docx_paragraph([marker, *item], "ListParagraph", page_break))
+                    page_break = False
+            else:
+                body.append(_docx_paragraph(block["content"], page_break=page_break))
+            page_break = False
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{W_NS}"><w:body>'
+        + "".join(body)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+        '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" w:header="708" w:footer="708" w:gutter="0"/>'
+        '</w:sectPr></w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", DOCX_RELS)
+        archive.writestr("word/_rels/document.xml.rels", DOCX_DOCUMENT_RELS)
+        archive.writestr("word/styles.xml", DOCX_STYLES)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+# PDF (A4 pages set in the standard Helvetica fonts, which need no embedding but only
+# cover cp1252, or in a TrueType font embedded in the file)
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 56
+LIST_INDENT = 18
+
+# Advance widths (1/1000 em) of the printable ASCII characters, from the Adobe AFM files
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+PDF_FONTS = {
+    # key: (resource name, base font, widths)
+    "regular": ("F1", "Helvetica", HELVETICA_WIDTHS),
+    "bold": ("F2", "Helvetica-Bold", HELVETICA_BOLD_WIDTHS),
+    "italic": ("F3", "Helvetica-Oblique", HELVETICA_WIDTHS),
+}
+# font size, line height and space before, per block kind
+PDF_STYLES = {
+    "title": (28, 36, 220),
+    2: (18, 24, 0),
+    3: (14, 19, 10),
+    4: (12, 16, 8),
+    "body": (11, 15, 6),
+}
+
+
+def unsupported_characters(text):
+    """The characters of text the standard PDF fonts cannot show, in order of appearance."""
+    found = {}
+    for char in text:
+        if char not in found and not char.isspace():
+            try:
+                char.encode("cp1252")
+            except UnicodeEncodeError:
+                found[char] = None
+    return list(found)
+
+
+class StandardFonts:
+    """Helvetica in regular, bold and oblique: built into every PDF reader, cp1252 only."""
+
+    def width(self, text, font, size):
+        widths = PDF_FONTS[font][2]
+        total = 0
+        for char in text:
+            code = ord(char)
+            total += widths[code - 32] if 32 <= code <= 126 else 556
+        return total * size / 1000
+
+    def show(self, text, font, size, x, y):
+        encoded = text.encode("cp1252", errors="replace")
+        escaped = encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").decode("latin-1")
+        return f"BT /{PDF_FONTS[font][0]} {size} Tf {x:.2f} {y:.2f} Td ({escaped}) Tj ET"
+
+    def resources(self, add):
+        fonts = {
+            name: add(f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>".encode())
+            for name, base_font, _ in PDF_FONTS.values()
+        }
+        return " ".join(f"/{name} {number} 0 R" for name, number in fonts.items())
+
+
+class TrueTypeFont:
+    """The character map and metrics of a TrueType font file, for embedding it in a PDF."""
+
+    def __init__(self, path):
+        with open(path, "rb") as font_file:
+            self.data = font_file.read()
+        if self.data[:4] != b"\x00\x01\x00\x00" and self.data[:4] != b"true":
+            raise ValueError(f"{path} is not a TrueType font (collections and CFF fonts are not supported)")
+        stem = os.path.splitext(os.path.basename(path))[0]
+        self.name = re.sub(r"[^A-Za-z0-9_-]", "", stem) or "Embedded"
+        tables = {}
+        for index in range(struct.unpack(">H", self.data[4:6])[0]):
+            tag, _, offset, _ = struct.unpack(">4sIII", self.data[12 + 16 * index:28 + 16 * index])
+            tables[tag.decode("latin-1")] = offset
+
+        head, hhea, hmtx = tables["head"], tables["hhea"], tables["hmtx"]
+        scale = 1000 / struct.unpack(">H", self.data[head + 18:head + 20])[0]
+        self.bbox = [round(value * scale) for value in struct.unpack(">hhhh", self.data[head + 36:head + 44])]
+        ascent, descent = struct.unpack(">hh", self.data[hhea + 4:hhea + 8])
+        self.ascent, self.descent = round(ascent * scale), round(descent * scale)
+        metrics = struct.unpack(">H", self.data[hhea + 34:hhea + 36])[0]
+        self.advances = [round(struct.unpack(">H", self.data[hmtx + 4 * gid:hmtx + 4 * gid + 2])[0] * scale)
+                         for gid in range(metrics)]
+        self.italic_angle = struct.unpack(">i", self.data[tables["post"] + 4:tables["post"] + 8])[0] / 65536 \
+            if "post" in tables else 0
+        self.cmap = self._read_cmap(tables["cmap"])
+
+    def _read_cmap(self, cmap):
+        data = self.data
+        subtables = {}
+        for index in range(struct.unpack(">H", data[cmap + 2:cmap + 4])[0]):
+            platform, encoding, offset = struct.unpack(">HHI", data[cmap + 4 + 8 * index:cmap + 12 + 8 * index])
+            subtables[(platform, encoding)] = cmap + offset
+        mapping = {}
+        # Prefer the full Unicode map (format 12) over the Basic Multilingual Plane one
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            start = subtables.get(key)
+            if start is None:
+                continue
+            fmt = struct.unpack(">H", data[start:start + 2])[0]
+            if fmt == 12:
+                for group in range(struct.unpack(">I", data[start + 12:start + 16])[0]):
+                    first, last, gid = struct.unpack(">III", data[start + 16 + 12 * group:start + 28 + 12 * group])
+                    for code in range(first, last + 1):
+                        mapping[code] = gid + code - first
+                return mapping
+            if fmt == 4:
+                segments = struct.unpack(">H", data[start + 6:start + 8])[0] // 2
+                ends, starts, deltas = start + 14, start + 16 + 2 * segments, start + 16 + 4 * segments
+                range_offsets = start + 16 + 6 * segments
+                for segment in range(segments):
+                    last, = struct.unpack(">H", data[ends + 2 * segment:ends + 2 * segment + 2])
+                    first, = struct.unpack(">H", data[starts + 2 * segment:starts + 2 * segment + 2])
+                    delta, = struct.unpack(">h", data[deltas + 2 * segment:deltas + 2 * segment + 2])
+                    position = range_offsets + 2 * segment
+                    range_offset, = struct.unpack(">H", data[position:position + 2])
+                    for code in range(first, min(last, 0xFFFE) + 1):
+                        if range_offset:
+                            address = position + range_offset + 2 * (code - first)
+                            gid, = struct.unpack(">H", data[address:address + 2])
+                            gid = (gid + delta) & 0xFFFF if gid else 0
+                        else:
+                            gid = (code + delta) & 0xFFFF
+                        if gid:
+                            mapping[code] = gid
+                return mapping
+        raise ValueError(f"{self.name} has no Unicode character map")
+
+    def glyph(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, gid):
+        return self.advances[min(gid, len(self.advances) - 1)]
+
+
+@functools.lru_cache(maxsize=8)
+def load_font(path):
+    # Parsed once per worker process
+    return TrueTypeFont(path)
+
+
+class EmbeddedFonts:
+    """A TrueType font (and optionally a bold one) embedded as Identity-H CID fonts, so
+    any character the font has a glyph for can be shown. Italic is the regular font slanted."""
+
+    ITALIC_SLANT = 0.2
+
+    def __init__(self, regular, bold=None):
+        regular = load_font(str(regular))
+        bold = load_font(str(bold)) if bold else regular
+        self.fonts = {"regular": regular, "bold": bold, "italic": regular}
+        self.names = {regular: "F1", bold: "F2"}
+        self.used = {font: {} for font in self.names}  # gid -> the text it stands for
+
+    def width(self, text, font, size):
+        face = self.fonts[font]
+        return sum(face.advance(face.glyph(char)) for char in text) * size / 1000
+
+    def show(self, text, font, size, x, y):
+        face = self.fonts[font]
+        used = self.used[face]
+        glyphs = []
+        for char in text:
+            gid = face.glyph(char)
+            if gid:
+                used.setdefault(gid, char)
+            glyphs.append(f"{gid:04X}")
+        position = (f"1 0 {self.ITALIC_SLANT} 1 {x:.2f} {y:.2f} Tm" if font == "italic"
+                    else f"{x:.2f} {y:.2f} Td")
+        return f"BT /{self.names[face]} {size} Tf {position} <{''.join(glyphs)}> Tj ET"
+
+    def resources(self, add):
+        return " ".join(f"/{name} {self._embed(face, add)} 0 R" for face, name in self.names.items())
+
+    def _embed(self, face, add):
+        used = sorted(self.used[face].items())
+        font_file = zlib.compress(face.data)
+        font_stream = add(b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n"
+                          % (len(font_file), len(face.data)) + font_file + b"\nendstream")
+        descriptor = add(
+            f"<< /Type /FontDescriptor /FontName /{face.name} /Flags 32 /FontBBox [{' '.join(map(str, face.bbox))}] "
+            f"/ItalicAngle {face.italic_angle:g} /Ascent {face.ascent} /Descent {face.descent} "
+            f"/CapHeight {face.ascent} /StemV 80 /FontFile2 {font_stream} 0 R >>".encode()
+        )
+        widths = " ".join(f"{gid} [{face.advance(gid)}]" for gid, _ in used)
+        cid_font = add(
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{face.name} "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor} 0 R /DW {face.advance(0)} /W [{widths}] /CIDToGIDMap /Identity >>".encode()
+        )
+        to_unicode = zlib.compress(_to_unicode_cmap(used).encode("ascii"))
+        unicode_map = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(to_unicode)
+                          + to_unicode + b"\nendstream")
+        return add(
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{face.name} /Encoding /Identity-H "
+            f"/DescendantFonts [{cid_font} 0 R] /ToUnicode {unicode_map} 0 R >>".encode()
+        )
+
+
+def _to_unicode_cmap(used):
+    # Maps the glyph ids back to text, so the PDF's text can be searched and copied
+    lines = [
+        "/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+        "1 begincodespacerange <0000> <FFFF> endcodespacerange",
+    ]
+    for start in range(0, len(used), 100):
+        chunk = used[start:start + 100]
+        lines.append(f"{len(chunk)} beginbfchar")
+        lines += [f"<{gid:04X}> <{char.encode('utf-16-be').hex().upper()}>" for gid, char in chunk]
+        lines.append("endbfchar")
+    lines.append("endcmap CMapName currentdict /CMap defineresource pop end end")
+    return "\n".join(lines)
+
+
+class PDFLayout:
+    """Greedy line breaking of styled words onto fixed-size pages."""
+
+    def __init__(self, fonts):
+        self.fonts = fonts
+        self.pages = []
+        self.ops = None
+        self.y = 0
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def space(self, points):
+        if self.ops is not None and self.y < PAGE_HEIGHT - MARGIN:
+            self.y -= points
+
+    def paragraph(self, runs, size, leading, indent=0, marker=None):
+        """Set runs [(text, font)] as wrapped lines; marker is drawn in the indent gap."""
+        if self.ops is None:
+            self.new_page()
+        left = MARGIN + indent
+        width = PAGE_WIDTH - MARGIN - left
+        words = []
+        for text, font in runs:
+            for index, word in enumerate(text.split(" ")):
+                # Remember whether a space separated this word from the previous one
+                words.append((word, font, index > 0))
+        line, line_width = [], 0
+        first_line = True
+        for word, font, spaced in words:
+            if not word:
+                continue
+            word_width = self.fonts.width(word, font, size)
+            gap = self.fonts.width(" ", font, size) if line and spaced else 0
+            if line and line_width + gap + word_width > width:
+                self._line(line, left, size, leading, marker if first_line else None)
+                first_line = False
+                line, line_width, gap = [], 0, 0
+            line.append((word, font, gap))
+            line_width += gap + word_width
+        if line:
+            self._line(line, left, size, leading, marker if first_line else None)
+
+    def _line(self, line, left, size, leading, marker):
+        if self.y - leading < MARGIN:
+            self.new_page()
+        self.y -= leading
+        baseline = self.y + (leading - size) / 2
+        if marker:
+            self.ops.append(self.fonts.show(marker, "regular", size, left - LIST_INDENT + 4, baseline))
+        x = left
+        for word, font, gap in line:
+            x += gap
+            self.ops.append(self.fonts.show(word, font, size, x, baseline))
+            x += self.fonts.width(word, font, size)
+
+
+def _pdf_runs(spans, font="regular"):
+    runs = []
+    for span in spans:
+        if isinstance(span, str):
+            runs.append((span, font))
+        elif "strong" in span:
+            runs.append((span["strong"], "bold"))
+        else:
+            runs.append((span["em"], "italic"))
+    return runs
+
+
+def _pdf_block(layout, spans, style, font="regular", indent=0, marker=None):
+    size, leading, before = PDF_STYLES[style]
+    layout.space(before)
+    layout.paragraph(_pdf_runs(spans, font), size, leading, indent, marker)
+
+
+def render_pdf(tree, cover=None, fonts=None):
+    """fonts is (regular, bold) paths of TrueType fonts to embed; None sets the text in
+    Helvetica, which replaces characters outside cp1252 with "?"."""
+    layout = PDFLayout(EmbeddedFonts(*fonts) if fonts else StandardFonts())
+    if cover and cover.get("title"):
+        layout.new_page()
+        _pdf_block(layout, [cover["title"]], "title", "bold")
+        for value in (cover.get("author"), cover.get("company")):
+            if value:
+                _pdf_block(layout, [value], "body")
+    for section in tree["sections"]:
+        # Each section starts on a new page
+        layout.new_page()
+        if section["title"]:
+            _pdf_block(layout, [section["title"]], 2, "bold")
+        for block in section["blocks"]:
+            if block["type"] == "heading":
+                _pdf_block(layout, block["content"], block["level"], "bold")
+            elif block["type"] == "list":
+                for number, item in enumerate(block["items"], start=1):
+                    marker = f"{number}." if block["ordered"] else "•"
+                    _pdf_block(layout, item, "body", indent=LIST_INDENT, marker=marker)
+            else:
+                _pdf_block(layout, block["content"], "body")
+    if not layout.pages:
+        layout.new_page()
+    _number_pages(layout, skip_first=bool(cover and cover.get("title")))
+    return _write_pdf(layout.pages, layout.fonts)
+
+
+def _number_pages(layout, skip_first):
+    total = len(layout.pages)
+    for number, ops in enumerate(layout.pages, start=1):
+        if skip_first and number == 1:
+            continue
+        label = f"Page {number} of {total}"
+        x = PAGE_WIDTH - MARGIN - layout.fonts.width(label, "regular", 9)
+        ops.append(layout.fonts.show(label, "regular", 9, x, MARGIN / 2))
+
+
+def _write_pdf(pages, fonts):
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    page_tree = add(None)
+    resources = fonts.resources(add)
+    page_numbers = []
+    for ops in pages:
+        stream = zlib.compress("\n".join(ops).encode("latin-1"))
+        content = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_numbers.append(add(
+            f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << {resources} >> >> /Contents {content} 0 R >>".encode()
+        ))
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {page_tree} 0 R >>".encode()
+    objects[page_tree - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode()
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    output.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    output.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return output.getvalue()
+
+
+# Renderers of the tree; markdown is exported from the stored text (render_markdown)
+RENDERERS = {
+    "pdf": render_pdf,
+    "docx": render_docx,
+}
+
+
+def render(fmt, tree, cover=None, pdf_fonts=None):
+    if fmt == "pdf":
+        return render_pdf(tree, cover, pdf_fonts)
+    return RENDERERS[fmt](tree, cover)
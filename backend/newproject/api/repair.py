@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .documents import split_sections
+from .generation import GENERATION_CONFIG, OUTLINE
+from .metrics import counter
+from .sectioned import (
+    _agenerate_group, _generate_group, _heading_key, _in_context, extract_sections, match_title,
+    sectioned_config,
+)
+
+logger = logging.getLogger(__name__)
+
+# Section repair for single-call documents. The reply is checked against all 18 outline
+# sections: missing ones, ones with too little body text and the last one if the reply was
+# cut off at the output token cap are regenerated, one section per call with the survey's
+# context and the model and generation config of its routing tier, in parallel. The new
+# sections are spliced in at their outline position and the sound ones are kept as the
+# model wrote them. MAX_WORKERS, RETRIES and MIN_SECTION_CHARS come from
+# settings.SECTIONED_GENERATION.
+
+# Finish reasons meaning the reply hit the output token cap (FinishReason.MAX_TOKENS == 2)
+TRUNCATED_FINISH_REASONS = {"MAX_TOKENS", 2}
+# Without a finish reason, a last line ending like this reads as finished; anything else
+# in a paragraph was probably cut off
+SENTENCE_END = re.compile(r"""[.!?:;)\]"'*`]\s*$""")
+# Lines that are complete without closing punctuation: list items, table rows, headings
+STRUCTURAL_LINE = re.compile(r"^\s*(?:[-*+]\s|\d+[.)]\s|\||#)")
+
+OUTLINE_TITLES = {_heading_key(section["title"]): section["title"] for section in OUTLINE}
+OUTLINE_POSITIONS = {section["title"]: index for index, section in enumerate(OUTLINE)}
+
+SECTION_REPAIRS = counter(
+    "section_repairs_total",
+    "Outline sections regenerated after validation, by reason (missing, short, truncated) and outcome.",
+    ["reason", "outcome"],
+)
+
+
+def finish_reason(response):
+    """The first candidate's finish reason, as its name where it is an enum, or None."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return None
+    return getattr(reason, "name", reason)
+
+
+def is_truncated(text, response=None):
+    """Whether text stops before the model finished.
+
+    The reply's finish reason decides when there is one: a document may well end in a
+    list of references or a URL. Without it, text is taken as cut off when its last line
+    is an unterminated paragraph or inside an unclosed code block.
+    """
+    reason = finish_reason(response)
+    if reason is not None:
+        return reason in TRUNCATED_FINISH_REASONS
+    if text.count("```") % 2:
+        return True
+    lines = text.rstrip().splitlines()
+    if not lines:
+        return False
+    last = lines[-1]
+    return not STRUCTURAL_LINE.match(last) and not SENTENCE_END.search(last)
+
+
+def damaged_sections(text, response=None, min_chars=80):
+    """Return [(section, reason)] for the outline sections text lacks or has broken."""
+    found = extract_sections(text, OUTLINE, min_chars)
+    sections = split_sections(text)
+    present = {match_title(heading, OUTLINE_TITLES) for heading, _ in sections}
+    # Only the section the text ends in can have been cut off
+    truncated_title = None
+    if sections and is_truncated(text, response):
+        truncated_title = match_title(sections[-1][0], OUTLINE_TITLES)
+
+    damaged = []
+    for section in OUTLINE:
+        title = section["title"]
+        if title == truncated_title:
+            damaged.append((section, "truncated"))
+        elif title not in found:
+            damaged.append((section, "short" if title in present else "missing"))
+    return damaged
+
+
+def splice_sections(text, replacements, truncated=False):
+    """Put replacements {title: section text} into text at their outline positions.
+
+    A replacement takes the place of the section it repairs; one for a section text lacks
+    goes in before the next outline section that follows it. When truncated, a trailing
+    fragment that is not an outline section (a half-written heading) is dropped.
+    """
+    sections = split_sections(text)
+    if truncated and len(sections) > 1 and match_title(sections[-1][0], OUTLINE_TITLES) is None:
+        sections.pop()
+
+    pending = sorted(replacements, key=lambda title: OUTLINE_POSITIONS[title])
+    parts = []
+
+    def add(part):
+        if parts and not parts[-1].endswith("\n\n"):
+            parts[-1] = parts[-1].rstrip("\n") + "\n\n"
+        parts.append(part)
+
+    for heading, section_text in sections:
+        title = match_title(heading, OUTLINE_TITLES)
+        if title is not None:
+            position = OUTLINE_POSITIONS[title]
+            while pending and OUTLINE_POSITIONS[pending[0]] <= position:
+                add(replacements[pending.pop(0)])
+            if title in replacements:
+                # Replaced above, or a repeat of a section that was already replaced
+                continue
+        add(section_text)
+    for title in pending:
+        add(replacements[title])
+    return "".join(parts).rstrip() + "\n"
+
+
+def _plan(text, response, config):
+    damaged = damaged_sections(text, response, config['MIN_SECTION_CHARS'])
+    if damaged:
+        descriptions = [f"{section['title']} ({reason})" for section, reason in damaged]
+        logger.warning("Repairing %s sections: %s", len(damaged), ", ".join(descriptions))
+    return damaged
+
+
+def _finish(text, response, damaged, replacements):
+    reasons = {section["title"]: reason for section, reason in damaged}
+    for title, reason in reasons.items():
+        SECTION_REPAIRS.inc(reason=reason, outcome="repaired" if title in replacements else "failed")
+    failed = [title for title in reasons if title not in replacements]
+    if failed:
+        logger.warning("Sections still damaged after repair: %s", failed)
+    if not replacements:
+        return text
+    return splice_sections(text, replacements, is_truncated(text, response))
+
+
+def _section_model(model, plan, section):
+    """(model, generation_config) a section is regenerated with: its tier's in plan, else
+    model with the default generation config."""
+    if plan is None:
+        return model, GENERATION_CONFIG
+    tier = plan.tier_for(section["title"])
+    return tier.model(), tier.generation_config
+
+
+def repair_sections(model, survey_data, text, response=None, plan=None):
+    """Regenerate the sections of text that are missing, too short or cut off, in parallel,
+    and return text with them spliced in. text is returned unchanged when it is sound.
+
+    plan is the request's api.routing.RoutePlan, whose tiers the sections are generated with.
+    """
+    config = sectioned_config()
+    damaged = _plan(text, response, config)
+    if not damaged:
+        return text
+
+    def regenerate(section):
+        section_model, generation_config = _section_model(model, plan, section)
+        return _generate_group(section_model, survey_data, [section], config['MIN_SECTION_CHARS'],
+                               generation_config)
+
+    replacements = {}
+    pending = [section for section, _ in damaged]
+    with ThreadPoolExecutor(max_workers=config['MAX_WORKERS']) as pool:
+        for _ in range(config['RETRIES'] + 1):
+            results = pool.map(_in_context(regenerate), pending)
+            for result in results:
+                replacements.update(result)
+            pending = [section for section in pending if section["title"] not in replacements]
+            if not pending:
+                break
+    return _finish(text, response, damaged, replacements)
+
+
+async def arepair_sections(model, survey_data, text, response=None, plan=None):
+    """Async counterpart of repair_sections using asyncio.gather."""
+    config = sectioned_config()
+    damaged = _plan(text, response, config)
+    if not damaged:
+        return text
+
+    semaphore = asyncio.Semaphore(config['MAX_WORKERS'])
+
+    async def regenerate(section):
+        section_model, generation_config = _section_model(model, plan, section)
+        return await _agenerate_group(section_model, survey_data, [section], config['MIN_SECTION_CHARS'],
+                                      semaphore, generation_config)
+
+    replacements = {}
+    pending = [section for section, _ in damaged]
+    for _ in range(config['RETRIES'] + 1):
+        results = await asyncio.gather(*(regenerate(section) for section in pending))
+        for result in results:
+            replacements.update(result)
+        pending = [section for section in pending if section["title"] not in replacements]
+        if not pending:
+            break
+    return _finish(text, response, damaged, replacements)
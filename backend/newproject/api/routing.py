@@ -0,0 +1,227 @@
+import logging
+import time
+
+from .config import lazy_singleton, options_from, settings_section
+from .documents import estimate_tokens
+from .generation import GEMINI_MODEL, GENERATION_CONFIG, MODEL_CONFIG, OUTLINE
+from .llm import get_model
+from .metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+# Tiered model routing. Each outline section is sent to a model tier (a model and its
+# generation config), so boilerplate such as the Table of Contents can come from a fast,
+# cheap model while the core sections stay on the pro model. A profile (a match on the
+# survey's answers) can route a whole request to one tier instead. Documents whose
+# sections use more than one tier are always generated per section group
+# (api.sectioned), since one completion can only come from one model.
+#
+# With routing disabled every request gets a plan with the single "default" tier, built
+# from GEMINI_MODEL and GENERATION_CONFIG, so cache keys are the same as before routing.
+
+DEFAULT_MODEL_ROUTING = {
+    'ENABLED': False,
+    'DEFAULT_TIER': 'pro',
+    # name -> {'MODEL': ..., 'GENERATION_CONFIG': {...}}; 'pro' defaults to GEMINI_MODEL
+    'TIERS': {},
+    'SECTIONS': {},  # outline section title -> tier name; unlisted sections get DEFAULT_TIER
+    # [{'MATCH': {survey field: value or list of values}, 'TIER': name}]; the first profile
+    # matching every field routes the whole request to its tier
+    'PROFILES': [],
+}
+
+TIER_CALLS = counter("llm_tier_calls_total", "Model calls by routing tier and outcome (ok, error).",
+                     ["tier", "outcome"])
+TIER_SECONDS = histogram("llm_tier_call_duration_seconds", "Duration of non-streamed model calls by routing tier.",
+                         ["tier"])
+TIER_TOKENS = counter("llm_tier_tokens_total", "Tokens sent to and generated by each routing tier.",
+                      ["tier", "kind"])
+
+
+model_routing_config = settings_section('MODEL_ROUTING', DEFAULT_MODEL_ROUTING)
+
+
+def _usage(contents, response):
+    """(prompt tokens, output tokens) from the reply's usage metadata, else estimated."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        return usage.prompt_token_count, usage.candidates_token_count
+    text = contents if isinstance(contents, str) else str(contents)
+    return estimate_tokens(text), estimate_tokens(response.text)
+
+
+class TierModel:
+    """Model handle that records the latency, tokens and outcome of its calls under a tier."""
+
+    def __init__(self, model, tier):
+        self.model = model
+        self.tier = tier
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _record(self, contents, response, started):
+        TIER_SECONDS.observe(time.perf_counter() - started, tier=self.tier)
+        TIER_CALLS.inc(tier=self.tier, outcome="ok")
+        try:
+            prompt_tokens, output_tokens = _usage(contents, response)
+        except Exception:
+            return
+        TIER_TOKENS.inc(prompt_tokens, tier=self.tier, kind="prompt")
+        TIER_TOKENS.inc(output_tokens, tier=self.tier, kind="output")
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.model.generate_content(contents, generation_config=generation_config, stream=stream, **kwargs)
+        except Exception:
+            TIER_CALLS.inc(tier=self.tier, outcome="error")
+            raise
+        # A streamed reply is read later, so only the call itself is counted
+        if stream:
+            TIER_CALLS.inc(tier=self.tier, outcome="ok")
+        else:
+            self._record(contents, response, started)
+        return response
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.model.generate_content_async(
+                contents, generation_config=generation_config, stream=stream, **kwargs
+            )
+        except Exception:
+            TIER_CALLS.inc(tier=self.tier, outcome="error")
+            raise
+        if stream:
+            TIER_CALLS.inc(tier=self.tier, outcome="ok")
+        else:
+            self._record(contents, response, started)
+        return response
+
+
+class ModelTier:
+    def __init__(self, name, model_name, generation_config, handle=None):
+        self.name = name
+        self.model_name = model_name
+        self.generation_config = generation_config
+        # A model handle to use instead of the provider's, e.g. one passed in by a caller
+        self.handle = handle
+
+    def model(self):
+        return TierModel(self.handle or get_model(self.model_name, MODEL_CONFIG), self.name)
+
+
+class RoutePlan:
+    """The tier of every outline section for one request."""
+
+    def __init__(self, section_tiers, default_tier, profile=None):
+        self.section_tiers = section_tiers
+        self.default_tier = default_tier
+        self.profile = profile
+        self.tiers = list({tier.name: tier for tier in section_tiers.values()}.values())
+
+    @property
+    def mixed(self):
+        return len(self.tiers) > 1
+
+    @property
+    def document_tier(self):
+        """The tier a single-call (or streamed) document is generated with."""
+        return self.default_tier if self.mixed else self.tiers[0]
+
+    @property
+    def model_name(self):
+        """The model(s) the document comes from, for cache keys and stored documents."""
+        if not self.mixed:
+            return self.document_tier.model_name
+        return "+".join(tier.model_name for tier in self.tiers)
+
+    @property
+    def generation_config(self):
+        if not self.mixed:
+            return self.document_tier.generation_config
+        return {
+            "tiers": {tier.name: {"model": tier.model_name, **tier.generation_config} for tier in self.tiers},
+            "sections": {title: tier.name for title, tier in self.section_tiers.items()},
+        }
+
+    def generation_mode(self, mode):
+        return "sectioned" if self.mixed else mode
+
+    def tier_for(self, title):
+        return self.section_tiers.get(title, self.default_tier)
+
+    def groups(self, group_size):
+        """[(tier, sections)] covering the outline in groups of at most group_size sections
+        of the same tier, each group in outline order."""
+        by_tier = {}
+        for section in OUTLINE:
+            by_tier.setdefault(self.tier_for(section["title"]).name, []).append(section)
+        groups = []
+        for tier in self.tiers:
+            sections = by_tier.get(tier.name, [])
+            groups.extend((tier, sections[i:i + group_size]) for i in range(0, len(sections), group_size))
+        return groups
+
+
+def single_tier_plan(tier):
+    return RoutePlan({section["title"]: tier for section in OUTLINE}, tier)
+
+
+def _matches(survey_data, match):
+    for field, expected in match.items():
+        value = survey_data.get(field)
+        expected = expected if isinstance(expected, (list, tuple)) else [expected]
+        values = value if isinstance(value, list) else [value]
+        if not any(item in expected for item in values):
+            return False
+    return True
+
+
+class ModelRouter:
+    def __init__(self, enabled=False, default_tier='pro', tiers=None, sections=None, profiles=None):
+        self.enabled = enabled
+        self.tiers = {
+            'pro': ModelTier('pro', GEMINI_MODEL, GENERATION_CONFIG),
+            **{
+                name: ModelTier(name, tier['MODEL'], tier.get('GENERATION_CONFIG', GENERATION_CONFIG))
+                for name, tier in (tiers or {}).items()
+            },
+        }
+        titles = {section["title"] for section in OUTLINE}
+        unknown = [title for title in (sections or {}) if title not in titles]
+        if unknown:
+            logger.warning("MODEL_ROUTING names sections that are not in the outline: %s", unknown)
+        for tier_name in [default_tier, *(sections or {}).values(), *(p['TIER'] for p in profiles or [])]:
+            if tier_name not in self.tiers:
+                raise ValueError(f"MODEL_ROUTING refers to an unknown tier: {tier_name}")
+        self.default_tier = self.tiers[default_tier]
+        self.sections = {title: self.tiers[name] for title, name in (sections or {}).items() if title in titles}
+        self.profiles = profiles or []
+        self._section_plan = RoutePlan(
+            {section["title"]: self.sections.get(section["title"], self.default_tier) for section in OUTLINE},
+            self.default_tier,
+        )
+
+    def route(self, survey_data, model=None):
+        """The RoutePlan for survey_data. With routing disabled, every section goes to model
+        (or the provider's GEMINI_MODEL handle) with GENERATION_CONFIG."""
+        if not self.enabled:
+            return single_tier_plan(ModelTier('default', GEMINI_MODEL, GENERATION_CONFIG, handle=model))
+        for index, profile in enumerate(self.profiles):
+            if _matches(survey_data, profile['MATCH']):
+                plan = single_tier_plan(self.tiers[profile['TIER']])
+                plan.profile = profile.get('NAME', index)
+                return plan
+        return self._section_plan
+
+
+@lazy_singleton
+def get_model_router():
+    """Return the process-wide ModelRouter built from settings.MODEL_ROUTING."""
+    return ModelRouter(**options_from(model_routing_config()))
+
+
+def route_survey(survey_data, model=None):
+    return get_model_router().route(survey_data, model)
@@ -0,0 +1,538 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .config import lazy_singleton, options_from, settings_section
+from .metrics import counter, gauge, histogram
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Process-wide scheduler for outbound model calls. Every call first takes one request
+# from a requests-per-minute bucket and its estimated tokens (prompt plus the configured
+# max_output_tokens) from a tokens-per-minute bucket; unused tokens are refunded once the
+# reply is in. Callers queue by priority and wait their turn, and are shed with
+# SchedulerBusy when the queue is full or their wait would exceed MAX_WAIT_SECONDS.
+# A 429 from the provider halves the effective rates and pauses sending briefly; every
+# success wins back RECOVERY_STEP of the configured rates (AIMD). Throttled calls are
+# retried with full-jitter exponential backoff. A streamed call keeps its place among the
+# in-flight calls until its reply has been read to the end.
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+DEFAULT_LLM_SCHEDULER = {
+    'ENABLED': True,
+    'REQUESTS_PER_MINUTE': 60,
+    'TOKENS_PER_MINUTE': 1_000_000,
+    'MAX_QUEUE': 100,
+    'MAX_WAIT_SECONDS': {INTERACTIVE: 30, BACKGROUND: 300},
+    'RETRIES': 3,
+    'BACKOFF_SECONDS': 1.0,
+    'BACKOFF_MAX_SECONDS': 30.0,
+    'MIN_RATE_FRACTION': 0.1,
+    'RECOVERY_STEP': 0.05,
+}
+
+CHARS_PER_TOKEN = 4
+
+_priority = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class SchedulerBusy(Exception):
+    """The call was shed, or kept being throttled; retry_after is a hint in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+llm_scheduler_config = settings_section('LLM_SCHEDULER', DEFAULT_LLM_SCHEDULER)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Run the model calls made inside the block at priority (INTERACTIVE or BACKGROUND)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_throttle(error):
+    # google.api_core.exceptions.ResourceExhausted and FakeRateLimitError carry code 429
+    return getattr(error, "code", None) == 429
+
+
+def estimate_call_tokens(contents, generation_config):
+    text = contents if isinstance(contents, str) else str(contents)
+    max_output = (generation_config or {}).get("max_output_tokens", 0)
+    return len(text) // CHARS_PER_TOKEN + 1 + max_output
+
+
+class Scheduler:
+    def __init__(self, requests_per_minute, tokens_per_minute, max_queue, max_wait_seconds,
+                 retries, backoff_seconds, backoff_max_seconds, min_rate_fraction, recovery_step,
+                 enabled=True):
+        self.enabled = enabled
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.min_rate_fraction = min_rate_fraction
+        self.recovery_step = recovery_step
+        # A minute's budget can be spent in a burst
+        self.requests = TokenBucket.per_minute(requests_per_minute, requests_per_minute)
+        self.tokens = TokenBucket.per_minute(tokens_per_minute, tokens_per_minute)
+        self.rate_fraction = 1.0
+        self.paused_until = 0.0
+        self.in_flight = 0
+        # Calls waiting in _queue; cancelled entries stay in the heap until they reach its top
+        self.waiting = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        # (loop, event) of the coroutines waiting in aacquire, woken along with the threads
+        self._async_waiters = set()
+
+    # Admission
+
+    def acquire(self, cost, priority=None):
+        """Block until this call may be sent, in priority order. Returns the tokens taken."""
+        priority = _priority.get() if priority is None else priority
+        cost = min(cost, self.tokens.capacity)
+        started = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    timeout = self._poll(entry, cost, started)
+                    if timeout is None:
+                        return cost
+                    self._condition.wait(timeout)
+            except BaseException:
+                self._cancel(entry)
+                raise
+            finally:
+                self._notify()
+
+    async def aacquire(self, cost, priority=None):
+        """Async counterpart of acquire, which waits on the event loop instead of a thread.
+
+        A cancelled wait leaves the queue without having taken anything.
+        """
+        priority = _priority.get() if priority is None else priority
+        cost = min(cost, self.tokens.capacity)
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    timeout = self._poll(entry, cost, started)
+                    if timeout is None:
+                        return cost
+                    waiter = (loop, asyncio.Event())
+                    self._async_waiters.add(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._condition:
+                        self._async_waiters.discard(waiter)
+        except BaseException:
+            with self._condition:
+                self._cancel(entry)
+                self._drop_cancelled()
+                self._notify()
+            raise
+
+    def _enqueue(self, priority):
+        if self.waiting >= self.max_queue:
+            SCHEDULED_CALLS.inc(outcome="shed", priority=PRIORITY_NAMES[priority])
+            raise SchedulerBusy("Model call queue is full", retry_after=self._retry_after())
+        entry = [priority, next(self._sequence), False]
+        heapq.heappush(self._queue, entry)
+        self.waiting += 1
+        return entry
+
+    def _cancel(self, entry):
+        # Called with the lock held
+        if not entry[2]:
+            entry[2] = True
+            self.waiting -= 1
+
+    def _poll(self, entry, cost, started):
+        """Take the budget for entry if it is its turn and the budget is there. Returns None
+        when taken, else the seconds to wait before polling again; raises SchedulerBusy
+        when the wait would outlast the priority's limit. Called with the lock held."""
+        priority = entry[0]
+        self._drop_cancelled()
+        if self._queue[0] is entry:
+            now = time.monotonic()
+            delay = max(self.paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(cost))
+            if delay <= 0:
+                self.requests.try_acquire(1)
+                self.tokens.try_acquire(cost)
+                heapq.heappop(self._queue)
+                self.waiting -= 1
+                self.in_flight += 1
+                SCHEDULER_WAIT.observe(now - started, priority=PRIORITY_NAMES[priority])
+                self._notify()
+                return None
+        else:
+            delay = None
+        wait_limit = self.max_wait_seconds.get(priority, max(self.max_wait_seconds.values()))
+        remaining = started + wait_limit - time.monotonic()
+        if remaining <= 0 or (delay is not None and delay > remaining):
+            SCHEDULED_CALLS.inc(outcome="shed", priority=PRIORITY_NAMES[priority])
+            raise SchedulerBusy(
+                "Model rate limit reached, try again later",
+                retry_after=max(1, int(delay or self._retry_after())),
+            )
+        return remaining if delay is None else min(delay, remaining)
+
+    def _notify(self):
+        # Called with the lock held
+        self._condition.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop was closed under the waiter
+                pass
+
+    def _drop_cancelled(self):
+        while self._queue and self._queue[0][2]:
+            heapq.heappop(self._queue)
+
+    def _retry_after(self):
+        return max(1, int(max(self.paused_until - time.monotonic(), self.requests.wait_time(1)) + 1))
+
+    # Feedback from the provider
+
+    def release(self, reserved, used=None):
+        """Finish a call; refund the part of the reserved tokens it did not use."""
+        with self._condition:
+            self.in_flight -= 1
+            if used is not None and used < reserved:
+                self.tokens.refund(reserved - used)
+            self._notify()
+
+    def record_success(self):
+        if self.rate_fraction < 1.0:
+            self._set_rate_fraction(self.rate_fraction + self.recovery_step)
+
+    def record_throttle(self, attempt):
+        """Cut the rates and pause sending after a 429. Returns the backoff before retrying."""
+        backoff = random.uniform(0, min(self.backoff_max_seconds, self.backoff_seconds * 2 ** attempt))
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+            self._notify()
+        self._set_rate_fraction(self.rate_fraction / 2)
+        logger.warning("Model call throttled, rates cut to %.0f%%, retrying in %.1fs", self.rate_fraction * 100, backoff)
+        return backoff
+
+    def _set_rate_fraction(self, fraction):
+        with self._condition:
+            self.rate_fraction = min(1.0, max(self.min_rate_fraction, fraction))
+            self.requests.set_rate(self.requests_per_minute / 60 * self.rate_fraction)
+            self.tokens.set_rate(self.tokens_per_minute / 60 * self.rate_fraction)
+            self._notify()
+
+    # Calls
+
+    def call(self, send, cost, used_tokens=None):
+        """Send a call through the scheduler, retrying it while it is throttled."""
+        priority = _priority.get()
+        for attempt in range(self.retries + 1):
+            reserved = self.acquire(cost, priority)
+            used = None
+            try:
+                response = send()
+                used = used_tokens(response) if used_tokens else None
+            except Exception as e:
+                if not is_throttle(e):
+                    SCHEDULED_CALLS.inc(outcome="error", priority=PRIORITY_NAMES[priority])
+                    raise
+                SCHEDULED_CALLS.inc(outcome="throttled", priority=PRIORITY_NAMES[priority])
+                backoff = self.record_throttle(attempt)
+                if attempt == self.retries:
+                    raise SchedulerBusy("Model provider is rate limiting requests", retry_after=max(1, int(backoff) + 1)) from e
+                # The retry waits in acquire until the backoff pause is over
+                continue
+            finally:
+                self.release(reserved, used)
+            self.record_success()
+            SCHEDULED_CALLS.inc(outcome="ok", priority=PRIORITY_NAMES[priority])
+            return response
+
+    async def acall(self, send, cost, used_tokens=None):
+        """Async counterpart of call; send returns an awaitable."""
+        priority = _priority.get()
+        for attempt in range(self.retries + 1):
+            reserved = await self.aacquire(cost, priority)
+            used = None
+            try:
+                response = await send()
+                used = used_tokens(response) if used_tokens else None
+            except Exception as e:
+                if not is_throttle(e):
+                    SCHEDULED_CALLS.inc(outcome="error", priority=PRIORITY_NAMES[priority])
+                    raise
+                SCHEDULED_CALLS.inc(outcome="throttled", priority=PRIORITY_NAMES[priority])
+                backoff = self.record_throttle(attempt)
+                if attempt == self.retries:
+                    raise SchedulerBusy("Model provider is rate limiting requests", retry_after=max(1, int(backoff) + 1)) from e
+                continue
+            finally:
+                self.release(reserved, used)
+            self.record_success()
+            SCHEDULED_CALLS.inc(outcome="ok", priority=PRIORITY_NAMES[priority])
+            return response
+
+    def stream(self, send, cost, prompt_tokens=None):
+        """Send a streamed call; returns a ScheduledStream of its reply."""
+        stream = ScheduledStream(self, send, cost, prompt_tokens)
+        stream.open()
+        return stream
+
+    async def astream(self, send, cost, prompt_tokens=None):
+        """Async counterpart of stream; send returns an awaitable of an async iterable reply."""
+        stream = AsyncScheduledStream(self, send, cost, prompt_tokens)
+        await stream.open()
+        return stream
+
+    def stats(self):
+        with self._condition:
+            queued = [entry for entry in self._queue if not entry[2]]
+            return {
+                "enabled": self.enabled,
+                "queued": {name: sum(1 for entry in queued if entry[0] == priority)
+                           for priority, name in PRIORITY_NAMES.items()},
+                "in_flight": self.in_flight,
+                "rate_fraction": round(self.rate_fraction, 3),
+                "requests_available": int(self.requests.available()),
+                "tokens_available": int(self.tokens.available()),
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            }
+
+
+def _chunk_chars(chunk):
+    try:
+        return len(chunk.text or "")
+    except Exception:
+        # Gemini raises when a chunk has no text part
+        return 0
+
+
+class ScheduledStream:
+    """A streamed reply that holds its scheduler reservation until it has been read to
+    the end, closed or dropped, so the rate limits cover the whole generation.
+
+    Providers often answer 429 only once the reply is read; a call throttled before its
+    first chunk is backed off and sent again like in Scheduler.call, one throttled
+    midway fails with SchedulerBusy. Other attributes are those of the current reply.
+    """
+
+    response = None
+    reserved = None
+
+    def __init__(self, scheduler, send, cost, prompt_tokens=None):
+        self.scheduler = scheduler
+        self.send = send
+        self.cost = cost
+        self.prompt_tokens = prompt_tokens
+        self.priority = _priority.get()
+        self.reserved = None
+        self.attempt = 0
+        self.received = 0  # characters of text read so far
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def open(self):
+        while True:
+            self.reserved = self.scheduler.acquire(self.cost, self.priority)
+            try:
+                self.response = self.send()
+                return
+            except Exception as e:
+                self._failed(e)
+
+    def __iter__(self):
+        if self.reserved is None:
+            # Already read through: the reply replays its chunks
+            yield from self.response
+            return
+        try:
+            while True:
+                try:
+                    for chunk in self.response:
+                        self.received += _chunk_chars(chunk)
+                        yield chunk
+                except Exception as e:
+                    self._failed(e)
+                    self.open()
+                    continue
+                self._succeeded()
+                return
+        finally:
+            self.close()
+
+    def close(self):
+        """Give back the reservation of a reply that will not be read any further."""
+        if self.reserved is not None:
+            reserved, self.reserved = self.reserved, None
+            self.scheduler.release(reserved, self._used())
+
+    def __del__(self):
+        self.close()
+
+    def _used(self):
+        if self.prompt_tokens is None:
+            return None
+        return self.prompt_tokens + self.received // CHARS_PER_TOKEN
+
+    def _succeeded(self):
+        self.close()
+        self.scheduler.record_success()
+        SCHEDULED_CALLS.inc(outcome="ok", priority=PRIORITY_NAMES[self.priority])
+
+    def _failed(self, error):
+        """Release the call after error; returns if it should be sent again, else raises."""
+        self.close()
+        if not is_throttle(error):
+            SCHEDULED_CALLS.inc(outcome="error", priority=PRIORITY_NAMES[self.priority])
+            raise error
+        SCHEDULED_CALLS.inc(outcome="throttled", priority=PRIORITY_NAMES[self.priority])
+        backoff = self.scheduler.record_throttle(self.attempt)
+        if self.received or self.attempt == self.scheduler.retries:
+            raise SchedulerBusy("Model provider is rate limiting requests", retry_after=max(1, int(backoff) + 1)) from error
+        # The retry waits in acquire until the backoff pause is over
+        self.attempt += 1
+
+
+class AsyncScheduledStream(ScheduledStream):
+    """ScheduledStream of an async reply, read with async for."""
+
+    async def open(self):
+        while True:
+            self.reserved = await self.scheduler.aacquire(self.cost, self.priority)
+            try:
+                self.response = await self.send()
+                return
+            except Exception as e:
+                self._failed(e)
+
+    def __iter__(self):
+        raise TypeError("Read an async reply with async for")
+
+    async def __aiter__(self):
+        if self.reserved is None:
+            async for chunk in self.response:
+                yield chunk
+            return
+        try:
+            while True:
+                try:
+                    async for chunk in self.response:
+                        self.received += _chunk_chars(chunk)
+                        yield chunk
+                except Exception as e:
+                    self._failed(e)
+                    await self.open()
+                    continue
+                self._succeeded()
+                return
+        finally:
+            self.close()
+
+
+class ScheduledModel:
+    """Model handle whose generate_content calls go through a Scheduler."""
+
+    def __init__(self, model, scheduler, generation_config=None):
+        self.model = model
+        self.scheduler = scheduler
+        self.generation_config = generation_config or {}
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _cost(self, contents, generation_config):
+        return estimate_call_tokens(contents, generation_config or self.generation_config)
+
+    @staticmethod
+    def _used_tokens(contents):
+        def used(response):
+            try:
+                text = response.text
+            except Exception:
+                return None
+            return estimate_call_tokens(contents, None) + len(text) // CHARS_PER_TOKEN
+        return used
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        cost = self._cost(contents, generation_config)
+
+        def send():
+            return self.model.generate_content(contents, generation_config=generation_config, stream=stream, **kwargs)
+
+        if stream:
+            return self.scheduler.stream(send, cost, estimate_call_tokens(contents, None))
+        return self.scheduler.call(send, cost, self._used_tokens(contents))
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        cost = self._cost(contents, generation_config)
+
+        def send():
+            return self.model.generate_content_async(
+                contents, generation_config=generation_config, stream=stream, **kwargs
+            )
+
+        if stream:
+            return await self.scheduler.astream(send, cost, estimate_call_tokens(contents, None))
+        return await self.scheduler.acall(send, cost, self._used_tokens(contents))
+
+
+@lazy_singleton
+def get_scheduler():
+    """Return the process-wide Scheduler built from settings.LLM_SCHEDULER."""
+    return Scheduler(**options_from(llm_scheduler_config()))
+
+
+def _queue_depths():
+    stats = get_scheduler().stats()
+    return {(name,): count for name, count in stats["queued"].items()}
+
+
+def _rate_fraction():
+    return {(): get_scheduler().rate_fraction}
+
+
+SCHEDULED_CALLS = counter(
+    "llm_scheduler_calls_total", "Model calls by outcome (ok, throttled, shed, error).", ["outcome", "priority"]
+)
+SCHEDULER_WAIT = histogram(
+    "llm_scheduler_wait_seconds", "Time model calls waited for a request and token budget.", ["priority"]
+)
+SCHEDULER_QUEUE = gauge(
+    "llm_scheduler_queued", "Model calls waiting for their turn.", ["priority"], collect=_queue_depths
+)
+SCHEDULER_RATE = gauge(
+    "llm_scheduler_rate_fraction", "Share of the configured RPM/TPM currently allowed.", collect=_rate_fraction
+)
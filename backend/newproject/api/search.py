@@ -0,0 +1,315 @@
+import html
+import logging
+import re
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .config import settings_section
+from .metrics import stage
+from .models import GeneratedDocument, SearchEntry, Survey
+
+logger = logging.getLogger(__name__)
+
+# Full-text search over surveys and their generated documents. Each survey has one
+# SearchEntry row with the text of its answers and of its document, written as the survey
+# and the document are saved (post_save, and index_surveys for bulk inserts that skip the
+# signal). The database indexes those rows itself: on SQLite an external-content FTS5
+# table kept in sync by triggers, on PostgreSQL a generated, weighted tsvector column with
+# a GIN index (both created by migration 0006). Other backends fall back to a LIKE scan.
+#
+# Queries are words, all of which must match, "quoted phrases" and prefix* words. Results
+# are ranked (answers weigh more than the document), or newest first with sort=recent,
+# which is much cheaper for words matching a large share of the surveys, since ranking
+# scores every match. Pages are numbered.
+
+DEFAULT_SEARCH = {
+    'ENABLED': True,  # index surveys and documents as they are written
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    'MAX_PAGE': 50,  # ranked results are paged by offset, so deep pages are refused
+    'MAX_TERMS': 16,
+    'SNIPPET_WORDS': 16,
+}
+
+FTS_TABLE = "api_search_fts"
+TEXT_SEARCH_CONFIG = "english"  # the PostgreSQL configuration of the tsvector column
+SURVEY_TEXT_FIELDS = [
+    'industry', 'industry_other', 'target_audience', 'technology', 'sub_technology', 'platform',
+    'web_frontend', 'web_backend', 'web_hosting', 'web_database', 'security_features',
+]
+RESULT_FIELDS = ['id', 'industry', 'target_audience', 'technology', 'created_at']
+
+# Snippet highlight markers; the snippet is HTML-escaped before they become <mark> tags
+MARK_START, MARK_END = "\x02", "\x03"
+MARKUP = re.compile(r"^[ \t]*(?:#{1,6}|>|[-*+])[ \t]+|[*_`|]+", re.MULTILINE)
+QUERY_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+WORD = re.compile(r"\w+")
+SORTS = ["rank", "recent"]
+
+# Backends whose tables were looked up, by database name
+_fts_tables = {}
+
+
+class InvalidSearchRequest(ValueError):
+    pass
+
+
+search_config = settings_section('SEARCH', DEFAULT_SEARCH)
+
+
+def survey_text(survey):
+    parts = []
+    for field in SURVEY_TEXT_FIELDS:
+        value = getattr(survey, field)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+
+def document_text(content):
+    """content without its markdown markup, as it is indexed and shown in snippets."""
+    return MARKUP.sub("", content)
+
+
+def search_backend():
+    """"fts5", "tsvector" or "like", for the default database."""
+    if connection.vendor == "postgresql":
+        return "tsvector"
+    if connection.vendor == "sqlite":
+        name = str(connection.settings_dict["NAME"])
+        if name not in _fts_tables:
+            _fts_tables[name] = FTS_TABLE in connection.introspection.table_names(include_views=True)
+        if _fts_tables[name]:
+            return "fts5"
+    return "like"
+
+
+# Writing the index
+
+def _write(description, action):
+    # The index is secondary: never fail the survey's or the document's save over it
+    try:
+        with transaction.atomic():
+            action()
+    except Exception as e:
+        logger.error("Failed to index %s: %s", description, e)
+
+
+def index_surveys(surveys):
+    """Index surveys inserted with bulk_create, which sends no post_save."""
+    if not surveys or not search_config()['ENABLED']:
+        return
+    _write(f"{len(surveys)} surveys", lambda: SearchEntry.objects.bulk_create(
+        [SearchEntry(survey_id=survey.id, survey_text=survey_text(survey)) for survey in surveys]
+    ))
+
+
+def index_document(survey, content):
+    """Index the generated document of survey."""
+    if not search_config()['ENABLED']:
+        return
+
+    def write():
+        text = document_text(content)
+        if not SearchEntry.objects.filter(survey_id=survey.id).update(document_text=text):
+            # e.g. a survey stored while indexing was off
+            SearchEntry.objects.create(survey_id=survey.id, survey_text=survey_text(survey), document_text=text)
+    _write(f"the document of survey {survey.id}", write)
+
+
+@receiver(post_save, sender=Survey, dispatch_uid="api.search.index_survey")
+def index_survey(sender, instance, created, **kwargs):
+    if not search_config()['ENABLED']:
+        return
+    if created:
+        _write(f"survey {instance.id}", lambda: SearchEntry.objects.create(
+            survey_id=instance.id, survey_text=survey_text(instance)
+        ))
+    else:
+        _write(f"survey {instance.id}", lambda: SearchEntry.objects.update_or_create(
+            survey_id=instance.id, defaults={"survey_text": survey_text(instance)}
+        ))
+
+
+@receiver(post_delete, sender=GeneratedDocument, dispatch_uid="api.search.unindex_document")
+def unindex_document(sender, instance, **kwargs):
+    if search_config()['ENABLED']:
+        _write(f"the removal of the document of survey {instance.survey_id}",
+               lambda: SearchEntry.objects.filter(survey_id=instance.survey_id).update(document_text=""))
+
+
+def optimize_index():
+    """Merge the FTS5 index into one b-tree, e.g. after a rebuild; PostgreSQL needs nothing."""
+    if search_backend() == "fts5":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+# Querying it
+
+def parse_query(query, max_terms=16):
+    """[(words, prefix)] for each term of query: a "quoted phrase" or a word (a word such as
+    e-commerce is the phrase of its parts), prefix when the term ends with *."""
+    terms = []
+    for phrase, word in QUERY_TERM.findall(query):
+        words = WORD.findall(phrase or word)
+        if words:
+            terms.append((words, bool(word) and word.endswith("*")))
+    return terms[:max_terms]
+
+
+def fts5_query(terms):
+    return " ".join(f'"{" ".join(words)}"{"*" if prefix else ""}' for words, prefix in terms)
+
+
+def tsquery(terms):
+    return " & ".join(
+        " <-> ".join(words) + (":*" if prefix else "") for words, prefix in terms
+    )
+
+
+def highlight(snippet):
+    return html.escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def _int_param(params, name, default):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise InvalidSearchRequest(f"{name} must be an integer")
+    if value < 1:
+        raise InvalidSearchRequest(f"{name} must be positive")
+    return value
+
+
+def _filters(params, column):
+    clauses, values = [], []
+    for field in ("industry", "target_audience"):
+        if params.get(field):
+            clauses.append(f" AND {column}.{field} = %s")
+            values.append(params[field])
+    return "".join(clauses), values
+
+
+def _fts5_matches(terms, params, sort, limit, offset, snippet_words):
+    filters, values = _filters(params, "s")
+    join = f" JOIN api_survey s ON s.id = {FTS_TABLE}.rowid" if filters else ""
+    # rank is bm25 with the column weights set by migration 0006; lower is better
+    order = "rank" if sort == "rank" else f"{FTS_TABLE}.rowid DESC"
+    sql = (
+        f"SELECT {FTS_TABLE}.rowid, -rank, snippet({FTS_TABLE}, -1, %s, %s, %s, %s) "
+        f"FROM {FTS_TABLE}{join} WHERE {FTS_TABLE} MATCH %s{filters} "
+        f"ORDER BY {order} LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END, "…", snippet_words, fts5_query(terms), *values, limit, offset])
+        return cursor.fetchall()
+
+
+def _tsvector_matches(terms, params, sort, limit, offset, snippet_words):
+    filters, values = _filters(params, "s")
+    order = "score DESC, survey_id DESC" if sort == "rank" else "survey_id DESC"
+    options = (f"StartSel={MARK_START}, StopSel={MARK_END}, "
+               f"MaxWords={snippet_words}, MinWords={max(snippet_words // 2, 1)}")
+    # Headlines are the costly part, so only the rows of the page get one
+    sql = (
+        "SELECT page.survey_id, page.score, "
+        "ts_headline(%s, page.survey_text || ' ' || page.document_text, page.query, %s) "
+        "FROM (SELECT e.survey_id, e.survey_text, e.document_text, q.query, "
+        "ts_rank_cd(e.search_vector, q.query) AS score "
+        "FROM api_searchentry e JOIN api_survey s ON s.id = e.survey_id, "
+        "to_tsquery(%s, %s) AS q(query) "
+        f"WHERE e.search_vector @@ q.query{filters} "
+        f"ORDER BY {order} LIMIT %s OFFSET %s) AS page "
+        f"ORDER BY {order}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [TEXT_SEARCH_CONFIG, options, TEXT_SEARCH_CONFIG, tsquery(terms),
+                             *values, limit, offset])
+        return cursor.fetchall()
+
+
+def _like_snippet(text, words, snippet_words):
+    tokens = text.split()
+    lowered = [token.lower() for token in tokens]
+    first = next((i for i, token in enumerate(lowered) if any(word in token for word in words)), 0)
+    start = max(first - snippet_words // 2, 0)
+    shown = [
+        f"{MARK_START}{token}{MARK_END}" if any(word in token.lower() for word in words) else token
+        for token in tokens[start:start + snippet_words]
+    ]
+    return ("…" if start else "") + " ".join(shown) + ("…" if start + snippet_words < len(tokens) else "")
+
+
+def _like_matches(terms, params, sort, limit, offset, snippet_words):
+    # Unranked: newest first whatever the sort
+    entries = SearchEntry.objects.all()
+    for field in ("industry", "target_audience"):
+        if params.get(field):
+            entries = entries.filter(**{f"survey__{field}": params[field]})
+    words = [word.lower() for term_words, _ in terms for word in term_words]
+    for words_of_term, _ in terms:
+        phrase = " ".join(words_of_term)
+        entries = entries.filter(Q(survey_text__icontains=phrase) | Q(document_text__icontains=phrase))
+    rows = entries.order_by('-survey_id').values_list('survey_id', 'survey_text', 'document_text')
+    return [
+        (survey_id, 0.0, _like_snippet(f"{answers} {document}", words, snippet_words))
+        for survey_id, answers, document in rows[offset:offset + limit]
+    ]
+
+
+MATCHERS = {"fts5": _fts5_matches, "tsvector": _tsvector_matches, "like": _like_matches}
+
+
+def search_surveys(params, backend=None):
+    """Return (results, page, next_page) for the search described by params: q, sort,
+    page, page_size and the industry / target_audience filters."""
+    config = search_config()
+    query = (params.get("q") or "").strip()
+    if not query:
+        raise InvalidSearchRequest("q is required")
+    terms = parse_query(query, config['MAX_TERMS'])
+    if not terms:
+        raise InvalidSearchRequest("q has no words to search for")
+    sort = params.get("sort") or "rank"
+    if sort not in SORTS:
+        raise InvalidSearchRequest(f"Invalid sort: must be one of {', '.join(SORTS)}")
+    page = _int_param(params, "page", 1)
+    if page > config['MAX_PAGE']:
+        raise InvalidSearchRequest(f"page must be at most {config['MAX_PAGE']}; refine the query instead")
+    page_size = min(_int_param(params, "page_size", config['PAGE_SIZE']), config['MAX_PAGE_SIZE'])
+
+    matcher = MATCHERS[backend or search_backend()]
+    with stage("search_query"):
+        # One extra row tells whether there is a next page
+        matches = matcher(terms, params, sort, page_size + 1, (page - 1) * page_size, config['SNIPPET_WORDS'])
+    next_page = page + 1 if len(matches) > page_size and page < config['MAX_PAGE'] else None
+    matches = matches[:page_size]
+
+    with stage("search_fetch"):
+        surveys = {
+            row['id']: row for row in Survey.objects.filter(id__in=[survey_id for survey_id, _, _ in matches])
+            .annotate(has_document=Exists(GeneratedDocument.objects.filter(survey=OuterRef('pk'))))
+            .values(*RESULT_FIELDS, 'has_document')
+        }
+    results = []
+    for survey_id, score, snippet in matches:
+        survey = surveys.get(survey_id)
+        if survey is None:
+            continue  # deleted since it was matched
+        results.append({
+            "survey_id": survey_id,
+            "industry": survey['industry'],
+            "target_audience": survey['target_audience'],
+            "technology": survey['technology'],
+            "created_at": survey['created_at'].isoformat(),
+            "has_document": survey['has_document'],
+            "score": round(float(score), 4),
+            "snippet": highlight(snippet or ""),
+        })
+    return results, page, next_page
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import settings_section
+from .documents import split_sections
+from .generation import GENERATION_CONFIG, OUTLINE, outline_text, specifications_text
+from .routing import route_survey
+
+logger = logging.getLogger(__name__)
+
+# Sectioned mode: instead of asking for all 18 sections in one completion, the outline is
+# split into small groups that are generated concurrently. The answers are checked
+# section by section, only the sections that failed are asked for again, and the document
+# is assembled in outline order. Wall-clock time is roughly that of the slowest group.
+# Groups only hold sections of one routing tier (api.routing) and are sent to its model.
+
+DEFAULT_SECTIONED_GENERATION = {
+    'GROUP_SIZE': 3,
+    'MAX_WORKERS': 6,
+    'RETRIES': 1,
+    'MIN_SECTION_CHARS': 80,
+}
+
+SECTION_NUMBER = re.compile(r"^\d+[.)]\s*")
+HEADING_PUNCTUATION = re.compile(r"[^\w\s]+|_")
+
+
+sectioned_config = settings_section('SECTIONED_GENERATION', DEFAULT_SECTIONED_GENERATION)
+
+
+def build_section_prompt(survey_data, sections):
+    titles = ", ".join(f'"## {section["title"]}"' for section in sections)
+    return f"""You are writing part of a comprehensive project documentation for a {survey_data.get('industry')} project. Write ONLY the following sections of its outline:
+
+{outline_text(sections)}
+
+Important:
+- Each section MUST begin with its corresponding heading ({titles})
+- Do not write any other sections, introductions or closing remarks
+- Ensure comprehensive coverage of each topic
+- Keep the specified line counts where indicated
+
+{specifications_text(survey_data)}"""
+
+
+def _heading_key(heading):
+    # "**2. Model Description:**" and "Model description" share the key "model description"
+    heading = SECTION_NUMBER.sub("", heading.replace("*", "").strip()).replace("&", " and ")
+    return " ".join(HEADING_PUNCTUATION.sub(" ", heading).casefold().split())
+
+
+def match_title(heading, titles):
+    """The title of titles ({_heading_key(title): title}) that heading is: the same up to
+    numbering, case, punctuation and emphasis, or the title followed by more words
+    ("Model Description and Design"). None when it is none of them."""
+    key = _heading_key(heading)
+    title = titles.get(key)
+    if title is None:
+        # Longest first, so a title that starts another one cannot take its headings
+        for title_key in sorted(titles, key=len, reverse=True):
+            if key.startswith(title_key + " "):
+                return titles[title_key]
+    return title
+
+
+def extract_sections(text, sections, min_chars):
+    """Return {title: section text} for the requested sections that text contains in full."""
+    wanted = {_heading_key(section["title"]): section["title"] for section in sections}
+    found = {}
+    for heading, section_text in split_sections(text):
+        title = match_title(heading, wanted)
+        if title is None or title in found:
+            continue
+        body = section_text.split("\n", 1)[1] if "\n" in section_text else ""
+        if len(body.strip()) >= min_chars:
+            # Normalise the heading so the assembled document is consistent
+            found[title] = f"## {title}\n{body.strip()}\n\n"
+    return found
+
+
+def assemble(found):
+    missing = [section["title"] for section in OUTLINE if section["title"] not in found]
+    if missing:
+        logger.warning("Sections still missing after regeneration: %s", missing)
+    return "".join(found[section["title"]] for section in OUTLINE if section["title"] in found).rstrip() + "\n"
+
+
+def _in_context(function):
+    # Pool threads start with empty context variables; run function in a copy of the
+    # caller's, so its calls keep the request id in their logs and the scheduler priority
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(function, *args)
+
+
+def _generate_group(model, survey_data, sections, min_chars, generation_config=GENERATION_CONFIG):
+    try:
+        response = model.generate_content(
+            contents=build_section_prompt(survey_data, sections),
+            generation_config=generation_config
+        )
+        return extract_sections(response.text, sections, min_chars)
+    except Exception as e:
+        logger.error("Section generation failed for %s: %s", [s['title'] for s in sections], e)
+        return {}
+
+
+def generate_sectioned_document(model, survey_data, plan=None):
+    """Generate the document as concurrent per-group calls on a bounded thread pool.
+
+    plan is the request's api.routing.RoutePlan; without one the survey is routed here.
+    """
+    config = sectioned_config()
+    plan = plan or route_survey(survey_data, model)
+    found = {}
+    with ThreadPoolExecutor(max_workers=config['MAX_WORKERS']) as pool:
+        pending = plan.groups(config['GROUP_SIZE'])
+        for attempt in range(config['RETRIES'] + 1):
+            results = pool.map(
+                _in_context(lambda tier_group: _generate_group(
+                    tier_group[0].model(), survey_data, tier_group[1], config['MIN_SECTION_CHARS'],
+                    tier_group[0].generation_config,
+                )),
+                pending,
+            )
+            for result in results:
+                found.update(result)
+            # Retry the failed sections one per call, keeping each regeneration small
+            pending = [(plan.tier_for(section["title"]), [section]) for section in OUTLINE
+                       if section["title"] not in found]
+            if not pending:
+                break
+            if attempt < config['RETRIES']:
+                logger.warning("Regenerating %s sections that failed validation", len(pending))
+    if not found:
+        raise ValueError("No sections could be generated")
+    return assemble(found)
+
+
+async def _agenerate_group(model, survey_data, sections, min_chars, semaphore, generation_config=GENERATION_CONFIG):
+    async with semaphore:
+        try:
+            response = await model.generate_content_async(
+                build_section_prompt(survey_data, sections),
+                generation_config=generation_config
+            )
+            return extract_sections(response.text, sections, min_chars)
+        except Exception as e:
+            logger.error("Section generation failed for %s: %s", [s['title'] for s in sections], e)
+            return {}
+
+
+async def agenerate_sectioned_document(model, survey_data, plan=None):
+    """Async counterpart of generate_sectioned_document using asyncio.gather."""
+    config = sectioned_config()
+    plan = plan or route_survey(survey_data, model)
+    semaphore = asyncio.Semaphore(config['MAX_WORKERS'])
+    found = {}
+    pending = plan.groups(config['GROUP_SIZE'])
+    for attempt in range(config['RETRIES'] + 1):
+        results = await asyncio.gather(*(
+            _agenerate_group(tier.model(), survey_data, group, config['MIN_SECTION_CHARS'], semaphore,
+                             tier.generation_config)
+            for tier, group in pending
+        ))
+        for result in results:
+            found.update(result)
+        pending = [(plan.tier_for(section["title"]), [section]) for section in OUTLINE
+                   if section["title"] not in found]
+        if not pending:
+            break
+        if attempt < config['RETRIES']:
+            logger.warning("Regenerating %s sections that failed validation", len(pending))
+    if not found:
+        raise ValueError("No sections could be generated")
+    return assemble(found)
@@ -0,0 +1,392 @@
+import logging
+import math
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .config import lazy_singleton, options_from, settings_section
+from .models import GeneratedDocument, Survey
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate lookup over past surveys. Every survey is reduced to a set of
+# "field=value" tokens (plus the words of multi-word values, so "Other: Healthcare
+# services" still meets "Healthcare"), weighted by inverse document frequency and
+# compared by cosine similarity. The index is an inverted one held in NumPy arrays: a
+# query only touches the postings of its own tokens. Surveys saved since the last build
+# go to a small delta that is scored in one vectorised pass and merged into the main
+# postings once REBUILD_AFTER of them have piled up. New surveys are pulled from the
+# database by id at most every REFRESH_INTERVAL seconds, so every worker process sees
+# surveys saved by the others. Reads and builds run outside the index lock, which is only
+# held to append rows and swap in new postings, so searches never wait on the database.
+# The first load of the stored surveys runs in a background thread, started when a
+# serving process is ready; until it is done, document reuse is skipped and the similar
+# survey endpoints wait for it.
+# A deleted survey is dropped from the results of the process that deleted it; the others
+# skip it when they look its row up.
+
+DEFAULT_SIMILARITY = {
+    'ENABLED': True,
+    'REUSE_THRESHOLD': None,  # cosine similarity from which process_survey reuses a document; None disables
+    'REFRESH_INTERVAL': 5,  # seconds between pulls of new surveys from the database; None never pulls
+    'REBUILD_AFTER': 1000,  # delta surveys merged into the main postings at once
+    'MAX_RESULTS': 50,
+}
+
+SIMILARITY_FIELDS = [
+    "industry", "target_audience", "technology", "sub_technology", "platform",
+    "web_frontend", "web_backend", "web_hosting", "web_database", "security_features",
+]
+
+# Best matches looked at when picking a document to reuse; not all of them have one yet
+REUSE_CANDIDATES = 5
+REFRESH_BATCH_SIZE = 2000
+
+
+similarity_config = settings_section('SIMILARITY', DEFAULT_SIMILARITY)
+
+
+def _normalize(value):
+    return " ".join(str(value).split()).casefold() if value is not None else ""
+
+
+def survey_tokens(survey_data):
+    """The set of tokens describing survey_data (Survey field names as keys)."""
+    industry = survey_data.get("industry")
+    if _normalize(industry) == "other" and survey_data.get("industry_other"):
+        industry = survey_data["industry_other"]
+
+    tokens = set()
+    for field in SIMILARITY_FIELDS:
+        value = industry if field == "industry" else survey_data.get(field)
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            item = _normalize(item)
+            if not item:
+                continue
+            tokens.add(f"{field}={item}")
+            words = item.replace("/", " ").split()
+            if len(words) > 1:
+                tokens.update(f"{field}:{word}" for word in words)
+    return tokens
+
+
+class SimilarityIndex:
+    """TF-IDF cosine similarity over survey token sets."""
+
+    def __init__(self, enabled=True, reuse_threshold=None, refresh_interval=5, rebuild_after=1000,
+                 max_results=50):
+        self.enabled = enabled
+        self.reuse_threshold = reuse_threshold
+        self.refresh_interval = refresh_interval
+        self.rebuild_after = rebuild_after
+        self.max_results = max_results
+        self.searches = 0
+        self.reuses = 0
+        self.builds = 0
+        self.build_seconds = 0.0
+        self._vocabulary = {}
+        self._document_frequency = array("i")
+        self._survey_ids = []
+        self._rows_by_survey = {}
+        # (row, token) pairs of every indexed survey, in row order
+        self._entry_rows = array("i")
+        self._entry_tokens = array("i")
+        # Main postings: built over the first _built_rows surveys
+        self._built_rows = 0
+        self._built_entries = 0
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._posting_rows = np.zeros(0, dtype=np.int32)
+        self._posting_weights = np.zeros(0, dtype=np.float32)
+        # Rows of surveys deleted since they were indexed, scored 0
+        self._deleted_rows = set()
+        self._last_survey_id = 0
+        self._refreshed_at = None
+        self._lock = threading.RLock()
+        # Held by the thread refreshing or building, so others go on with the index as it is
+        self._refresh_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # Set once the stored surveys are indexed; an index that never pulls starts empty
+        self._loaded = threading.Event()
+        if refresh_interval is None:
+            self._loaded.set()
+        self._loader = None
+        self._loader_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows_by_survey)
+
+    def add(self, survey_id, survey_data):
+        """Index one survey; a survey already in the index is left as it is."""
+        self._add_tokens([(survey_id, survey_tokens(survey_data))])
+
+    def _add_tokens(self, surveys):
+        with self._lock:
+            for survey_id, tokens in surveys:
+                self._append(survey_id, tokens)
+
+    def _append(self, survey_id, tokens):
+        # Called with the lock held
+        if survey_id in self._rows_by_survey:
+            return
+        row = len(self._survey_ids)
+        self._survey_ids.append(survey_id)
+        self._rows_by_survey[survey_id] = row
+        for token in tokens:
+            column = self._vocabulary.get(token)
+            if column is None:
+                column = self._vocabulary[token] = len(self._vocabulary)
+                self._document_frequency.append(0)
+            self._document_frequency[column] += 1
+            self._entry_rows.append(row)
+            self._entry_tokens.append(column)
+        self._last_survey_id = max(self._last_survey_id, survey_id)
+
+    def remove(self, survey_id):
+        """Leave a deleted survey out of the results from now on."""
+        with self._lock:
+            row = self._rows_by_survey.pop(survey_id, None)
+            if row is not None:
+                self._deleted_rows.add(row)
+
+    def _idf(self, frequency=None, count=None):
+        frequency = np.frombuffer(self._document_frequency, dtype=np.int32) if frequency is None else frequency
+        count = len(self._survey_ids) if count is None else count
+        return (np.log((1 + count) / (1 + frequency)) + 1).astype(np.float32)
+
+    @staticmethod
+    def _row_weights(rows, columns, idf, row_count):
+        """L2-normalised idf weights of (row, column) entries; rows count from 0."""
+        weights = idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=row_count))
+        return (weights / norms[rows]).astype(np.float32)
+
+    def build(self):
+        """Rebuild the main postings over every indexed survey, emptying the delta.
+
+        The postings are computed from a snapshot of the rows and swapped in, so searches
+        go on meanwhile; rows added during the build stay in the delta.
+        """
+        with self._build_lock:
+            started = time.perf_counter()
+            with self._lock:
+                row_count = len(self._survey_ids)
+                entry_count = len(self._entry_rows)
+                rows = np.frombuffer(self._entry_rows, dtype=np.int32)[:entry_count].copy()
+                columns = np.frombuffer(self._entry_tokens, dtype=np.int32)[:entry_count].copy()
+                frequency = np.frombuffer(self._document_frequency, dtype=np.int32).copy()
+            weights = self._row_weights(rows, columns, self._idf(frequency, row_count), row_count)
+            order = np.argsort(columns, kind="stable")
+            counts = np.bincount(columns, minlength=len(frequency))
+            indptr = np.concatenate(([0], np.cumsum(counts)))
+            with self._lock:
+                self._indptr = indptr
+                self._posting_rows = rows[order]
+                self._posting_weights = weights[order]
+                self._built_rows = row_count
+                self._built_entries = entry_count
+                self.builds += 1
+                self.build_seconds += time.perf_counter() - started
+
+    def refresh(self):
+        """Index the surveys saved since the newest one in the index."""
+        surveys = (
+            Survey.objects.filter(id__gt=self._last_survey_id)
+            .order_by("id")
+            .values("id", "industry_other", *SIMILARITY_FIELDS)
+        )
+        added = 0
+        batch = []
+        # The rows are read and tokenised without the lock, which is taken once per batch
+        for survey in surveys.iterator(chunk_size=REFRESH_BATCH_SIZE):
+            batch.append((survey["id"], survey_tokens(survey)))
+            if len(batch) >= REFRESH_BATCH_SIZE:
+                self._add_tokens(batch)
+                added += len(batch)
+                batch = []
+        if batch:
+            self._add_tokens(batch)
+            added += len(batch)
+        self._refreshed_at = time.monotonic()
+        if added:
+            logger.info("Similarity index refreshed with %s surveys (%s total)", added, len(self))
+
+    def load(self):
+        """Index every stored survey and build the postings over them."""
+        started = time.perf_counter()
+        with self._refresh_lock:
+            self.refresh()
+        self.build()
+        self._loaded.set()
+        logger.info("Similarity index loaded %s surveys in %.1fs", len(self), time.perf_counter() - started)
+
+    def start_loading(self):
+        """Load the index in a background thread, unless it is loaded or loading; returns
+        the thread, or None once loaded."""
+        with self._loader_lock:
+            if self._loaded.is_set():
+                return None
+            if self._loader is None or not self._loader.is_alive():
+                self._loader = threading.Thread(target=self._load, name="similarity-index-load", daemon=True)
+                self._loader.start()
+            return self._loader
+
+    def _load(self):
+        try:
+            self.load()
+        except Exception as e:
+            # Retried by the next search
+            logger.error("Failed to load the similarity index: %s", e)
+        finally:
+            connection.close()
+
+    def _maybe_refresh(self):
+        if self.refresh_interval is None:
+            return
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            # One thread refreshes; the others search the index as it is
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                        self.refresh()
+                finally:
+                    self._refresh_lock.release()
+
+    def search(self, survey_data, k=10, exclude=None, wait=True):
+        """Return [(survey_id, score)] for the k surveys most similar to survey_data.
+
+        exclude is a survey id left out of the results (the query survey itself). Before
+        the stored surveys are loaded this waits for them, or with wait=False returns [].
+        """
+        if not self._loaded.is_set():
+            loader = self.start_loading()
+            if loader is not None and wait:
+                loader.join()
+            if not self._loaded.is_set():
+                return []
+        self._maybe_refresh()
+        if len(self._survey_ids) - self._built_rows >= self.rebuild_after and not self._build_lock.locked():
+            self.build()
+        tokens = survey_tokens(survey_data)
+        with self._lock:
+            self.searches += 1
+            count = len(self._survey_ids)
+            if not tokens or not count:
+                return []
+            idf = self._idf()
+            columns = np.array([self._vocabulary[t] for t in tokens if t in self._vocabulary], dtype=np.int32)
+            if not len(columns):
+                return []
+            # Tokens no survey has still count towards the query's norm, at the highest idf
+            unseen = len(tokens) - len(columns)
+            highest = math.log(1 + count) + 1
+            query = np.zeros(len(self._vocabulary), dtype=np.float32)
+            query[columns] = idf[columns]
+            query /= math.sqrt(float(np.dot(query, query)) + unseen * highest * highest)
+
+            scores = np.zeros(count, dtype=np.float32)
+            for column in columns[columns < len(self._indptr) - 1]:
+                start, end = self._indptr[column], self._indptr[column + 1]
+                scores[self._posting_rows[start:end]] += query[column] * self._posting_weights[start:end]
+            if count > self._built_rows:
+                delta_rows = np.frombuffer(self._entry_rows, dtype=np.int32)[self._built_entries:] - self._built_rows
+                delta_columns = np.frombuffer(self._entry_tokens, dtype=np.int32)[self._built_entries:]
+                weights = self._row_weights(delta_rows, delta_columns, idf, count - self._built_rows)
+                scores[self._built_rows:] += np.bincount(
+                    delta_rows, weights=weights * query[delta_columns], minlength=count - self._built_rows
+                ).astype(np.float32)
+
+            if exclude in self._rows_by_survey:
+                scores[self._rows_by_survey[exclude]] = 0
+            if self._deleted_rows:
+                scores[list(self._deleted_rows)] = 0
+            k = min(k, count)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [(self._survey_ids[row], float(scores[row])) for row in best if scores[row] > 0]
+
+    def find_reusable(self, survey_data, exclude=None):
+        """Return (document, survey_id, score) of the most similar prior GeneratedDocument
+        scoring at least reuse_threshold, or None. Its sections are prefetched."""
+        if not self.enabled or self.reuse_threshold is None:
+            return None
+        # Not worth holding up the request for: reuse starts once the index is loaded
+        matches = [
+            (survey_id, score)
+            for survey_id, score in self.search(survey_data, REUSE_CANDIDATES, exclude, wait=False)
+            if score >= self.reuse_threshold
+        ]
+        if not matches:
+            return None
+        documents = {
+            document.survey_id: document
+            for document in GeneratedDocument.objects.filter(
+                survey_id__in=[survey_id for survey_id, _ in matches]
+            ).prefetch_related("sections")
+        }
+        for survey_id, score in matches:
+            if survey_id in documents:
+                with self._lock:
+                    self.reuses += 1
+                return documents[survey_id], survey_id, score
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "loaded": self._loaded.is_set(),
+                "surveys": len(self._rows_by_survey),
+                "tokens": len(self._vocabulary),
+                "delta": len(self._survey_ids) - self._built_rows,
+                "builds": self.builds,
+                "build_seconds": round(self.build_seconds, 3),
+                "searches": self.searches,
+                "reuses": self.reuses,
+                "reuse_threshold": self.reuse_threshold,
+            }
+
+
+def similar_surveys(index, survey_data, k, exclude=None):
+    """search() results with the matching surveys' summary fields, best first."""
+    matches = index.search(survey_data, k, exclude)
+    surveys = Survey.objects.filter(id__in=[survey_id for survey_id, _ in matches]).annotate(
+        has_document=Exists(GeneratedDocument.objects.filter(survey=OuterRef("pk")))
+    ).in_bulk()
+    return [
+        {
+            "survey_id": survey_id,
+            "score": round(score, 4),
+            "industry": surveys[survey_id].industry,
+            "target_audience": surveys[survey_id].target_audience,
+            "technology": surveys[survey_id].technology,
+            "created_at": surveys[survey_id].created_at.isoformat(),
+            "has_document": surveys[survey_id].has_document,
+        }
+        # Surveys deleted since they were indexed drop out here
+        for survey_id, score in matches if survey_id in surveys
+    ]
+
+
+@receiver(post_delete, sender=Survey, dispatch_uid="api.similarity.unindex_survey")
+def unindex_survey(sender, instance, **kwargs):
+    # Only an index this process has built has anything to drop
+    if get_similarity_index.instance is not None:
+        get_similarity_index.instance.remove(instance.id)
+
+
+@lazy_singleton
+def get_similarity_index():
+    """Return the process-wide SimilarityIndex built from settings.SIMILARITY."""
+    return SimilarityIndex(**options_from(similarity_config()))
+
+
+def start_loading_similarity_index():
+    """Start loading the process-wide index in the background if SIMILARITY['ENABLED']."""
+    if similarity_config()['ENABLED']:
+        get_similarity_index().start_loading()
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from .config import lazy_singleton, options_from, settings_section
+from .metrics import counter
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Single-flight coalescing for document generation. While a generation for a key is in
+# flight, identical requests in the same process wait for it and share its result instead
+# of starting their own. With LOCK_PATH set, the leader also holds an exclusive file lock
+# for the key, so leaders in other worker processes queue behind it and then find the
+# result in the (shared) document cache through the recheck callable.
+
+DEFAULT_SINGLE_FLIGHT = {
+    'ENABLED': True,
+    'LOCK_PATH': None,  # directory for per-key lock files; None coalesces within a process only
+    'LOCK_TIMEOUT': 300,  # seconds to wait for another process's lock
+    'WAIT_TIMEOUT': 300,  # seconds a follower waits for the leader
+}
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+single_flight_config = settings_section('SINGLE_FLIGHT', DEFAULT_SINGLE_FLIGHT)
+
+
+class FileLock:
+    """Exclusive flock on path, polled until timeout seconds have passed."""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    def __enter__(self):
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(LOCK_POLL_INTERVAL)
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome with concurrent callers."""
+
+    def __init__(self, enabled=True, lock_path=None, lock_timeout=300, wait_timeout=300):
+        self.enabled = enabled
+        self.lock_path = Path(lock_path) if lock_path else None
+        if self.lock_path and fcntl is None:
+            logger.warning("File locks are not supported on this platform, coalescing within the process only")
+            self.lock_path = None
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.leaders = 0
+        self.coalesced = 0
+        self.cross_process = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, recheck=None):
+        """Return (result, shared): func()'s result, computed here or by a concurrent caller.
+
+        recheck is called by the leader once it holds the cross-process lock and should
+        return the result if another process produced it meanwhile, or None.
+        """
+        if not self.enabled:
+            return func(), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return self._wait(key, call), True
+
+        try:
+            call.result, shared = self._lead(key, func, recheck)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _wait(self, key, call):
+        if not call.done.wait(self.wait_timeout):
+            raise TimeoutError(f"Timed out waiting for the in-flight generation {key[:12]}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _lead(self, key, func, recheck):
+        if self.lock_path is None:
+            return func(), False
+        self.lock_path.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.lock_path / f"{key}.lock", self.lock_timeout):
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    with self._lock:
+                        self.cross_process += 1
+                    return result, True
+            return func(), False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "cross_process": self.cross_process,
+                "in_flight": len(self._calls),
+                "cross_process_locking": self.lock_path is not None,
+            }
+
+
+def _flight_stats():
+    stats = get_single_flight().stats()
+    return {("leader",): stats["leaders"], ("coalesced",): stats["coalesced"],
+            ("cross_process",): stats["cross_process"]}
+
+
+SINGLE_FLIGHT_REQUESTS = counter(
+    "single_flight_requests_total",
+    "Generations run (leader) or shared with an in-flight identical one (coalesced, cross_process).",
+    ["role"], collect=_flight_stats,
+)
+
+
+@lazy_singleton
+def get_single_flight():
+    """Return the process-wide SingleFlight built from settings.SINGLE_FLIGHT."""
+    return SingleFlight(**options_from(single_flight_config()))
@@ -0,0 +1,150 @@
+import json
+import logging
+import re
+
+from asgiref.sync import sync_to_async
+
+from .documents import split_sections
+from .repair import repair_sections
+
+logger = logging.getLogger(__name__)
+
+SECTION_HEADING = re.compile(r"^##\s+(.+?)\s*#*\s*$")
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class SectionTracker:
+    """Detects "## " section headings in text that arrives in arbitrary chunks.
+
+    Headings are only reported once their line is complete, so a heading split across
+    two chunks is still seen exactly once.
+    """
+
+    def __init__(self):
+        self.sections = []
+        self._partial_line = ""
+
+    def feed(self, text):
+        """Consume a chunk and return the headings completed by it."""
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        return [self._add(line) for line in lines if SECTION_HEADING.match(line)]
+
+    def close(self):
+        """Flush the trailing line once the stream has ended."""
+        line, self._partial_line = self._partial_line, ""
+        return [self._add(line)] if SECTION_HEADING.match(line) else []
+
+    def _add(self, line):
+        title = SECTION_HEADING.match(line).group(1)
+        self.sections.append(title)
+        return {"index": len(self.sections) - 1, "title": title}
+
+
+def stream_document(model, prompt, generation_config, survey_data=None, plan=None):
+    """Generate a document with model and yield (event, data) pairs as the text arrives.
+
+    Emits "chunk" for every piece of text, "section" whenever a section heading has been
+    seen, and a final "done" (or "error"). With survey_data, sections that came out missing
+    or cut off are then regenerated (api.repair) and the whole repaired text is sent in one
+    "repair" event, which replaces the streamed text; plan is the RoutePlan they are
+    regenerated with. The complete text is returned as the generator's value.
+    """
+    tracker = SectionTracker()
+    parts = []
+
+    try:
+        response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+        for chunk in response:
+            text = chunk.text
+            if not text:
+                continue
+            parts.append(text)
+            yield "chunk", {"text": text}
+            for section in tracker.feed(text):
+                yield "section", section
+        for section in tracker.close():
+            yield "section", section
+    except Exception as generate_error:
+        logger.error("Streaming content generation failed: %s", generate_error)
+        yield "error", {"error": f"Content generation failed: {str(generate_error)}"}
+        return None
+
+    content = "".join(parts)
+    sections = tracker.sections
+    if survey_data is not None:
+        repaired = repair_sections(model, survey_data, content, response, plan)
+        if repaired != content:
+            content = repaired
+            sections = [heading for heading, _ in split_sections(content) if heading]
+            yield "repair", {"text": content, "sections": sections}
+    yield "done", {"sections": sections, "length": len(content)}
+    return content
+
+
+async def astream_document(model, prompt, generation_config, survey_data=None, plan=None, result=None):
+    """Async counterpart of stream_document, for ASGI servers, which only send a response
+    body as it is produced when it comes from an async iterator.
+
+    An async generator cannot return a value, so the complete text is stored in
+    result["content"] when result is given.
+    """
+    tracker = SectionTracker()
+    parts = []
+
+    try:
+        response = await model.generate_content_async(prompt, generation_config=generation_config, stream=True)
+        async for chunk in response:
+            text = chunk.text
+            if not text:
+                continue
+            parts.append(text)
+            yield "chunk", {"text": text}
+            for section in tracker.feed(text):
+                yield "section", section
+        for section in tracker.close():
+            yield "section", section
+    except Exception as generate_error:
+        logger.error("Streaming content generation failed: %s", generate_error)
+        yield "error", {"error": f"Content generation failed: {str(generate_error)}"}
+        return
+
+    content = "".join(parts)
+    sections = tracker.sections
+    if survey_data is not None:
+        # Repair calls the model synchronously, so it runs on a worker thread
+        repaired = await sync_to_async(repair_sections, thread_sensitive=False)(model, survey_data, content, response, plan)
+        if repaired != content:
+            content = repaired
+            sections = [heading for heading, _ in split_sections(content) if heading]
+            yield "repair", {"text": content, "sections": sections}
+    yield "done", {"sections": sections, "length": len(content)}
+    if result is not None:
+        result["content"] = content
+
+
+def replay_document(content):
+    """Yield the same events as stream_document for an already generated document."""
+    tracker = SectionTracker()
+    for line in content.splitlines(keepends=True):
+        yield "chunk", {"text": line}
+        for section in tracker.feed(line):
+            yield "section", section
+    for section in tracker.close():
+        yield "section", section
+    yield "done", {"sections": tracker.sections, "length": len(content)}
+    return content
+
+
+def encode_events(stream):
+    """Encode (event, data) pairs as SSE messages, passing on the stream's return value."""
+    while True:
+        try:
+            event, data = next(stream)
+        except StopIteration as stop:
+            return stop.value
+        yield sse_event(event, data)
@@ -0,0 +1,64 @@
+import tempfile
+import time
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from .activity import SNAPSHOT_KEY, ActivityFeed, get_activity_feed
+from .models import Survey
+
+
+def create_survey(industry="Retail"):
+    return Survey.objects.create(industry=industry, target_audience="Students")
+
+
+class ActivitySnapshotTests(TestCase):
+    def setUp(self):
+        caches["default"].delete(SNAPSHOT_KEY)
+
+    def tearDown(self):
+        caches["default"].delete(SNAPSHOT_KEY)
+
+    def test_saved_surveys_are_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            survey = create_survey()
+        self.assertEqual(get_activity_feed().latest()["survey_id"], survey.id)
+
+    def test_a_per_process_cache_expires_the_snapshot(self):
+        feed = ActivityFeed(poll_interval=0.05)
+        self.assertEqual(feed.snapshot_ttl, 0.05)
+        first = create_survey()
+        self.assertEqual(feed.latest()["survey_id"], first.id)
+        # Saved by another worker: no publish reaches this process's cache
+        second, = Survey.objects.bulk_create([Survey(industry="Finance", target_audience="Students")])
+        time.sleep(0.1)
+        self.assertEqual(feed.latest()["survey_id"], second.id)
+
+    def test_a_shared_cache_keeps_the_snapshot(self):
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tempfile.gettempdir()}
+        with override_settings(CACHES={"default": shared}):
+            self.assertIsNone(ActivityFeed().snapshot_ttl)
+            self.assertEqual(ActivityFeed(ttl=60).snapshot_ttl, 60)
+
+    def test_deleting_the_newest_survey_drops_it_from_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            older, newer = create_survey(), create_survey("Finance")
+        feed = get_activity_feed()
+        self.assertEqual(feed.latest()["survey_id"], newer.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            newer.delete()
+        self.assertEqual(feed.latest()["survey_id"], older.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        self.assertEqual(feed.latest(), {})
+
+    def test_deleting_an_older_survey_keeps_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            older, newer = create_survey(), create_survey("Finance")
+        feed = get_activity_feed()
+        feed.latest()
+        reads = feed.stats()["database_reads"]
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        self.assertEqual(feed.latest()["survey_id"], newer.id)
+        self.assertEqual(feed.stats()["database_reads"], reads)
@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase
+
+from .cache import LRUCacheBackend, make_cache_key
+
+
+class CacheKeyTests(SimpleTestCase):
+    survey = {
+        "industry": "Healthcare",
+        "technology": ["Web", "Mobile"],
+        "web_frontend": ["React"],
+        "web_backend": ["Django"],
+        "web_database": ["PostgreSQL"],
+    }
+
+    def test_order_duplicates_case_and_whitespace_do_not_change_the_key(self):
+        variant = {
+            "industry": "  healthcare ",
+            "technology": ["mobile", "Web", "Mobile", ""],
+            "web_frontend": ["REACT"],
+            "web_backend": ("Django",),
+            "web_database": ["postgresql", None],
+        }
+        self.assertEqual(make_cache_key(self.survey), make_cache_key(variant))
+
+    def test_fields_outside_the_prompt_do_not_change_the_key(self):
+        self.assertEqual(make_cache_key(self.survey),
+                         make_cache_key({**self.survey, "target_audience": "Students", "platform": "iOS"}))
+
+    def test_answers_model_and_generation_config_change_the_key(self):
+        key = make_cache_key(self.survey, "gemini-pro", {"temperature": 0.2})
+        self.assertNotEqual(key, make_cache_key({**self.survey, "industry": "Finance"}, "gemini-pro", {"temperature": 0.2}))
+        self.assertNotEqual(key, make_cache_key(self.survey, "gemini-flash", {"temperature": 0.2}))
+        self.assertNotEqual(key, make_cache_key(self.survey, "gemini-pro", {"temperature": 0.7}))
+
+    def test_missing_and_blank_answers_are_the_same(self):
+        self.assertEqual(make_cache_key({"industry": "Retail"}),
+                         make_cache_key({"industry": "Retail", "technology": None, "web_frontend": None}))
+        self.assertEqual(make_cache_key({"industry": "Retail", "technology": []}),
+                         make_cache_key({"industry": "Retail", "technology": [None, ""]}))
+
+
+class LRUCacheBackendTests(SimpleTestCase):
+    def test_max_bytes_counts_utf8_bytes(self):
+        cache = LRUCacheBackend(ttl=0, max_entries=10, max_bytes=100)
+        cache.set("ascii", "a" * 40)
+        # 40 characters, 120 bytes: over the budget on its own
+        cache.set("cjk", "文" * 40)
+        self.assertIsNone(cache.get("ascii"))
+        self.assertIsNone(cache.get("cjk"))
+        self.assertEqual(cache._size, 0)
+
+    def test_least_recently_used_entries_go_first(self):
+        cache = LRUCacheBackend(ttl=0, max_entries=10, max_bytes=100)
+        cache.set("first", "ж" * 20)
+        cache.set("second", "ж" * 20)
+        cache.get("first")
+        cache.set("third", "ж" * 20)
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual((cache.get("first"), len(cache), cache._size), ("ж" * 20, 2, 80))
+
+    def test_replacing_and_deleting_entries_keep_the_size(self):
+        cache = LRUCacheBackend(ttl=0, max_entries=10, max_bytes=1000)
+        cache.set("key", "é" * 10)
+        cache.set("key", "e" * 10)
+        self.assertEqual(cache._size, 10)
+        cache.delete("key")
+        self.assertEqual(cache._size, 0)
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .apps import serves_requests
+from .jobs import STALE_SWEEP_POLLS, JobQueue
+from .models import GenerationJob, Survey
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        self.queue = JobQueue(workers=2, max_attempts=2, backoff_seconds=5, backoff_max_seconds=300,
+                              poll_interval=0.01, stale_after_seconds=60, handler=self.handle)
+        self.survey = Survey.objects.create(industry="Retail", target_audience="Students")
+
+    def handle(self, job):
+        self.calls.append(job.id)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("model unavailable")
+        return "## Abstract\nDone.\n"
+
+    def test_a_job_is_claimed_once(self):
+        job = self.queue.submit(self.survey)
+        claimed = self.queue._claim()
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual((claimed.status, claimed.attempts), (GenerationJob.STATUS_RUNNING, 1))
+        self.assertIsNone(self.queue._claim())
+
+    def test_jobs_are_claimed_in_order(self):
+        first, second = self.queue.submit_many([self.survey, self.survey])
+        self.assertEqual([self.queue._claim().id, self.queue._claim().id], [first.id, second.id])
+
+    def test_success_stores_the_result(self):
+        job = self.queue.submit(self.survey)
+        self.queue._run(self.queue._claim())
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, "## Abstract\nDone.\n")
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failure_is_retried_after_a_backoff_then_given_up(self):
+        self.failures = 2
+        job = self.queue.submit(self.survey)
+        before = timezone.now()
+        self.queue._run(self.queue._claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (GenerationJob.STATUS_QUEUED, 1, "model unavailable"))
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=5))
+        # Not before its backoff is up
+        self.assertIsNone(self.queue._claim())
+
+        GenerationJob.objects.filter(id=job.id).update(available_at=timezone.now())
+        self.queue._run(self.queue._claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GenerationJob.STATUS_FAILED, 2))
+        self.assertEqual(self.calls, [job.id, job.id])
+        self.assertEqual((self.queue.retried, self.queue.failed), (1, 1))
+
+    def test_backoff_doubles_up_to_its_maximum(self):
+        self.assertEqual([self.queue.backoff(attempt) for attempt in (1, 2, 3, 8)], [5, 10, 20, 300])
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = self.queue.submit(self.survey)
+        self.queue._claim()
+        GenerationJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.queue._requeue_stale_jobs()
+        self.assertEqual(self.queue._claim().id, job.id)
+
+    def test_workers_keep_sweeping_for_stale_jobs(self):
+        first = self.queue.submit(self.survey)
+        self.queue._claim()
+        GenerationJob.objects.filter(id=first.id).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.queue._sweep_if_due()
+        self.assertEqual(self.queue._claim().id, first.id)
+
+        # Orphaned after the last sweep: picked up by the next one, not only on restart
+        second = self.queue.submit(self.survey)
+        self.queue._claim()
+        GenerationJob.objects.filter(id=second.id).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.queue._sweep_if_due()
+        self.assertIsNone(self.queue._claim())
+        time.sleep(self.queue.poll_interval * STALE_SWEEP_POLLS)
+        self.queue._sweep_if_due()
+        self.assertEqual(self.queue._claim().id, second.id)
+
+
+class InProcessWorkerTests(SimpleTestCase):
+    def test_only_serving_processes_start_workers(self):
+        cases = [
+            (["gunicorn", "newproject.wsgi:application"], {}, True),
+            (["/venv/lib/python3.11/site-packages/uvicorn/__main__.py", "newproject.asgi:application"], {}, True),
+            (["manage.py", "runserver"], {"RUN_MAIN": "true"}, True),
+            (["manage.py", "runserver", "--noreload"], {}, True),
+            # runserver's autoreloader parent only watches files
+            (["manage.py", "runserver"], {}, False),
+            (["manage.py", "migrate"], {}, False),
+            (["manage.py", "run_jobs"], {}, False),
+            (["/venv/lib/python3.11/site-packages/django/__main__.py", "test"], {}, False),
+        ]
+        for argv, environ, expected in cases:
+            environ = {"RUN_MAIN": "", **environ}
+            with self.subTest(argv=argv), mock.patch("sys.argv", argv), mock.patch.dict("os.environ", environ):
+                self.assertEqual(serves_requests(), expected)
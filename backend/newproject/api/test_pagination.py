@@ -0,0 +1,35 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Survey
+from .pagination import InvalidPageRequest, decode_cursor, encode_cursor
+
+
+class HistoryCursorTests(TestCase):
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_invalid_cursors_are_rejected(self):
+        for cursor in ["", "not base64!", encode_cursor(timezone.now(), 1)[:-4], "WyJub3QgYSBkYXRlIiwgMV0="]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidPageRequest):
+                decode_cursor(cursor)
+        response = self.client.get("/api/history/", {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_cover_every_survey_once_newest_first(self):
+        surveys = [Survey.objects.create(industry="Retail", target_audience="Students") for _ in range(7)]
+        # Ties on created_at are broken by id
+        same_time = timezone.now()
+        Survey.objects.filter(id__in=[survey.id for survey in surveys[2:5]]).update(created_at=same_time)
+        expected = list(Survey.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+        seen, cursor = [], None
+        while True:
+            params = {"page_size": 3, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/api/history/", params).json()
+            seen += [row["id"] for row in page["surveys"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from .repair import is_truncated, splice_sections
+
+
+def reply(finish_reason):
+    return SimpleNamespace(candidates=[SimpleNamespace(finish_reason=finish_reason)])
+
+class SectionRepairTests(SimpleTestCase):
+    def test_finish_reason_decides_when_there_is_one(self):
+        self.assertTrue(is_truncated("Ends in a full sentence.", reply("MAX_TOKENS")))
+        self.assertTrue(is_truncated("Ends in a full sentence.", reply(2)))
+        self.assertFalse(is_truncated("- https://example.com/reference", reply("STOP")))
+        self.assertFalse(is_truncated("ends mid", reply(SimpleNamespace(name="STOP"))))
+
+    def test_heuristic_without_a_finish_reason(self):
+        self.assertTrue(is_truncated("## Abstract\nThe system will"))
+        self.assertTrue(is_truncated("## Abstract\n```python\nprint(1)\n"))
+        self.assertFalse(is_truncated("## Abstract\nThe system works."))
+        self.assertFalse(is_truncated("## References\n- A list item without a full stop"))
+        self.assertFalse(is_truncated(""))
+
+    def test_splice_puts_replacements_at_their_outline_positions(self):
+        text = "## Abstract\nA.\n\n## Introduction\nI.\n\n## Project Overview\nCut o"
+        replacements = {
+            "Project Overview": "## Project Overview\nWhole.\n",
+            "Table of Contents": "## Table of Contents\n1. Abstract\n",
+        }
+        self.assertEqual(splice_sections(text, replacements), (
+            "## Abstract\nA.\n\n"
+            "## Table of Contents\n1. Abstract\n\n"
+            "## Introduction\nI.\n\n"
+            "## Project Overview\nWhole.\n"
+        ))
+
+    def test_splice_drops_a_truncated_trailing_fragment(self):
+        text = "## Abstract\nA.\n\n## Introduction\nI.\n\n## Literat"
+        spliced = splice_sections(text, {"Introduction": "## Introduction\nNew.\n"}, truncated=True)
+        self.assertEqual(spliced, "## Abstract\nA.\n\n## Introduction\nNew.\n")
+        # Untruncated, an unknown section is the model's own and is kept
+        kept = splice_sections(text, {"Introduction": "## Introduction\nNew.\n"})
+        self.assertTrue(kept.endswith("## Literat\n"))
+
+    def test_splice_keeps_text_before_the_first_heading(self):
+        spliced = splice_sections("# Title\n\n## Abstract\nOld.\n", {"Abstract": "## Abstract\nNew.\n"})
+        self.assertEqual(spliced, "# Title\n\n## Abstract\nNew.\n")
@@ -0,0 +1,127 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from .fakes import FakeGenerativeModel
+from .scheduler import BACKGROUND, INTERACTIVE, ScheduledModel, Scheduler, SchedulerBusy
+
+
+def make_scheduler(**options):
+    config = dict(requests_per_minute=60, tokens_per_minute=6000, max_queue=10,
+                  max_wait_seconds={INTERACTIVE: 30, BACKGROUND: 30}, retries=2, backoff_seconds=0.01,
+                  backoff_max_seconds=0.02, min_rate_fraction=0.1, recovery_step=0.05)
+    return Scheduler(**{**config, **options})
+
+class SchedulerTests(SimpleTestCase):
+    def test_acquire_takes_and_release_refunds_the_budget(self):
+        scheduler = make_scheduler()
+        reserved = scheduler.acquire(4000)
+        self.assertEqual(reserved, 4000)
+        self.assertEqual(scheduler.stats()["in_flight"], 1)
+        self.assertAlmostEqual(scheduler.tokens.available(), 2000, delta=5)
+        scheduler.release(reserved, used=1000)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+        self.assertAlmostEqual(scheduler.tokens.available(), 5000, delta=5)
+
+    def test_a_call_costs_at_most_the_whole_budget(self):
+        scheduler = make_scheduler()
+        self.assertEqual(scheduler.acquire(10 ** 9), 6000)
+
+    def test_calls_over_the_budget_are_shed(self):
+        scheduler = make_scheduler(requests_per_minute=1, max_wait_seconds={INTERACTIVE: 0.05, BACKGROUND: 0.05})
+        scheduler.acquire(10)
+        with self.assertRaises(SchedulerBusy) as busy:
+            scheduler.acquire(10)
+        self.assertGreaterEqual(busy.exception.retry_after, 1)
+        self.assertEqual(scheduler.stats()["queued"], {"interactive": 0, "background": 0})
+
+    def test_a_full_queue_sheds_at_once(self):
+        scheduler = make_scheduler(max_queue=0)
+        with self.assertRaises(SchedulerBusy):
+            scheduler.acquire(10)
+
+    def test_cancelled_wait_takes_nothing_and_leaves_the_queue(self):
+        # The next request slot is a minute away, within the wait limit
+        scheduler = make_scheduler(requests_per_minute=1, max_wait_seconds={INTERACTIVE: 120, BACKGROUND: 120})
+        reserved = scheduler.acquire(10)
+        tokens_left = scheduler.tokens.available()
+
+        async def cancel_while_waiting():
+            waiting = asyncio.create_task(scheduler.aacquire(10, INTERACTIVE))
+            await asyncio.sleep(0.05)
+            self.assertEqual(scheduler.stats()["queued"]["interactive"], 1)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        asyncio.run(cancel_while_waiting())
+        stats = scheduler.stats()
+        self.assertEqual((stats["queued"], stats["in_flight"]), ({"interactive": 0, "background": 0}, 1))
+        self.assertFalse(scheduler._async_waiters)
+        # The bucket only refilled while the call waited
+        self.assertGreaterEqual(scheduler.tokens.available(), tokens_left)
+        scheduler.release(reserved)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+
+    def test_cancelled_waits_free_their_queue_places(self):
+        scheduler = make_scheduler(requests_per_minute=1, max_queue=2,
+                                   max_wait_seconds={INTERACTIVE: 120, BACKGROUND: 120})
+        scheduler.acquire(10)
+
+        async def cancel_behind_a_waiter():
+            head = asyncio.create_task(scheduler.aacquire(10, INTERACTIVE))
+            await asyncio.sleep(0.02)
+            for _ in range(3):
+                behind = asyncio.create_task(scheduler.aacquire(10, BACKGROUND))
+                await asyncio.sleep(0.02)
+                behind.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await behind
+            # Left in the heap behind the head, but not counted against max_queue
+            self.assertGreater(len(scheduler._queue), 2)
+            self.assertEqual(scheduler.waiting, 1)
+            another = asyncio.create_task(scheduler.aacquire(10, BACKGROUND))
+            await asyncio.sleep(0.02)
+            self.assertFalse(another.done())
+            self.assertEqual(scheduler.waiting, 2)
+            for task in (head, another):
+                task.cancel()
+            await asyncio.gather(head, another, return_exceptions=True)
+
+        asyncio.run(cancel_behind_a_waiter())
+        self.assertEqual(scheduler.waiting, 0)
+
+    def test_release_wakes_an_async_waiter(self):
+        scheduler = make_scheduler(max_queue=10)
+        scheduler.requests.try_acquire(scheduler.requests.available())
+
+        async def wait_for_budget():
+            return await asyncio.wait_for(scheduler.aacquire(5), 5)
+
+        self.assertEqual(asyncio.run(wait_for_budget()), 5)
+        self.assertEqual(scheduler.stats()["in_flight"], 1)
+
+    def test_streamed_call_holds_its_reservation_until_read(self):
+        scheduler = make_scheduler()
+        model = ScheduledModel(FakeGenerativeModel(chunk_size=20), scheduler)
+        response = model.generate_content("## Abstract", stream=True)
+        self.assertEqual(scheduler.stats()["in_flight"], 1)
+        text = "".join(chunk.text for chunk in response)
+        self.assertIn("## Abstract", text)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+
+    def test_throttled_stream_is_retried_before_its_first_chunk(self):
+        scheduler = make_scheduler()
+        model = ScheduledModel(FakeGenerativeModel(chunk_size=20, throttle_first=1), scheduler)
+        text = "".join(chunk.text for chunk in model.generate_content("## Abstract", stream=True))
+        self.assertIn("## Abstract", text)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+        self.assertLess(scheduler.rate_fraction, 1.0)
+
+    def test_abandoned_stream_gives_its_reservation_back(self):
+        scheduler = make_scheduler()
+        response = ScheduledModel(FakeGenerativeModel(chunk_size=20), scheduler).generate_content(
+            "## Abstract", stream=True)
+        next(iter(response))
+        response.close()
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test import TestCase
+
+from .documents import save_document
+from .models import Survey
+from .search import InvalidSearchRequest, fts5_query, parse_query, search_backend, search_surveys, tsquery
+
+
+class SearchTests(TestCase):
+    documents = {
+        "Healthcare": "## Abstract\nA patient portal on Kubernetes with real-time analytics.\n",
+        "Finance": "## Abstract\nA trading ledger with real-time reporting, not analytics.\n",
+        "Retail": "## Abstract\nA storefront for seasonal campaigns.\n",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.surveys = {}
+        for industry, content in cls.documents.items():
+            survey = Survey.objects.create(industry=industry, target_audience="Students",
+                                           technology=["Web"], web_frontend=["React"])
+            save_document(survey, content)
+            cls.surveys[industry] = survey.id
+
+    def backends(self):
+        # The database's own index and the LIKE scan other databases fall back to
+        backends = [search_backend()]
+        if backends[0] != "like":
+            backends.append("like")
+        return backends
+
+    def search(self, backend, **params):
+        results, page, next_page = search_surveys(params, backend=backend)
+        return [result["survey_id"] for result in results]
+
+    def test_the_database_has_a_full_text_index(self):
+        expected = {"sqlite": "fts5", "postgresql": "tsvector"}.get(connection.vendor, "like")
+        self.assertEqual(search_backend(), expected)
+
+    def test_words_phrases_prefixes_and_filters(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.search(backend, q="kubernetes"), [self.surveys["Healthcare"]])
+                self.assertEqual(self.search(backend, q='"patient portal"'), [self.surveys["Healthcare"]])
+                self.assertEqual(sorted(self.search(backend, q="analytics")),
+                                 sorted([self.surveys["Healthcare"], self.surveys["Finance"]]))
+                self.assertEqual(self.search(backend, q="analytics", industry="Finance"), [self.surveys["Finance"]])
+                self.assertEqual(self.search(backend, q="zanzibar"), [])
+                # Survey answers are indexed too
+                self.assertEqual(len(self.search(backend, q="react")), 3)
+
+    def test_phrases_match_across_punctuation(self):
+        # The LIKE scan compares the phrase's words as typed, so only the indexes tokenize it
+        for backend in self.backends():
+            if backend == "like":
+                continue
+            with self.subTest(backend=backend):
+                self.assertEqual(self.search(backend, q='"real-time analytics"'), [self.surveys["Healthcare"]])
+
+    def test_prefix_query(self):
+        # The LIKE scan matches substrings, so prefixes come for free there
+        for backend in self.backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.search(backend, q="kube*"), [self.surveys["Healthcare"]])
+
+    def test_snippets_mark_matches_and_escape_html(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend):
+                results, _, _ = search_surveys({"q": "kubernetes"}, backend=backend)
+                self.assertIn("<mark>", results[0]["snippet"])
+                self.assertTrue(results[0]["has_document"])
+
+    def test_paging(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend):
+                first, page, next_page = search_surveys({"q": "react", "page_size": 2}, backend=backend)
+                second, _, last = search_surveys({"q": "react", "page_size": 2, "page": 2}, backend=backend)
+                self.assertEqual((page, next_page, last), (1, 2, None))
+                ids = [result["survey_id"] for result in first + second]
+                self.assertEqual(sorted(ids), sorted(self.surveys.values()))
+
+    def test_query_translation(self):
+        terms = parse_query('"real-time analytics" kube* e-commerce')
+        self.assertEqual(terms, [(["real", "time", "analytics"], False), (["kube"], True), (["e", "commerce"], False)])
+        self.assertEqual(fts5_query(terms), '"real time analytics" "kube"* "e commerce"')
+        self.assertEqual(tsquery(terms), "real <-> time <-> analytics & kube:* & e <-> commerce")
+
+    def test_invalid_requests(self):
+        for params in [{}, {"q": "  "}, {"q": "***"}, {"q": "x", "sort": "oldest"}, {"q": "x", "page": 0}]:
+            with self.subTest(params=params), self.assertRaises(InvalidSearchRequest):
+                search_surveys(params)
+        self.assertEqual(self.client.get("/api/search/").status_code, 400)
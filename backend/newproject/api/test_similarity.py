@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from .documents import save_document
+from .loadtest import survey_payload
+from .models import Survey
+from .similarity import SimilarityIndex, get_similarity_index
+
+ANSWERS = {"target_audience": "Enterprises", "technology": ["AI", "SaaS"], "web_frontend": ["React"],
+           "web_backend": ["Django"], "web_database": ["PostgreSQL"]}
+
+
+class SimilarityIndexTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(industry="Healthcare", **ANSWERS)
+        save_document(self.survey, "## Abstract\nA stored document.\n")
+        Survey.objects.create(industry="Retail", target_audience="Students", technology=["Mobile"])
+        self.index = SimilarityIndex(reuse_threshold=0.5)
+
+    def test_reuse_is_skipped_until_the_index_is_loaded(self):
+        with mock.patch.object(self.index, "start_loading", return_value=object()) as start_loading:
+            self.assertIsNone(self.index.find_reusable({"industry": "Healthcare", **ANSWERS}))
+        # Loading was left to the background, not done on the request thread
+        start_loading.assert_called_once()
+        self.assertEqual((len(self.index), self.index.stats()["loaded"]), (0, False))
+
+        self.index.load()
+        document, survey_id, score = self.index.find_reusable({"industry": "Healthcare", **ANSWERS})
+        self.assertEqual((survey_id, document.survey_id), (self.survey.id, self.survey.id))
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_load_builds_the_postings(self):
+        self.index.load()
+        stats = self.index.stats()
+        self.assertEqual((stats["loaded"], stats["surveys"], stats["delta"], stats["builds"]), (True, 2, 0, 1))
+        self.assertIsNone(self.index.start_loading())
+
+    def test_an_index_that_never_pulls_is_ready_at_once(self):
+        index = SimilarityIndex(refresh_interval=None)
+        index.add(1, {"industry": "Healthcare"})
+        self.assertEqual(index.search({"industry": "Healthcare"}, wait=False), [(1, 1.0)])
+
+
+class SimilarSurveyEndpointTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(industry="Healthcare", **ANSWERS)
+        self.previous_index = get_similarity_index.set(None)
+
+    def tearDown(self):
+        get_similarity_index.set(self.previous_index)
+
+    def use_index(self, **options):
+        index = SimilarityIndex(**options)
+        index.load()
+        get_similarity_index.set(index)
+
+    def test_lookups_return_the_most_similar_surveys(self):
+        other = Survey.objects.create(industry="Healthcare", **ANSWERS)
+        self.use_index()
+        response = self.client.get(f"/api/surveys/{self.survey.id}/similar/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["survey_id"] for result in response.json()["results"]], [other.id])
+
+        payload = {**survey_payload(1), "industry": "Healthcare"}
+        response = self.client.post("/api/surveys/similar/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({result["survey_id"] for result in response.json()["results"]}, {self.survey.id, other.id})
+
+    @override_settings(SIMILARITY={"ENABLED": False})
+    def test_lookups_are_not_found_while_disabled(self):
+        response = self.client.get(f"/api/surveys/{self.survey.id}/similar/")
+        self.assertEqual((response.status_code, response.json()), (404, {"error": "Similar survey lookup is disabled"}))
+        response = self.client.post("/api/surveys/similar/", survey_payload(1), content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+        # Nothing was loaded for the lookups
+        self.assertEqual(get_similarity_index().stats()["loaded"], False)
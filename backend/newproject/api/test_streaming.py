@@ -0,0 +1,62 @@
+import json
+
+from django.test import TestCase
+
+from .generation import OUTLINE
+from .llm import FakeProvider, set_provider
+from .loadtest import survey_payload
+from .models import Survey
+from .streaming import encode_events, replay_document, sse_event
+
+# The stream view runs on an installed FakeProvider, so these tests never call the Gemini
+# API whatever GEMINI_PROVIDER is set to.
+
+
+def parse_events(body):
+    """[(event, data)] of an SSE body, skipping comments and retry/id fields."""
+    events = []
+    for message in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.previous_provider = set_provider(FakeProvider(chunk_size=40))
+
+    def tearDown(self):
+        set_provider(self.previous_provider)
+
+    def test_sse_event_framing(self):
+        message = sse_event("chunk", {"text": "line one\nline two"})
+        self.assertEqual(message, 'event: chunk\ndata: {"text": "line one\\nline two"}\n\n')
+        # The data field stays on one line whatever the text contains
+        self.assertEqual(message.count("\n"), 3)
+
+    def test_encode_events_passes_on_the_documents_content(self):
+        content = "## Abstract\nText.\n\n## Introduction\nMore text.\n"
+        stream = encode_events(replay_document(content))
+        messages = []
+        while True:
+            try:
+                messages.append(next(stream))
+            except StopIteration as stop:
+                returned = stop.value
+                break
+        self.assertEqual(returned, content)
+        events = parse_events("".join(messages))
+        self.assertEqual("".join(data["text"] for event, data in events if event == "chunk"), content)
+        self.assertEqual([data for event, data in events if event == "section"],
+                         [{"index": 0, "title": "Abstract"}, {"index": 1, "title": "Introduction"}])
+        self.assertEqual(events[-1], ("done", {"sections": ["Abstract", "Introduction"], "length": len(content)}))
+
+    def test_stream_view_sends_the_whole_outline(self):
+        response = self.client.post("/api/survey/stream/", survey_payload(101), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = parse_events(b"".join(response.streaming_content).decode())
+        self.assertEqual(events[0], ("meta", {"survey_id": Survey.objects.get().id, "cached": False}))
+        sections = [data["title"] for event, data in events if event == "section"]
+        self.assertEqual(sections, [section["title"] for section in OUTLINE])
+        self.assertEqual(events[-1][0], "done")
@@ -1,8 +1,30 @@
 from django.urls import path
-from .views import process_survey, get_activity, get_survey_history
+from .async_views import process_survey_async
+from .views import (
+    process_survey, process_survey_stream, get_activity, get_survey_history, get_cache_stats,
+    create_generation_job, get_generation_job, get_job_stats, get_survey_document,
+    export_survey_document, get_export_stats, create_survey_batch, get_generation_jobs,
+    get_similar_surveys, find_similar_surveys, stream_activity, get_health, search_survey_documents,
+)
 
 urlpatterns = [
     path('survey/', process_survey, name='process_survey'),
+    path('survey/async/', process_survey_async, name='process_survey_async'),
+    path('survey/stream/', process_survey_stream, name='process_survey_stream'),
     path('activity/', get_activity, name='get_activity'),
+    path('activity/stream/', stream_activity, name='stream_activity'),
     path('history/', get_survey_history, name='survey_history'),
+    path('search/', search_survey_documents, name='search_surveys'),
+    path('surveys/<int:survey_id>/document/', get_survey_document, name='survey_document'),
+    path('surveys/<int:survey_id>/export/<str:fmt>/', export_survey_document, name='export_survey_document'),
+    path('surveys/<int:survey_id>/similar/', get_similar_surveys, name='similar_surveys'),
+    path('surveys/similar/', find_similar_surveys, name='find_similar_surveys'),
+    path('exports/stats/', get_export_stats, name='export_stats'),
+    path('surveys/batch/', create_survey_batch, name='create_survey_batch'),
+    path('jobs/', create_generation_job, name='create_generation_job'),
+    path('jobs/stats/', get_job_stats, name='job_stats'),
+    path('jobs/status/', get_generation_jobs, name='generation_jobs'),
+    path('jobs/<int:job_id>/', get_generation_job, name='generation_job'),
+    path('cache/stats/', get_cache_stats, name='cache_stats'),
+    path('health/', get_health, name='health'),
 ]
@@ -1,35 +1,23 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.http import parse_etags
+from django.views.decorators.http import condition, require_GET
+from django.views.decorators.vary import vary_on_headers
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
 import logging
 from datetime import datetime
 import json
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by settings.LOGGING and the .env file is read by settings
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
-# Load Gemini API Key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("Gemini API key not found in environment variables.")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Store the last Gemini output with timestamp
-last_gemini_output = {"timestamp": None, "content": None}
-
-# Add these debug flags after the logger setup
-DEBUG_MODE = True
 SAFETY_SETTINGS = {
     "HARM_CATEGORY_HARASSMENT": "block_none",
     "HARM_CATEGORY_HATE_SPEECH": "block_none",
@@ -37,64 +25,54 @@ SAFETY_SETTINGS = {
     "HARM_CATEGORY_DANGEROUS_CONTENT": "block_none",
 }
 
-GEMINI_MODEL = "gemini-1.5-pro"  # Updated to use gemini-1.5-pro
-
-from .models import Survey
+from .activity import STREAM_RETRY_MS, get_activity_feed, snapshot_etag
+from .cache import get_document_cache, make_cache_key
+from .doctree import document_fields, output_format
+from .documents import document_content, save_document_safely
+from .export import CONTENT_TYPES, InvalidExportRequest, cover_from, get_exporter
+from .generation import (
+    SurveyBatchValidationError, SurveyValidationError,
+    build_prompt, generation_mode, parse_survey_batch, parse_survey_payload, validate_response,
+)
+from .jobs import enqueue_survey, enqueue_surveys, get_job_queue
+from .llm import configuration_errors, sdk_loaded
+from .compact import columnar
+from .metrics import REGISTRY, instrumented, stage
+from .models import GeneratedDocument, GenerationJob, Survey
+from .pagination import InvalidPageRequest, fields_from, layout_from, paginate_surveys
+from .routing import route_survey, single_tier_plan
+from .search import InvalidSearchRequest, search_surveys
+from .scheduler import SchedulerBusy
+from .sectioned import generate_sectioned_document
+from .similarity import SIMILARITY_FIELDS, get_similarity_index, similar_surveys
+from .singleflight import get_single_flight
+from .streaming import astream_document, encode_events, replay_document, sse_event, stream_document
+from .writer import create_survey, insert_surveys
 
 @api_view(["POST"])
+@instrumented("process_survey")
 def process_survey(request):
     try:
-        # Log the raw request data
-        logger.info("Raw request data received: %s", request.data)
-        
-        user_input = request.data
-        if not user_input:
-            logger.error("Empty request data received")
-            return Response(
-                {"error": "No input data provided"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # The raw payload only at DEBUG; it is truncated by the log formatter
+        logger.debug("Raw request data received: %s", request.data, extra={"event": "survey.payload"})
 
-        # Validate required fields
-        required_fields = ["industry", "targetAudience", "technology"]
-        missing_fields = [field for field in required_fields if not user_input.get(field)]
-        
-        if missing_fields:
-            logger.error("Missing required fields: %s", missing_fields)
+        try:
+            with stage("validation"):
+                survey_data = parse_survey_payload(request.data)
+                mode = generation_mode(request.data)
+                fmt = output_format(request.data)
+        except SurveyValidationError as validation_error:
+            logger.error("Invalid survey payload: %s", validation_error)
             return Response(
-                {"error": f"Missing required fields: {', '.join(missing_fields)}"}, 
+                {"error": str(validation_error)}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Initialize empty lists for optional fields
-        survey_data = {
-            "industry": user_input.get("industry"),
-            "industry_other": user_input.get("industryOther") or "",
-            "target_audience": user_input.get("targetAudience"),
-            "technology": user_input.get("technology") or [],
-            "sub_technology": user_input.get("subTechnology") or "",
-            "platform": user_input.get("platform") or "",
-            "web_frontend": user_input.get("webFrontend") or [],
-            "web_backend": user_input.get("webBackend") or [],
-            "web_hosting": user_input.get("webHosting") or [],
-            "web_database": user_input.get("webDatabase") or [],
-            "security_features": user_input.get("securityFeatures") or []
-        }
-
-        # Validate data types
-        list_fields = ["technology", "web_frontend", "web_backend", "web_hosting", "web_database", "security_features"]
-        for field in list_fields:
-            if not isinstance(survey_data[field], list):
-                logger.error("Invalid data type for field %s: expected list, got %s", field, type(survey_data[field]))
-                return Response(
-                    {"error": f"Invalid data type for {field}: must be a list"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
         try:
-            logger.info("Creating survey with data: %s", survey_data)
-            survey = Survey.objects.create(**survey_data)
-            logger.info("Survey created successfully with ID: %s", survey.id)
+            with stage("db_write"):
+                survey = create_survey(survey_data)
+            logger.info("Survey created successfully with ID: %s", survey.id,
+                        extra={"event": "survey.created", "survey_id": survey.id})
         except Exception as db_error:
             logger.error("Database error: %s", str(db_error), exc_info=True)
             return Response(
@@ -102,237 +80,696 @@ def process_survey(request):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # Serve identical stacks from the document cache instead of regenerating
+        # The routing plan (api.routing) decides which models write the document
+        document_cache = get_document_cache()
+        plan = route_survey(survey_data)
+        mode = plan.generation_mode(mode)
+        cache_key = make_cache_key(survey_data, plan.model_name, plan.generation_config)
+        with stage("cache_lookup"):
+            cached_content = document_cache.get(cache_key)
+        if cached_content is not None:
+            logger.info("Document cache hit for survey %s (key %s)", survey.id, cache_key[:12],
+                        extra={"event": "document.cache_hit", "survey_id": survey.id})
+            save_document_safely(survey, cached_content, prompt=build_prompt(survey_data), from_cache=True,
+                                 model_name=plan.model_name, generation_config=plan.generation_config)
+            with stage("format"):
+                fields = document_fields(cached_content, fmt)
+            return Response({
+                **fields,
+                "survey_id": survey.id,
+                "timestamp": datetime.now().isoformat(),
+                "cached": True
+            }, status=status.HTTP_200_OK)
+
+        # Near-identical earlier submissions can share their document (api.similarity)
+        if request.data.get("reuse") is not False:
+            with stage("similar_lookup"):
+                similar = get_similarity_index().find_reusable(survey_data, exclude=survey.id)
+            if similar is not None:
+                similar_document, similar_survey_id, score = similar
+                similar_content = document_content(similar_document)
+                logger.info("Survey %s reuses the document of survey %s (similarity %.3f)",
+                            survey.id, similar_survey_id, score)
+                # Stored as written: by the model and config of the survey it comes from
+                save_document_safely(survey, similar_content, prompt=build_prompt(survey_data), from_cache=True,
+                                     model_name=similar_document.model_name,
+                                     generation_config=similar_document.generation_config)
+                with stage("format"):
+                    fields = document_fields(similar_content, fmt)
+                return Response({
+                    **fields,
+                    "survey_id": survey.id,
+                    "timestamp": datetime.now().isoformat(),
+                    "cached": True,
+                    "reused_from": {"survey_id": similar_survey_id, "score": round(score, 4)}
+                }, status=status.HTTP_200_OK)
+
         try:
-            if DEBUG_MODE:
-                logger.info(f"Initializing Gemini model {GEMINI_MODEL}...")
-            
-            if not GEMINI_API_KEY:
-                logger.error("Gemini API key is missing")
+            tier = plan.document_tier
+            logger.debug("Initializing Gemini model %s...", tier.model_name)
+
+            configuration = configuration_errors()
+            if configuration:
+                logger.error("Model provider is not configured: %s", " ".join(configuration))
                 return Response(
-                    {"error": "API configuration error: Missing API key"}, 
+                    {"error": f"API configuration error: {' '.join(configuration)}"}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
             # Updated model initialization with more configuration
             try:
-                model = genai.GenerativeModel(
-                    model_name=GEMINI_MODEL,
-                    generation_config={
-                        "temperature": 0.7,
-                        "top_p": 0.8,
-                        "top_k": 40,
-                        "max_output_tokens": 2048,
-                    }
-                )
-                logger.info(f"Successfully initialized Gemini model: {GEMINI_MODEL}")
+                model = tier.model()
+                logger.debug("Successfully initialized Gemini model: %s", tier.model_name)
             except Exception as model_error:
-                logger.error(f"Failed to initialize Gemini model: {str(model_error)}")
+                logger.error("Failed to initialize Gemini model: %s", model_error)
                 return Response(
                     {"error": f"AI model initialization failed: {str(model_error)}"}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-            if DEBUG_MODE:
-                logger.info("Preparing prompt for Gemini API...")
-
-            # Format the prompt more clearly
-            technologies = ", ".join(user_input.get("technology", []))
-            frontend = ", ".join(user_input.get("webFrontend", []))
-            backend = ", ".join(user_input.get("webBackend", []))
-            database = ", ".join(user_input.get("webDatabase", []))
-            
-            prompt = f"""Create a comprehensive project documentation for a {user_input.get('industry')} project. Follow this EXACT structure and include ALL sections:
-
-1. Abstract (40 lines)
-2. Table of Contents
-3. Introduction (30 lines)
-4. Project Overview (35 lines)
-5. Literature Review
-6. Problem Statement & Motivation
-7. Aim and Objectives
-8. Methodology
-9. Functional & Non-Functional Requirements
-10. System Architecture
-11. Software & Hardware Requirements
-12. Model Description
-- Detailed explanation of model selection
-- Working mechanism analysis
-- Justification for model choice
-13. Input and Output Design
-- Input parameters specification
-- Data flow description
-- Expected output formats
-14. Testing and Implementation
-- Testing strategies
-- Implementation phases
-- Validation steps
-15. Deployment Strategy
-- Deployment scenarios
-- Implementation steps
-- Resource requirements
-16. Maintenance and Future Enhancements
-- Maintenance procedures
-- Potential improvements
-- Scalability considerations
-17. Conclusion (30 lines)
-18. References
-
-Important: 
-- Each section MUST begin with its corresponding heading (e.g., "## Model Description")
-- Include ALL sections listed above
-- Maintain consistent formatting
-- Use proper section breaks
-- Ensure comprehensive coverage of each topic
-- Keep the specified line counts where indicated
-
-Technical Specifications:
-Industry: {user_input.get('industry')}
-Technologies: {technologies}
-Frontend: {frontend}
-Backend: {backend}
-Database: {database}
-
-Please provide detailed content for each section, ensuring no sections are omitted."""
-
-            # Update generation config for longer output
-            generation_config = {
-                "temperature": 0.9,  # Increased for more creative responses
-                "top_p": 0.9,
-                "top_k": 40,
-                "max_output_tokens": 8192,  # Increased token limit
-            }
-
-            # Validate response sections
-            def validate_response(response_text):
-                required_sections = [
-                    "## Model Description",
-                    "## Input and Output Design",
-                    "## Testing and Implementation",
-                    "## Deployment Strategy",
-                    "## Maintenance and Future Enhancements",
-                    "## Conclusion",
-                    "## References"
-                ]
-                
-                missing_sections = []
-                for section in required_sections:
-                    if section not in response_text:
-                        missing_sections.append(section)
-                
-                if missing_sections:
-                    logger.warning(f"Missing sections in response: {missing_sections}")
-                    # Generate missing sections separately
-                    additional_prompt = f"Please generate content for these missing sections: {', '.join(missing_sections)}"
-                    try:
-                        additional_response = model.generate_content(additional_prompt)
-                        if additional_response and hasattr(additional_response, 'text'):
-                            return response_text + "\n\n" + additional_response.text
-                    except Exception as e:
-                        logger.error(f"Error generating missing sections: {str(e)}")
-                
-                return response_text
+            prompt = build_prompt(survey_data)
 
-            try:
-                response = model.generate_content(
-                    contents=prompt,
-                    generation_config=generation_config
-                )
-                logger.info("Successfully generated content from Gemini API")
-                
-                # Handle the response and validate sections
-                if response and hasattr(response, 'text'):
-                    main_content = response.text
-                    validated_content = validate_response(main_content)
-                    formatted_output = validated_content.replace('\n', '<br>')
-                    
-                    return Response({
-                        "response": formatted_output,
-                        "timestamp": datetime.now().isoformat()
-                    }, status=status.HTTP_200_OK)
+            def generate():
+                if mode == "sectioned":
+                    # Fan the outline out into concurrent per-section calls
+                    with stage("generate"):
+                        content = generate_sectioned_document(model, survey_data, plan)
                 else:
+                    with stage("generate"):
+                        response = model.generate_content(
+                            contents=prompt,
+                            generation_config=tier.generation_config
+                        )
+                    # Handle the response and validate sections
+                    if not (response and hasattr(response, 'text')):
+                        raise ValueError("Invalid response format from Gemini API")
+                    content = validate_response(model, response.text, survey_data, response, plan)
+                if not content:
                     raise ValueError("Invalid response format from Gemini API")
+                logger.info("Successfully generated content from Gemini API",
+                            extra={"event": "document.generated", "survey_id": survey.id})
+                document_cache.set(cache_key, content)
+                return content
+
+            try:
+                # Identical submissions in flight at the same time share one generation
+                validated_content, coalesced = get_single_flight().do(
+                    cache_key, generate, recheck=lambda: document_cache.get(cache_key)
+                )
+                if coalesced:
+                    logger.info("Survey %s shared an in-flight generation (key %s)", survey.id, cache_key[:12])
+
+                with stage("store"):
+                    save_document_safely(survey, validated_content, prompt=prompt, from_cache=coalesced,
+                                         model_name=plan.model_name, generation_config=plan.generation_config)
+                with stage("format"):
+                    fields = document_fields(validated_content, fmt)
+
+                return Response({
+                    **fields,
+                    "survey_id": survey.id,
+                    "timestamp": datetime.now().isoformat(),
+                    **({"coalesced": True} if coalesced else {})
+                }, status=status.HTTP_200_OK)
                 
+            except SchedulerBusy as busy:
+                # Over the model budget: ask the client to come back rather than fail
+                logger.warning("Content generation deferred: %s", busy)
+                return Response(
+                    {"error": str(busy), "retry_after": busy.retry_after}, 
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(busy.retry_after)}
+                )
             except Exception as generate_error:
-                logger.error(f"Content generation failed: {str(generate_error)}")
+                logger.error("Content generation failed: %s", generate_error)
                 return Response(
                     {"error": f"Content generation failed: {str(generate_error)}"}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
         except Exception as ai_error:
-            logger.error(f"AI model error: {str(ai_error)}", exc_info=True)
+            logger.error("AI model error: %s", ai_error, exc_info=True)
             return Response(
                 {"error": f"AI model error: {str(ai_error)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     except Exception as e:
-        logger.error(f"Unexpected error in process_survey: {str(e)}", exc_info=True)
+        logger.error("Unexpected error in process_survey: %s", e, exc_info=True)
         return Response(
             {"error": f"Server error: {str(e)}"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(["POST"])
+@instrumented("process_survey_stream")
+def process_survey_stream(request):
+    # Same input handling as process_survey, but the document is sent as Server-Sent Events
+    # while the model produces it instead of as one JSON body at the end
+    try:
+        survey_data = parse_survey_payload(request.data)
+    except SurveyValidationError as validation_error:
+        logger.error("Invalid survey payload: %s", validation_error)
+        return Response(
+            {"error": str(validation_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        survey = create_survey(survey_data)
+        logger.info("Survey created successfully with ID: %s", survey.id,
+                    extra={"event": "survey.created", "survey_id": survey.id})
+    except Exception as db_error:
+        logger.error("Database error: %s", str(db_error), exc_info=True)
+        return Response(
+            {"error": f"Database error: {str(db_error)}"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    # A stream is one completion, so it comes from one tier even when sections are routed,
+    # and so do the sections repaired after it
+    document_cache = get_document_cache()
+    tier = route_survey(survey_data).document_tier
+    plan = single_tier_plan(tier)
+    cache_key = make_cache_key(survey_data, tier.model_name, tier.generation_config)
+    cached_content = document_cache.get(cache_key)
+    stored = {"model_name": tier.model_name, "generation_config": tier.generation_config}
+
+    def events():
+        # WSGI servers send each chunk as the generator yields it
+        yield sse_event("meta", {"survey_id": survey.id, "cached": cached_content is not None})
+        prompt = build_prompt(survey_data)
+        if cached_content is not None:
+            yield from encode_events(replay_document(cached_content))
+            save_document_safely(survey, cached_content, prompt=prompt, from_cache=True, **stored)
+            return
+        content = yield from encode_events(stream_document(tier.model(), prompt, tier.generation_config, survey_data, plan))
+        if content:
+            document_cache.set(cache_key, content)
+            save_document_safely(survey, content, prompt=prompt, **stored)
+
+    async def aevents():
+        # Under ASGI Django would read a sync generator to the end before sending anything
+        yield sse_event("meta", {"survey_id": survey.id, "cached": cached_content is not None})
+        prompt = build_prompt(survey_data)
+        if cached_content is not None:
+            for event, data in replay_document(cached_content):
+                yield sse_event(event, data)
+            await sync_to_async(save_document_safely)(survey, cached_content, prompt=prompt, from_cache=True, **stored)
+            return
+        result = {}
+        async for event, data in astream_document(tier.model(), prompt, tier.generation_config, survey_data, plan, result):
+            yield sse_event(event, data)
+        if result.get("content"):
+            await sync_to_async(document_cache.set, thread_sensitive=False)(cache_key, result["content"])
+            await sync_to_async(save_document_safely)(survey, result["content"], prompt=prompt, **stored)
+
+    body = aevents() if isinstance(request._request, ASGIRequest) else events()
+    response = StreamingHttpResponse(body, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream
+    return response
+
+@api_view(["POST"])
+def create_generation_job(request):
+    # Queue the generation and answer immediately; the client polls get_generation_job
+    try:
+        survey_data = parse_survey_payload(request.data)
+    except SurveyValidationError as validation_error:
+        logger.error("Invalid survey payload: %s", validation_error)
+        return Response(
+            {"error": str(validation_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        survey = create_survey(survey_data)
+        job = enqueue_survey(survey)
+        logger.info("Queued generation job %s for survey %s", job.id, survey.id)
+    except Exception as db_error:
+        logger.error("Database error: %s", str(db_error), exc_info=True)
+        return Response(
+            {"error": f"Database error: {str(db_error)}"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response({
+        "job_id": job.id,
+        "survey_id": survey.id,
+        "status": job.status
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(["POST"])
+@instrumented("create_survey_batch")
+def create_survey_batch(request):
+    # Body: {"surveys": [<survey payload>, ...]}. All items are validated before anything
+    # is stored; the surveys and their jobs are then inserted with one bulk INSERT each and
+    # generated by the job queue, whose workers bound concurrency and pace model calls
+    try:
+        with stage("validation"):
+            surveys_data = parse_survey_batch(request.data, settings.BATCH_MAX_SURVEYS)
+    except SurveyBatchValidationError as validation_error:
+        logger.error("Invalid survey batch: %s", validation_error.errors)
+        return Response(
+            {"error": str(validation_error), "errors": validation_error.errors}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except SurveyValidationError as validation_error:
+        return Response(
+            {"error": str(validation_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        with stage("db_write"):
+            with transaction.atomic():
+                surveys = insert_surveys([Survey(**survey_data) for survey_data in surveys_data])
+                jobs = enqueue_surveys(surveys)
+        logger.info("Queued a batch of %s generation jobs", len(jobs))
+    except Exception as db_error:
+        logger.error("Database error: %s", str(db_error), exc_info=True)
+        return Response(
+            {"error": f"Database error: {str(db_error)}"}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response({
+        "count": len(jobs),
+        "items": [
+            {"survey_id": job.survey_id, "job_id": job.id, "status": job.status}
+            for job in jobs
+        ]
+    }, status=status.HTTP_202_ACCEPTED)
+
+def _job_summary(job):
+    return {
+        "job_id": job.id,
+        "survey_id": job.survey_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+@vary_on_headers("Accept")
 @api_view(["GET"])
-def get_activity(request):
+def get_generation_jobs(request):
+    # Status of many jobs at once, e.g. a batch: ?ids=1,2,3. Documents are fetched per
+    # job from get_generation_job once it has succeeded
     try:
-        # Get the most recent survey
-        latest_survey = Survey.objects.order_by('-created_at').first()
-        
-        if latest_survey:
-            # Format the response similar to process_survey
-            activity_data = {
-                'industry': latest_survey.industry,
-                'target_audience': latest_survey.target_audience,
-                'technology': latest_survey.technology,
-                'created_at': latest_survey.created_at.isoformat()
-            }
-            return Response({
-                "response": f"Latest activity: {activity_data}",
-                "timestamp": latest_survey.created_at.isoformat()
-            }, status=status.HTTP_200_OK)
-        
+        job_ids = [int(job_id) for job_id in request.query_params.get("ids", "").split(",") if job_id]
+    except ValueError:
         return Response(
-            {"error": "No surveys found"}, 
+            {"error": "ids must be a comma-separated list of job ids"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not job_ids or len(job_ids) > settings.BATCH_MAX_SURVEYS:
+        return Response(
+            {"error": f"Between 1 and {settings.BATCH_MAX_SURVEYS} job ids are required"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    jobs = GenerationJob.objects.filter(id__in=job_ids).order_by('id')
+    return Response({"jobs": [
+        {**_job_summary(job), **({"error": job.error} if job.error else {})}
+        for job in jobs.defer('result')
+    ]}, status=status.HTTP_200_OK)
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def get_generation_job(request, job_id):
+    # ?output=html|tree|both picks how a finished document is returned
+    try:
+        fmt = output_format(request.query_params)
+    except SurveyValidationError as validation_error:
+        return Response(
+            {"error": str(validation_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        job = GenerationJob.objects.get(id=job_id)
+    except GenerationJob.DoesNotExist:
+        return Response(
+            {"error": "Job not found"}, 
             status=status.HTTP_404_NOT_FOUND
         )
-        
+
+    job_data = _job_summary(job)
+    if job.status == GenerationJob.STATUS_SUCCEEDED:
+        job_data.update(document_fields(job.result, fmt))
+    elif job.error:
+        job_data["error"] = job.error
+    return Response(job_data, status=status.HTTP_200_OK)
+
+def _document_etag(request, survey_id):
+    document = GeneratedDocument.objects.filter(survey_id=survey_id).values('content_hash').first()
+    return document['content_hash'] if document else None
+
+def _document_last_modified(request, survey_id):
+    document = GeneratedDocument.objects.filter(survey_id=survey_id).values('created_at').first()
+    return document['created_at'] if document else None
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+@condition(etag_func=_document_etag, last_modified_func=_document_last_modified)
+def get_survey_document(request, survey_id):
+    # Stored documents never change, so repeat views are answered with 304 by condition()
+    try:
+        fmt = output_format(request.query_params)
+    except SurveyValidationError as validation_error:
+        return Response(
+            {"error": str(validation_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        document = GeneratedDocument.objects.prefetch_related('sections').get(survey_id=survey_id)
+    except GeneratedDocument.DoesNotExist:
+        return Response(
+            {"error": "No document stored for this survey"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        content = document_content(document)
+    except Exception as e:
+        logger.error("Error reading stored document: %s", e)
+        return Response(
+            {"error": "An error occurred while reading the stored document."}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response({
+        "survey_id": document.survey_id,
+        **document_fields(content, fmt, key=document.content_hash),
+        "sections": [section.heading for section in document.sections.all() if section.heading],
+        "model": document.model_name,
+        "generation_config": document.generation_config,
+        "prompt_tokens": document.prompt_tokens,
+        "output_tokens": document.output_tokens,
+        "timestamp": document.created_at.isoformat()
+    }, status=status.HTTP_200_OK)
+
+@require_GET
+@instrumented("export_survey_document")
+def export_survey_document(request, survey_id, fmt):
+    # Download the stored document as pdf, docx or md. Optional title, author and company
+    # query parameters add a cover page. Plain Django view: DRF would try to render the file
+    try:
+        cover = cover_from(request.GET)
+        if fmt not in CONTENT_TYPES:
+            raise InvalidExportRequest(f"Invalid format: must be one of {', '.join(CONTENT_TYPES)}")
+    except InvalidExportRequest as export_error:
+        return JsonResponse({"error": str(export_error)}, status=400)
+
+    try:
+        document = GeneratedDocument.objects.prefetch_related('sections').get(survey_id=survey_id)
+    except GeneratedDocument.DoesNotExist:
+        return JsonResponse({"error": "No document stored for this survey"}, status=404)
+
+    try:
+        with stage("export"):
+            path = get_exporter().export(document_content(document), fmt, cover, key=document.content_hash)
+    except InvalidExportRequest as export_error:
+        return JsonResponse({"error": str(export_error)}, status=400)
+    except Exception as e:
+        logger.error("Export of survey %s as %s failed: %s", survey_id, fmt, e, exc_info=True)
+        return JsonResponse({"error": "An error occurred while exporting the document."}, status=500)
+
+    response = FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=f"survey-{survey_id}.{fmt}",
+        content_type=CONTENT_TYPES[fmt]
+    )
+    # Exports are immutable for a given document, cover and renderer version
+    response["Cache-Control"] = "private, max-age=86400"
+    return response
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def get_export_stats(request):
+    return Response(get_exporter().stats(), status=status.HTTP_200_OK)
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def get_job_stats(request):
+    return Response(get_job_queue().stats(), status=status.HTTP_200_OK)
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def get_cache_stats(request):
+    return Response({
+        **get_document_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+        "similarity": get_similarity_index().stats()
+    }, status=status.HTTP_200_OK)
+
+def _similarity_disabled():
+    return Response({"error": "Similar survey lookup is disabled"}, status=status.HTTP_404_NOT_FOUND)
+
+def _similar_limit(params):
+    index = get_similarity_index()
+    try:
+        limit = int(params.get("limit", 10))
+    except (TypeError, ValueError):
+        raise SurveyValidationError("limit must be an integer")
+    if not 1 <= limit <= index.max_results:
+        raise SurveyValidationError(f"limit must be between 1 and {index.max_results}")
+    return limit
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+@instrumented("get_similar_surveys")
+def get_similar_surveys(request, survey_id):
+    # The past surveys most like survey_id, best first; query param limit
+    if not get_similarity_index().enabled:
+        return _similarity_disabled()
+    try:
+        limit = _similar_limit(request.query_params)
+    except SurveyValidationError as validation_error:
+        return Response({"error": str(validation_error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    survey = Survey.objects.filter(id=survey_id).values("industry_other", *SIMILARITY_FIELDS).first()
+    if survey is None:
+        return Response({"error": "Survey not found"}, status=status.HTTP_404_NOT_FOUND)
+    with stage("similar_query"):
+        results = similar_surveys(get_similarity_index(), survey, limit, exclude=survey_id)
+    return Response({"survey_id": survey_id, "results": results}, status=status.HTTP_200_OK)
+
+@api_view(["POST"])
+@instrumented("find_similar_surveys")
+def find_similar_surveys(request):
+    # Same as get_similar_surveys for survey answers that have not been submitted
+    if not get_similarity_index().enabled:
+        return _similarity_disabled()
+    try:
+        survey_data = parse_survey_payload(request.data)
+        limit = _similar_limit(request.data)
+    except SurveyValidationError as validation_error:
+        return Response({"error": str(validation_error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    with stage("similar_query"):
+        results = similar_surveys(get_similarity_index(), survey_data, limit)
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def get_health(request):
+    # Readiness: 503 while the database is unreachable or the model provider is not
+    # configured (e.g. a missing GEMINI_API_KEY). Answering does not load the model SDK
+    checks = {}
+    try:
+        connection.ensure_connection()
+        checks["database"] = "ok"
+    except Exception as e:
+        logger.error("Health check could not reach the database: %s", e)
+        checks["database"] = str(e)
+    configuration = configuration_errors()
+    checks["llm"] = " ".join(configuration) if configuration else "ok"
+
+    healthy = all(result == "ok" for result in checks.values())
+    return Response({
+        "status": "ok" if healthy else "unavailable",
+        "checks": checks,
+        "llm_sdk_loaded": sdk_loaded()
+    }, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+def metrics(request):
+    # Prometheus text exposition of this process's metrics, kept out of DRF's renderers
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _activity_response(snapshot, status_code=status.HTTP_200_OK):
+    headers = {"ETag": snapshot_etag(snapshot), "Cache-Control": "no-cache"}
+    if status_code == status.HTTP_304_NOT_MODIFIED:
+        return Response(status=status_code, headers=headers)
+    if not snapshot:
+        return Response({"error": "No surveys found"}, status=status.HTTP_404_NOT_FOUND, headers=headers)
+    return Response(snapshot, status=status_code, headers=headers)
+
+def _client_etags(request):
+    # If-None-Match compares weakly (RFC 9110): CompressionMiddleware sends the ETag as
+    # W/"...", and clients send it back that way
+    return {etag.removeprefix("W/") for etag in parse_etags(request.headers.get("If-None-Match", ""))}
+
+def _activity_wait(params):
+    # Seconds of ?wait=, or None when it is not a number from 0 to 3600
+    try:
+        wait = float(params.get("wait", 0))
+    except ValueError:
+        return None
+    return wait if 0 <= wait <= 3600 else None
+
+@instrumented("get_activity")
+async def get_activity(request):
+    # The newest survey, from the activity snapshot (api.activity) rather than a query.
+    # A request whose If-None-Match matches gets 304; with ?wait=<seconds> as well it is a
+    # long-poll, answered as soon as a newer survey is saved or with 304 once wait is up.
+    # Under ASGI the long-poll is awaited here, holding no thread, and activity_snapshot
+    # then answers it without waiting again. Under WSGI activity_snapshot does the waiting,
+    # on the request's thread, and Django's async_to_sync around this view adds about a
+    # millisecond per request: serve activity from an async server
+    if isinstance(request, ASGIRequest):
+        wait = _activity_wait(request.GET)
+        client_etags = _client_etags(request)
+        if wait and client_etags:
+            try:
+                feed = get_activity_feed()
+                snapshot = await feed.alatest()
+                if snapshot_etag(snapshot) in client_etags:
+                    with stage("activity_wait"):
+                        await feed.await_change(snapshot_etag(snapshot), wait)
+                request.activity_waited = True
+            except Exception as e:
+                logger.error("Error waiting for activity: %s", e)
+                return JsonResponse({"error": f"Error fetching activity: {str(e)}"}, status=500)
+    return await sync_to_async(activity_snapshot)(request)
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+def activity_snapshot(request):
+    # Content-negotiated body of get_activity, which is the view routed to
+    wait = _activity_wait(request.query_params)
+    if wait is None:
+        return Response(
+            {"error": "wait must be a number of seconds"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        feed = get_activity_feed()
+        with stage("activity_query"):
+            snapshot = feed.latest()
+        client_etags = _client_etags(request)
+        waited = getattr(request, "activity_waited", False)
+        if wait and not waited and snapshot_etag(snapshot) in client_etags:
+            with stage("activity_wait"):
+                snapshot = feed.wait_for_change(snapshot_etag(snapshot), wait)
+        if snapshot_etag(snapshot) in client_etags:
+            return _activity_response(snapshot, status.HTTP_304_NOT_MODIFIED)
+        return _activity_response(snapshot)
+
     except Exception as e:
-        logger.error(f"Error fetching activity: {str(e)}")
+        logger.error("Error fetching activity: %s", e)
         return Response(
             {"error": f"Error fetching activity: {str(e)}"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@require_GET
+@instrumented("stream_activity")
+def stream_activity(request):
+    # Server-Sent Events: an "activity" event with the snapshot now and whenever a newer
+    # survey is saved. The stream ends after ACTIVITY['STREAM_SECONDS']; EventSource then
+    # reconnects with Last-Event-ID and only gets events it has not seen
+    feed = get_activity_feed()
+    asgi = isinstance(request, ASGIRequest)
+    if not feed.has_capacity(sync=not asgi):
+        response = JsonResponse({"error": "Too many activity streams open"}, status=503)
+        response["Retry-After"] = str(feed.poll_interval * 5)
+        return response
+
+    last_event_id = request.headers.get("Last-Event-ID")
+    etag = snapshot_etag({"survey_id": int(last_event_id)}) if (last_event_id or "").isdigit() else None
+
+    def events():
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        for snapshot in feed.stream(etag):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {snapshot.get('survey_id') or 0}\n" + sse_event("activity", snapshot)
+
+    async def aevents():
+        # Under ASGI a sync generator would be iterated on the server's one sync thread,
+        # blocking every sync view while the stream waits; this one waits on the loop
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        async for snapshot in feed.astream(etag):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {snapshot.get('survey_id') or 0}\n" + sse_event("activity", snapshot)
+
+    response = StreamingHttpResponse(aevents() if asgi else events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream
+    return response
+
+@vary_on_headers("Accept")
 @api_view(["GET"])
+@instrumented("search_surveys")
+def search_survey_documents(request):
+    # Query params: q (words that must all match, "quoted phrases" and prefix* words),
+    # sort (rank or recent), page, page_size and industry / target_audience filters.
+    # Results are ranked best first, or newest first, each with a snippet of the text
+    # around its matches (<mark>ed, HTML-escaped)
+    try:
+        results, page, next_page = search_surveys(request.query_params)
+        return Response({
+            "results": results,
+            "page": page,
+            "next_page": next_page
+        }, status=status.HTTP_200_OK)
+
+    except InvalidSearchRequest as search_error:
+        return Response(
+            {"error": str(search_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        logger.error("Error searching surveys: %s", e, exc_info=True)
+        return Response(
+            {"error": "An error occurred while searching surveys."}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@vary_on_headers("Accept")
+@api_view(["GET"])
+@instrumented("get_survey_history")
 def get_survey_history(request):
+    # Query params: page_size, cursor (next_cursor of the previous page), fields
+    # (comma-separated projection), industry / target_audience / technology filters and
+    # layout=columns for the compact {"columns", "rows"} form of the page
     try:
-        surveys = Survey.objects.all().order_by('-created_at')
-        survey_data = []
-        
-        for survey in surveys:
-            survey_data.append({
-                'id': survey.id,
-                'industry': survey.industry,
-                'industry_other': survey.industry_other,
-                'target_audience': survey.target_audience,
-                'technology': survey.technology,
-                'sub_technology': survey.sub_technology,
-                'platform': survey.platform,
-                'web_frontend': survey.web_frontend,
-                'web_backend': survey.web_backend,
-                'web_hosting': survey.web_hosting,
-                'web_database': survey.web_database,
-                'security_features': survey.security_features,
-                'created_at': survey.created_at.isoformat()
-            })
-        
+        layout = layout_from(request.query_params)
+        survey_data, next_cursor = paginate_surveys(Survey.objects.all(), request.query_params)
+        if layout == "columns":
+            with stage("history_serialize"):
+                survey_data = columnar(survey_data, fields_from(request.query_params))
+
         return Response({
-            "surveys": survey_data
+            "surveys": survey_data,
+            "next_cursor": next_cursor
         }, status=status.HTTP_200_OK)
-        
+
+    except InvalidPageRequest as page_error:
+        return Response(
+            {"error": str(page_error)}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
-        logger.error(f"Error fetching survey history: {str(e)}")
+        logger.error("Error fetching survey history: %s", e)
         return Response(
             {"error": "An error occurred while fetching survey history."}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.db import close_old_connections, connection, transaction
+
+from .activity import publish_surveys
+from .config import lazy_singleton, options_from, settings_section
+from .metrics import counter
+from .models import Survey
+from .search import index_surveys
+
+logger = logging.getLogger(__name__)
+
+# Buffered survey inserts. Instead of every request taking the database's write lock for
+# its own INSERT, requests hand their survey to one writer thread, which inserts whatever
+# has queued up (up to MAX_BATCH rows, waiting at most MAX_DELAY seconds for more) in a
+# single bulk_create transaction. Each request still blocks until its row is committed
+# and gets the saved Survey back, id included, so callers are unchanged. bulk_create
+# sends no post_save, so the activity snapshot is published and the surveys are indexed
+# for search here. On databases whose bulk INSERT does not return the new ids (MySQL),
+# the rows of a batch are inserted one by one instead, still in one transaction.
+
+DEFAULT_SURVEY_WRITER = {
+    'ENABLED': False,
+    'MAX_BATCH': 100,  # rows per transaction
+    'MAX_DELAY': 0.002,  # seconds the writer waits for more rows before committing
+    'TIMEOUT': 30,  # seconds a request waits for its row to be committed
+}
+
+
+survey_writer_config = settings_section('SURVEY_WRITER', DEFAULT_SURVEY_WRITER)
+
+
+def bulk_insert(objects):
+    """bulk_create objects, all of one model, and return them with their primary keys set.
+
+    bulk_create only sets the keys where the database returns the inserted rows
+    (PostgreSQL, SQLite, MariaDB 10.5+). Elsewhere, e.g. MySQL, the objects are saved one
+    by one, which also sends their post_save.
+    """
+    if not objects:
+        return objects
+    if connection.features.can_return_rows_from_bulk_insert:
+        return type(objects[0])._default_manager.bulk_create(objects)
+    with transaction.atomic():
+        for obj in objects:
+            obj.save(force_insert=True)
+    return objects
+
+
+def insert_surveys(surveys):
+    """Insert surveys with bulk_insert, index them for search and publish the newest."""
+    surveys = bulk_insert(surveys)
+    if connection.features.can_return_rows_from_bulk_insert:
+        # Saved one by one instead, they went through the post_save receivers that do this
+        index_surveys(surveys)
+        publish_surveys(surveys)
+    return surveys
+
+
+class SurveyWriter:
+    """A thread that inserts queued surveys in batches."""
+
+    def __init__(self, max_batch=100, max_delay=0.002, timeout=30, **options):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="survey-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, survey_data):
+        """Queue survey_data for insertion; the Future resolves to the saved Survey."""
+        self.start()
+        future = Future()
+        self._queue.put((Survey(**survey_data), future))
+        return future
+
+    def create(self, survey_data):
+        return self.submit(survey_data).result(timeout=self.timeout)
+
+    async def acreate(self, survey_data):
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(survey_data)), self.timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                # With no delay, a batch is whatever queued up while the last one committed
+                batch.append(self._queue.get(timeout=self.max_delay) if self.max_delay else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._collect()
+            pending = [(survey, future) for survey, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                close_old_connections()
+                with transaction.atomic():
+                    surveys = insert_surveys([survey for survey, _ in pending])
+            except Exception as e:
+                logger.error("Failed to insert a batch of %s surveys: %s", len(pending), e)
+                with self._lock:
+                    self.failures += 1
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.rows += len(surveys)
+            for survey, (_, future) in zip(surveys, pending):
+                future.set_result(survey)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "failures": self.failures,
+                "queued": self._queue.qsize(),
+                "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            }
+
+
+@lazy_singleton
+def get_survey_writer():
+    """Return the process-wide SurveyWriter built from settings.SURVEY_WRITER."""
+    return SurveyWriter(**options_from(survey_writer_config()))
+
+
+def _writer_stats(key):
+    def collect():
+        return {(): get_survey_writer().stats()[key]} if get_survey_writer.instance is not None else {}
+    return collect
+
+
+SURVEY_WRITER_BATCHES = counter("survey_writer_batches_total", "Survey insert batches committed by the buffered writer.",
+                                collect=_writer_stats("batches"))
+SURVEY_WRITER_ROWS = counter("survey_writer_rows_total", "Surveys inserted by the buffered writer.",
+                             collect=_writer_stats("rows"))
+
+
+def create_survey(survey_data):
+    """Insert a Survey, through the buffered writer when SURVEY_WRITER['ENABLED']."""
+    if survey_writer_config()['ENABLED']:
+        return get_survey_writer().create(survey_data)
+    return Survey.objects.create(**survey_data)
+
+
+async def acreate_survey(survey_data):
+    """Async counterpart of create_survey."""
+    if survey_writer_config()['ENABLED']:
+        return await get_survey_writer().acreate(survey_data)
+    return await Survey.objects.acreate(**survey_data)
@@ -10,11 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Variables from a .env file, for everything below and the API key; ones already set in
+# the environment win
+load_dotenv()
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -43,8 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.logs.RequestIdMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,12 +113,332 @@ WSGI_APPLICATION = 'newproject.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# DB_ENGINE is 'sqlite' (single node, the default), 'postgresql' or 'mysql'; the server
+# backends read DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT. DB_POOL=1 uses
+# psycopg's connection pool on PostgreSQL (needs psycopg[pool]) instead of persistent
+# connections. Under uvicorn, set DB_CONN_MAX_AGE=0 and use the pool.
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # seconds a connection waits for the write lock before "database is locked"
+                'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+                # take the write lock when a transaction begins rather than upgrading a
+                # read lock halfway, which fails at once instead of waiting
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets reads run alongside the writer; NORMAL sync is safe with WAL
+                'init_command': f"PRAGMA journal_mode={os.getenv('SQLITE_JOURNAL_MODE', 'WAL')};"
+                                "PRAGMA synchronous=NORMAL",
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': f'django.db.backends.{DB_ENGINE}',
+            'NAME': os.getenv('DB_NAME', 'ideagenerator'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', ''),
+            'OPTIONS': {},
+        }
+    }
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DB_POOL = DB_ENGINE == 'postgresql' and os.getenv('DB_POOL', '0') == '1'
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
     }
+
+# Keep connections open between requests (seconds); pooled connections must not persist
+DATABASES['default']['CONN_MAX_AGE'] = 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# Buffered survey inserts (api.writer)
+# Requests queue their Survey row for one writer thread that inserts them in batches,
+# so concurrent submissions share a transaction instead of queueing for the write lock.
+
+SURVEY_WRITER = {
+    'ENABLED': os.getenv('SURVEY_WRITER_ENABLED', '0') == '1',
+    'MAX_BATCH': 100,  # rows per transaction
+    'MAX_DELAY': 0.002,  # seconds to wait for more rows before committing
+    'TIMEOUT': 30,  # seconds a request waits for its row
+}
+
+
+# Full-text search (api.search, GET /api/search/)
+# Surveys and documents are indexed as they are written: FTS5 on SQLite, a tsvector
+# column on PostgreSQL. After turning ENABLED on, or to index rows stored before
+# migration 0006, run `manage.py rebuild_search_index`.
+
+SEARCH = {
+    'ENABLED': os.getenv('SEARCH_ENABLED', '1') == '1',
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    'MAX_PAGE': 50,  # deepest page of ranked results
+    'SNIPPET_WORDS': 16,  # words around the matches in each result's snippet
+}
+
+
+# Generated documentation cache
+# BACKEND is one of 'memory' (per-process LRU), 'django' (settings.CACHES) or
+# 'sqlite' (file store shared between worker processes).
+
+DOCUMENT_CACHE = {
+    'BACKEND': os.getenv('DOCUMENT_CACHE_BACKEND', 'memory'),
+    'TTL': int(os.getenv('DOCUMENT_CACHE_TTL', 6 * 60 * 60)),  # seconds, 0 disables expiry
+    'MAX_ENTRIES': int(os.getenv('DOCUMENT_CACHE_MAX_ENTRIES', 256)),
+    'MAX_BYTES': 64 * 1024 * 1024,  # memory backend only
+    'PATH': BASE_DIR / 'document_cache.sqlite3',  # sqlite backend only
+}
+
+
+# Language model provider
+# 'gemini' calls the Gemini API, 'fake' uses api.fakes.FakeGenerativeModel so the
+# pipeline can be exercised locally without an API key or quota. Model handles are
+# built once per process by api.llm and shared between requests.
+
+GEMINI_PROVIDER = os.getenv('GEMINI_PROVIDER', 'gemini')
+
+# 'grpc' (default, one multiplexed HTTP/2 channel) or 'rest' (keep-alive HTTP session)
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or None
+
+FAKE_GEMINI = {
+    'latency': float(os.getenv('FAKE_GEMINI_LATENCY', 0)),  # seconds before the first chunk
+    'chunk_delay': float(os.getenv('FAKE_GEMINI_CHUNK_DELAY', 0)),  # seconds between chunks
+    'chunk_size': int(os.getenv('FAKE_GEMINI_CHUNK_SIZE', 256)),  # characters per streamed chunk
+    'paragraphs': int(os.getenv('FAKE_GEMINI_PARAGRAPHS', 2)),  # body paragraphs per section, i.e. output size
+    'throttle_rate': float(os.getenv('FAKE_GEMINI_THROTTLE_RATE', 0)),  # fraction of calls failing with 429
+    # cut replies off at this many characters, as at the output token cap
+    'max_chars': int(os.getenv('FAKE_GEMINI_MAX_CHARS')) if os.getenv('FAKE_GEMINI_MAX_CHARS') else None,
+    'seconds_per_char': float(os.getenv('FAKE_GEMINI_SECONDS_PER_CHAR', 0)),  # added per reply character
+    # per-model overrides of the above, e.g. '{"gemini-1.5-flash": {"seconds_per_char": 0.0001}}'
+    'models': json.loads(os.getenv('FAKE_GEMINI_MODELS') or '{}'),
+}
+
+
+# Tiered model routing (api.routing)
+# Outline sections listed in SECTIONS are written by that tier's model, the others by
+# DEFAULT_TIER's; 'pro' is GEMINI_MODEL with GENERATION_CONFIG. A survey matching a
+# profile is routed to its tier as a whole, e.g.
+#     {'NAME': 'consumer', 'MATCH': {'target_audience': 'Consumers (B2C)'}, 'TIER': 'fast'}
+# Documents mixing tiers are generated per section group, whatever the requested mode.
+
+MODEL_ROUTING = {
+    'ENABLED': os.getenv('MODEL_ROUTING_ENABLED', '0') == '1',
+    'DEFAULT_TIER': 'pro',
+    'TIERS': {
+        'fast': {
+            'MODEL': os.getenv('GEMINI_FAST_MODEL', 'gemini-1.5-flash'),
+            'GENERATION_CONFIG': {
+                "temperature": 0.4,  # boilerplate needs no creativity
+                "top_p": 0.9,
+                "top_k": 40,
+                "max_output_tokens": 2048,
+            },
+        },
+    },
+    'SECTIONS': {
+        'Table of Contents': 'fast',
+        'Software & Hardware Requirements': 'fast',
+        'References': 'fast',
+    },
+    'PROFILES': [],
+}
+
+
+# Outbound model call budgets (api.scheduler)
+# Calls queue by priority (interactive requests before queued jobs) for a share of the
+# provider's requests- and tokens-per-minute quota, and back off when it answers 429.
+
+LLM_SCHEDULER = {
+    'ENABLED': os.getenv('LLM_SCHEDULER_ENABLED', '1') == '1',
+    'REQUESTS_PER_MINUTE': int(os.getenv('GEMINI_RPM', 60)),
+    'TOKENS_PER_MINUTE': int(os.getenv('GEMINI_TPM', 1_000_000)),
+    'MAX_QUEUE': 100,  # waiting calls beyond this are shed with 503
+    'MAX_WAIT_SECONDS': {0: 30, 1: 300},  # by priority: 0 interactive, 1 background
+    'RETRIES': 3,  # retries of a call answered with 429
+    'BACKOFF_SECONDS': 1.0,  # full-jitter exponential backoff after a 429
+    'BACKOFF_MAX_SECONDS': 30.0,
+    'MIN_RATE_FRACTION': 0.1,  # 429s never cut the rates below this share
+    'RECOVERY_STEP': 0.05,  # share of the rates won back per successful call
+}
+
+
+# Background generation queue (api.jobs)
+# Jobs are stored in the database and worked by WORKERS threads per process. With
+# RUN_IN_PROCESS a serving process (a WSGI/ASGI server or runserver, not other management
+# commands) starts its workers once the app is ready; set it to False to leave the work to
+# `manage.py run_jobs`.
+
+JOB_QUEUE = {
+    'WORKERS': int(os.getenv('JOB_QUEUE_WORKERS', 2)),
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_SECONDS': 5,  # doubled after every failed attempt
+    'BACKOFF_MAX_SECONDS': 300,
+    'POLL_INTERVAL': 1.0,
+    'STALE_AFTER_SECONDS': 15 * 60,  # running jobs older than this are requeued, checked every minute or so
+    'RUN_IN_PROCESS': os.getenv('JOB_QUEUE_RUN_IN_PROCESS', '1') == '1',
+    'RATE_PER_MINUTE': int(os.getenv('JOB_QUEUE_RATE_PER_MINUTE', 0)),  # job starts per process, 0 for no limit
+    'RATE_BURST': 5,  # jobs that may start back to back before pacing kicks in
+}
+
+
+# Document generation mode
+# 'single' asks for the whole outline in one completion; 'sectioned' fans it out into
+# concurrent per-section-group calls (api.sectioned). Requests may override it with "mode".
+
+GENERATION_MODE = os.getenv('GENERATION_MODE', 'single')
+
+SECTIONED_GENERATION = {
+    'GROUP_SIZE': 3,  # outline sections per model call
+    'MAX_WORKERS': 6,  # concurrent calls per document
+    'RETRIES': 1,  # regeneration rounds for sections that fail validation
+    'MIN_SECTION_CHARS': 80,  # shorter section bodies count as failed
+}
+
+
+# Batch submissions (api/surveys/batch/)
+
+BATCH_MAX_SURVEYS = 100
+
+
+# Request coalescing (api.singleflight)
+# Identical concurrent submissions share one generation. Set LOCK_PATH (a directory) to
+# also coalesce across worker processes; this needs a cache BACKEND they share.
+
+SINGLE_FLIGHT = {
+    'ENABLED': os.getenv('SINGLE_FLIGHT_ENABLED', '1') == '1',
+    'LOCK_PATH': os.getenv('SINGLE_FLIGHT_LOCK_PATH'),
+    'LOCK_TIMEOUT': 300,  # seconds to wait for another process's generation
+    'WAIT_TIMEOUT': 300,  # seconds to wait for this process's in-flight generation
+}
+
+
+# Document export (api.export)
+# Files are rendered by a pool of worker processes and kept in PATH, named by document
+# hash, so repeat downloads are served from disk.
+
+EXPORT = {
+    'PATH': os.getenv('EXPORT_PATH', BASE_DIR / 'exports'),
+    'WORKERS': int(os.getenv('EXPORT_WORKERS', 2)),
+    'EXECUTOR': 'process',  # 'thread' renders in-process instead
+    'TIMEOUT': 120,  # seconds to wait for one render
+    'MAX_BYTES': int(os.getenv('EXPORT_MAX_BYTES', 1024 * 1024 * 1024)),  # 0 keeps every file
+    'MAX_AGE': int(os.getenv('EXPORT_MAX_AGE', 30 * 24 * 60 * 60)),  # seconds unused; 0 keeps every file
+    # A TrueType font with the scripts the documents use, e.g. DejaVuSans.ttf; without it
+    # PDFs are set in Helvetica and documents with characters outside cp1252 are refused
+    'PDF_FONT': os.getenv('EXPORT_PDF_FONT') or None,
+    'PDF_BOLD_FONT': os.getenv('EXPORT_PDF_BOLD_FONT') or None,
+}
+
+
+# Similar past surveys (api.similarity)
+# Surveys are matched by TF-IDF cosine similarity of their answers. With REUSE_THRESHOLD
+# set, a submission whose closest prior survey scores at least that much gets the prior
+# document instead of a new generation.
+
+SIMILARITY = {
+    'ENABLED': os.getenv('SIMILARITY_ENABLED', '1') == '1',
+    'REUSE_THRESHOLD': float(os.getenv('SIMILARITY_REUSE_THRESHOLD')) if os.getenv('SIMILARITY_REUSE_THRESHOLD') else None,
+    'REFRESH_INTERVAL': 5,  # seconds between pulls of new surveys from the database
+    'REBUILD_AFTER': 1000,  # new surveys scored separately before the index is rebuilt
+    'MAX_RESULTS': 50,  # cap on the similar surveys endpoint's limit
+}
+
+
+# Latest activity (api.activity)
+# The newest survey is kept in the CACHE alias and read from there by api/activity/.
+# Point it at a cache the worker processes share so long-polls and streams see surveys
+# saved by any of them. Long-polls and streams need an async server (uvicorn) to scale:
+# under WSGI each one ties up a thread, so only MAX_SYNC_WAITERS of them actually wait.
+
+ACTIVITY = {
+    'CACHE': 'default',
+    # Seconds the snapshot is cached. None expires it after POLL_INTERVAL in a per-process
+    # cache (the default LocMemCache), so other workers' surveys show up, and never in a
+    # shared one (e.g. Redis or Memcached), which every worker writes to.
+    'TTL': None,
+    'MAX_WAIT': 30,  # seconds a long-poll may wait
+    'MAX_WAITERS': 100,  # concurrent long-polls and streams per process
+    # Of which may be waiting under a sync (WSGI) server, where each holds a thread. Keep it
+    # well below the server's threads per worker; under ASGI waits take no thread.
+    'MAX_SYNC_WAITERS': int(os.environ.get('ACTIVITY_MAX_SYNC_WAITERS', 4)),
+    'POLL_INTERVAL': 1,  # seconds between cache reads while waiting
+    'STREAM_SECONDS': 300,  # an event stream is closed after this and the client reconnects
+    'HEARTBEAT': 15,  # seconds between keep-alive comments on a stream
+}
+
+
+# Response compression (api.compression)
+# JSON and text responses of at least MIN_SIZE bytes are sent brotli- or gzip-compressed,
+# whichever the client's Accept-Encoding allows (brotli needs the brotli package).
+
+COMPRESSION = {
+    'ENABLED': os.getenv('COMPRESSION_ENABLED', '1') == '1',
+    'MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),  # bytes
+    'ENCODINGS': ['br', 'gzip'],  # preferred first
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+}
+
+
+# API responses are JSON, or MessagePack for clients sending Accept: application/msgpack
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.compact.MessagePackRenderer',
+    ],
+}
+
+
+# Logging
+# Records of LOG_LEVEL and above are queued by the request threads and written to stderr
+# by a listener thread (api.logs), as one JSON object per line (LOG_FORMAT=json) or in
+# the logging.basicConfig format (LOG_FORMAT=plain), with the id of the request that
+# logged them. LOG_SAMPLING keeps a fraction of the INFO/DEBUG records of an event (the
+# `event` extra, else the message template), e.g. '{"survey.created": 0.1}'.
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_MAX_MESSAGE_CHARS = int(os.getenv('LOG_MAX_MESSAGE_CHARS', 2000))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'()': 'api.logs.PlainFormatter', 'max_message_chars': LOG_MAX_MESSAGE_CHARS},
+        'json': {
+            '()': 'api.logs.JSONFormatter',
+            'max_message_chars': LOG_MAX_MESSAGE_CHARS,
+            'max_field_chars': int(os.getenv('LOG_MAX_FIELD_CHARS', 500)),
+        },
+    },
+    'filters': {
+        'sampling': {'()': 'api.logs.SamplingFilter', 'rates': json.loads(os.getenv('LOG_SAMPLING') or '{}')},
+    },
+    'handlers': {
+        'console': {
+            '()': 'api.logs.QueueHandler',
+            'stream': 'ext://sys.stderr',
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+            'formatter': LOG_FORMAT,
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
 }
 
 
@@ -8,19 +8,36 @@ const SurveyHistory = () => {
   const [surveys, setSurveys] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    const fetchSurveys = async () => {
-      try {
-        const response = await axios.get('http://127.0.0.1:8000/api/history/');
-        setSurveys(response.data.surveys);
-        setLoading(false);
-      } catch (err) {
-        setError('Failed to fetch survey history');
-        setLoading(false);
-      }
-    };
+  const openDocument = async (surveyId) => {
+    try {
+      // Stored documents are served from the database instead of being regenerated
+      const response = await axios.get(`http://127.0.0.1:8000/api/surveys/${surveyId}/document/`, {
+        params: { output: 'tree' },
+      });
+      navigate('/output', { state: { document: response.data.document, surveyId } });
+    } catch (err) {
+      alert(err.response?.status === 404 ? 'No document was stored for this survey' : 'Failed to load document');
+    }
+  };
+
+  // History is paginated by cursor; each page appends to the list
+  const fetchSurveys = async (cursor = null) => {
+    try {
+      const response = await axios.get('http://127.0.0.1:8000/api/history/', {
+        params: cursor ? { cursor } : {}
+      });
+      setSurveys((prev) => (cursor ? [...prev, ...response.data.surveys] : response.data.surveys));
+      setNextCursor(response.data.next_cursor);
+      setLoading(false);
+    } catch (err) {
+      setError('Failed to fetch survey history');
+      setLoading(false);
+    }
+  };
 
+  useEffect(() => {
     fetchSurveys();
   }, []);
 
@@ -37,6 +54,7 @@ const SurveyHistory = () => {
           <p>Target Audience: {survey.target_audience}</p>
           <p>Technologies: {survey.technology.join(', ')}</p>
           <p>Created: {new Date(survey.created_at).toLocaleString()}</p>
+          <button onClick={() => openDocument(survey.id)} className="survey-button">Open Document</button>
           <details>
             <summary>More Details</summary>
             <div className="details-content">
@@ -49,6 +67,9 @@ const SurveyHistory = () => {
           </details>
         </div>
       ))}
+      {nextCursor && (
+        <button onClick={() => fetchSurveys(nextCursor)} className="survey-button">Load More</button>
+      )}
     </div>
   );
 };
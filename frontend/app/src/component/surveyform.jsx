@@ -71,7 +71,9 @@ const SurveyForm = () => {
       webBackend: formData.webBackend || [],
       webHosting: formData.webHosting || [],
       webDatabase: formData.webDatabase || [],
-      securityFeatures: formData.securityFeatures || []
+      securityFeatures: formData.securityFeatures || [],
+      // Only the parsed document tree is needed to render the output page
+      output: "tree"
     };
 
     try {
@@ -82,9 +84,9 @@ const SurveyForm = () => {
         }
       });
       
-      if (response.data && response.data.response) {
+      if (response.data && response.data.document) {
         console.log("Server response:", response.data);
-        navigate("/output", { state: { response: response.data.response } });
+        navigate("/output", { state: { document: response.data.document, surveyId: response.data.survey_id } });
       } else {
         throw new Error("Invalid response format from server");
       }
@@ -119,8 +121,13 @@ const SurveyForm = () => {
       const response = await axios.get("http://127.0.0.1:8000/api/activity/");
       console.log("Activity response:", response.data);
       
-      if (response.data?.response) {
-        alert(response.data.response);
+      const activity = response.data;
+      if (activity?.survey_id) {
+        alert(
+          `Latest activity: ${activity.industry} project for ${activity.target_audience}` +
+          ` using ${(activity.technology || []).join(", ")}` +
+          ` (${new Date(activity.created_at).toLocaleString()})`
+        );
       } else {
         alert("No activity data available");
       }